@@ -0,0 +1,424 @@
+from contextlib import contextmanager
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+from pathlib import Path
+import threading
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import polars as pl
+
+from ml_final_project.config import logger
+
+# Synthetic CSC postings for the benchmark suite. Everything is derived
+# from the seed, so a scale and seed always give the same files.
+
+SCALES = {"1k": 1_000, "10k": 10_000, "100k": 100_000}
+# Bumped whenever the generated files change, so cached fixtures rebuild
+VERSION = 1
+FIRST_JOB_ID = 4_000_000
+# Rows per listing page, as on the CSC job board
+PAGE_LENGTH = 100
+
+AGENCIES = [
+    "DEPARTMENT OF EDUCATION",
+    "DEPARTMENT OF HEALTH",
+    "BUREAU OF INTERNAL REVENUE",
+    "PHILIPPINE NATIONAL POLICE",
+    "DEPARTMENT OF PUBLIC WORKS AND HIGHWAYS",
+    "BICOL MEDICAL CENTER",
+    "COTABATO REGIONAL AND MEDICAL CENTER",
+    "CITY GOVERNMENT OF DAVAO",
+    "DEPARTMENT OF AGRICULTURE",
+    "SOCIAL SECURITY SYSTEM",
+]
+REGIONS = [
+    "NCR",
+    "CAR",
+    "Region I",
+    "Region II",
+    "Region III",
+    "Region IV-A",
+    "Region V",
+    "Region VI",
+    "Region VII",
+    "Region VIII",
+    "Region IX",
+    "Region X",
+    "Region XI",
+    "Region XII",
+    "Region XIII",
+    "BARMM",
+]
+# Columns of the job board's table
+LISTING_HEADERS = [
+    "Agency",
+    "Region",
+    "Position Title",
+    "Plantilla Item No.",
+    "Posting Date",
+    "Closing Date",
+    "Action",
+]
+# Position title, salary grade and monthly salary
+POSITIONS = [
+    ("Administrative Aide I", "1", 13_000),
+    ("Administrative Assistant II", "8", 20_534),
+    ("Administrative Officer II", "11", 27_000),
+    ("Teacher I", "11", 27_000),
+    ("Teacher III", "13", 31_705),
+    ("Nurse I", "15", 36_619),
+    ("Nurse II", "16", 39_672),
+    ("Engineer II", "16", 39_672),
+    ("Medical Officer III", "21", 63_997),
+    ("Accountant III", "19", 51_357),
+    ("Police Officer I", "10", 29_668),
+    ("Revenue Officer I", "11", 27_000),
+]
+ELIGIBILITIES = [
+    "Career Service (Professional) Second Level Eligibility",
+    "RA 1080 (Nurse)",
+    "RA 1080 (Teacher)",
+    "Career Service (Subprofessional) First Level Eligibility",
+    "None required (MC 11, s. 96 - Cat. III)",
+]
+EDUCATIONS = [
+    "Bachelor's degree relevant to the job",
+    "Completion of two years studies in college",
+    "Bachelor of Science in Nursing",
+    "Doctor of Medicine",
+    "Must be able to read and write",
+]
+TRAININGS = [
+    "None required",
+    "4 hours of relevant training",
+    "8 hours of relevant training",
+    "24 hours of relevant training",
+]
+EXPERIENCES = [
+    "None required",
+    "1 year of relevant experience",
+    "2 years of relevant experience",
+    "six months of relevant experience",
+    "three years of relevant experience",
+]
+COMPETENCIES = [
+    "Good communication skills",
+    "Proficient in MS Office",
+    "Knowledge of government accounting",
+    "Ability to work under pressure",
+]
+
+
+def postings(n: int, seed: int = 0) -> pl.DataFrame:
+    """`n` synthetic postings with the listing and PDF fields."""
+    rng = np.random.default_rng(seed)
+
+    def pick(values: list) -> np.ndarray:
+        return rng.integers(0, len(values), n)
+
+    position = pick(POSITIONS)
+    posted = np.datetime64("2024-01-01") + rng.integers(0, 540, n)
+    return pl.DataFrame(
+        {
+            "jobId": np.arange(FIRST_JOB_ID, FIRST_JOB_ID + n),
+            "Agency": np.array(AGENCIES)[pick(AGENCIES)],
+            "Region": np.array(REGIONS)[pick(REGIONS)],
+            "PlaceOfAssignment": [
+                f"Division Office {i % 97 + 1}" for i in range(n)
+            ],
+            "Position Title": [POSITIONS[i][0] for i in position],
+            "SalaryGrade": [POSITIONS[i][1] for i in position],
+            "MonthlySalary": [POSITIONS[i][2] for i in position],
+            "Plantilla Item No.": [f"OSEC-{i:07d}" for i in range(n)],
+            "Posting Date": posted,
+            "Closing Date": posted + 14,
+            "Eligibility": np.array(ELIGIBILITIES)[pick(ELIGIBILITIES)],
+            "Education": np.array(EDUCATIONS)[pick(EDUCATIONS)],
+            "Training": np.array(TRAININGS)[pick(TRAININGS)],
+            "Experience": np.array(EXPERIENCES)[pick(EXPERIENCES)],
+            "Competency": np.array(COMPETENCIES)[pick(COMPETENCIES)],
+        }
+    ).with_columns(pl.col("Posting Date", "Closing Date").cast(pl.Date))
+
+
+def posting_lines(posting: dict) -> list:
+    """Text lines of a posting PDF, laid out like the CSC's."""
+    return [
+        "CIVIL SERVICE COMMISSION",
+        f"{posting['Agency']} | {posting['Region']}",
+        f"Place of Assignment : {posting['PlaceOfAssignment']}",
+        f"Position Title : {posting['Position Title']}",
+        f"Plantilla Item No. : {posting['Plantilla Item No.']}",
+        f"Salary/Job/Pay Grade : {posting['SalaryGrade']}",
+        f"Monthly Salary : Php {posting['MonthlySalary']:,}.00",
+        f"Eligibility : {posting['Eligibility']}",
+        f"Education : {posting['Education']}",
+        f"Training : {posting['Training']}",
+        f"Experience : {posting['Experience']}",
+        f"Competency : {posting['Competency']}",
+        "Instructions/Remarks : Submit the documents to the HR office",
+    ]
+
+
+def make_pdf(lines: list) -> bytes:
+    """Single page PDF with one Helvetica text line per item."""
+    operators = ["BT", "/F1 9 Tf", "11 TL", "40 800 Td"]
+    for line in lines:
+        for char in "\\()":
+            line = line.replace(char, "\\" + char)
+        operators.append(f"({line}) Tj T*")
+    operators.append("ET")
+    stream = "\n".join(operators).encode("latin-1")
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+        b"/Contents 4 0 R /Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        pdf += b"%010d 00000 n \n" % offset
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\n" % (len(objects) + 1)
+    pdf += b"startxref\n%d\n%%%%EOF\n" % xref
+    return bytes(pdf)
+
+
+def listing_cells(row: dict) -> list:
+    """HTML of a listing row's cells, the last one its Details button."""
+    cells = [escape(str(row[header])) for header in LISTING_HEADERS[:-1]]
+    cells.append(
+        f'<button id="info_{row["jobId"]}" class="btn">Details</button>'
+    )
+    return cells
+
+
+def listing_page(rows: list) -> str:
+    """HTML of a job board page, a DataTables table of listing rows."""
+    body = [
+        "<tr>"
+        + "".join(f"<td>{cell}</td>" for cell in listing_cells(row))
+        + "</tr>"
+        for row in rows
+    ]
+    return (
+        "<html><body><table id='jobs'><thead><tr>"
+        + "".join(f"<th>{header}</th>" for header in LISTING_HEADERS)
+        + "</tr></thead><tbody>\n"
+        + "\n".join(body)
+        + "\n</tbody></table></body></html>"
+    )
+
+
+def _listing(data: pl.DataFrame) -> pl.DataFrame:
+    # Listing columns as the job board shows them
+    return data.with_columns(
+        pl.col("Posting Date", "Closing Date").dt.strftime("%d %b %Y")
+    )
+
+
+# DataTables setup of the listing page, paging `/career/data` server-side
+DATATABLES_JS = """
+$("#jobs").DataTable({
+    serverSide: true,
+    ajax: {url: "data", type: "GET"},
+});
+"""
+
+
+def _row_object(row: dict) -> dict:
+    # A row as DataTables sends it with `columns.data` names, led by the
+    # DT_RowId key it adds
+    cells = listing_cells(row)
+    return {
+        "DT_RowId": f"row_{row['jobId']}",
+        **{
+            header.lower().replace(" ", "_").rstrip("."): cell
+            for header, cell in zip(LISTING_HEADERS, cells)
+        },
+    }
+
+
+@contextmanager
+def serve(
+    data: pl.DataFrame,
+    rendered: int = PAGE_LENGTH,
+    configured: bool = True,
+    objects: bool = False,
+):
+    """Serve postings as the job board does, on a local port.
+
+    `/career/` is the listing page with the first `rendered` rows in its
+    table, and `/career/data` the DataTables server-side endpoint paging
+    through all of them by `start` and `length`. Requests run on a
+    background thread until the block exits.
+    Args:
+        data (pl.DataFrame): Postings, as `postings` generates them.
+        rendered (int): Rows rendered into the listing page.
+        configured (bool): Set the endpoint up in the page's scripts.
+        objects (bool): Send rows as objects keyed by column name
+            instead of arrays of cells.
+    Yields:
+        str: Base URL of the server, e.g. `http://127.0.0.1:<port>`.
+    """
+    rows = _listing(data).to_dicts()
+    page = listing_page(rows[:rendered])
+    if configured:
+        page = page.replace(
+            "</body>", f"<script>{DATATABLES_JS}</script></body>"
+        )
+    page = page.encode()
+    toJson = _row_object if objects else listing_cells
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path == "/career/":
+                self._send("text/html", page)
+            elif url.path == "/career/data":
+                query = parse_qs(url.query)
+                start = int(query.get("start", ["0"])[0])
+                length = int(query.get("length", ["10"])[0])
+                payload = {
+                    "draw": int(query.get("draw", ["1"])[0]),
+                    "recordsTotal": len(rows),
+                    "recordsFiltered": len(rows),
+                    "data": [
+                        toJson(row) for row in rows[start : start + length]
+                    ],
+                }
+                self._send("application/json", json.dumps(payload).encode())
+            else:
+                self.send_error(404)
+
+        def _send(self, contentType: str, body: bytes):
+            self.send_response(200)
+            self.send_header("Content-Type", contentType)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Keep test and benchmark output quiet
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+def write_pdfs(data: pl.DataFrame, directory: Path) -> int:
+    directory.mkdir(parents=True, exist_ok=True)
+    for posting in data.iter_rows(named=True):
+        pdf = make_pdf(posting_lines(posting))
+        (directory / f"{posting['jobId']}.pdf").write_bytes(pdf)
+    return data.height
+
+
+def write_listing_pages(data: pl.DataFrame, directory: Path) -> int:
+    directory.mkdir(parents=True, exist_ok=True)
+    rows = _listing(data).to_dicts()
+    pages = 0
+    for pages, start in enumerate(range(0, len(rows), PAGE_LENGTH), 1):
+        page = listing_page(rows[start : start + PAGE_LENGTH])
+        (directory / f"page-{pages:05d}.html").write_text(page)
+    return pages
+
+
+def write_listing_db(data: pl.DataFrame, path: Path):
+    """The scraped listing table, with 1% of rows scraped twice."""
+    import duckdb
+
+    listing = _listing(data).select(
+        "Agency",
+        "Region",
+        "Position Title",
+        "Plantilla Item No.",
+        "Posting Date",
+        "Closing Date",
+        pl.col("jobId").cast(pl.Utf8).alias("Action"),
+    )
+    listing = pl.concat([listing, listing.gather_every(100)])
+    with duckdb.connect(path) as db:
+        db.execute(
+            "CREATE TABLE civilservicecommission AS SELECT * FROM listing"
+        )
+
+
+def write_pdf_db(data: pl.DataFrame, path: Path):
+    """The parsed PDF table, as `PDFTableWriter` writes it."""
+    import duckdb
+
+    from ml_final_project.preprocessing.PDFTableWriter import PDFTableWriter
+
+    rows = data.select(
+        pl.col("jobId").cast(pl.Utf8),
+        "Agency",
+        "PlaceOfAssignment",
+        "Position Title",
+        "Plantilla Item No.",
+        "SalaryGrade",
+        # As `PDFParser` reads "Php 27,000.00"
+        pl.format("{}.00", "MonthlySalary"),
+        "Eligibility",
+        "Education",
+        "Training",
+        "Experience",
+        "Competency",
+    ).rows()
+    with duckdb.connect(path) as db:
+        with PDFTableWriter(db, batch_size=10_000) as writer:
+            for row in rows:
+                writer.add(row)
+
+
+def build(directory: Path, n: int, seed: int = 0) -> dict:
+    """Generate the fixtures of a scale, or reuse them if they exist.
+    Args:
+        directory (Path): Cache directory of all fixtures.
+        n (int): Number of postings.
+        seed (int): Seed of the generated postings.
+    Returns:
+        dict: Paths of the fixtures: `pdfs` and `pages` directories,
+            `listing_db` and `pdf_db` DuckDB files, and the `postings` count.
+    """
+    root = Path(directory) / f"v{VERSION}-{n}-{seed}"
+    paths = {
+        "pdfs": root / "pdfs",
+        "pages": root / "pages",
+        "listing_db": root / "listing.duckdb",
+        "pdf_db": root / "pdfs.duckdb",
+    }
+    marker = root / "fixtures.json"
+    if marker.exists():
+        return {**paths, "postings": n}
+
+    logger.info(f"Generating {n} synthetic postings in {root}.")
+    for path in [paths["listing_db"], paths["pdf_db"]]:
+        path.unlink(missing_ok=True)
+    data = postings(n, seed)
+    write_pdfs(data, paths["pdfs"])
+    pages = write_listing_pages(data, paths["pages"])
+    write_listing_db(data, paths["listing_db"])
+    write_pdf_db(data, paths["pdf_db"])
+    # Written last, so an interrupted build is started over
+    marker.write_text(
+        json.dumps({"postings": n, "seed": seed, "pages": pages})
+    )
+    return {**paths, "postings": n}
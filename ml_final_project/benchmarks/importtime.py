@@ -0,0 +1,116 @@
+import json
+from pathlib import Path
+import subprocess
+import sys
+import time
+
+import typer
+
+from ml_final_project.config import logger
+
+app = typer.Typer()
+
+ENTRY_POINTS = {
+    "package": "ml_final_project",
+    "scrape": "ml_final_project.scrape",
+    "pdf_download": "ml_final_project.pdf_download",
+    "pdfs": "ml_final_project.preprocessing.pdfs",
+}
+
+
+def import_time(module: str) -> dict:
+    """Import `module` in a fresh interpreter under `-X importtime`.
+    Args:
+        module (str): Dotted module name.
+    Returns:
+        dict: Cumulative import time of the module in ms, and for every
+            other package it pulled in, the cumulative ms of its
+            outermost import, slowest first.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total = 0.0
+    nested = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        ms = int(cumulative) / 1000
+        # Imports are listed children first, indented one level deeper
+        # than their parent; top-level lines before the module's own are
+        # interpreter startup, so their children are dropped
+        if len(name) - len(name.lstrip()) == 1:
+            if name.strip() == module:
+                total = ms
+                break
+            nested = []
+        else:
+            nested.append((name.strip(), ms))
+
+    packages = {}
+    for name, ms in nested:
+        # A package's outermost import has the largest cumulative time
+        package = name.split(".")[0]
+        if package != "ml_final_project":
+            packages[package] = max(packages.get(package, 0.0), ms)
+
+    return {
+        "total_ms": total,
+        "imports": dict(
+            sorted(packages.items(), key=lambda item: item[1], reverse=True)
+        ),
+    }
+
+
+def help_time(module: str) -> float:
+    """Wall time in ms of `python -m <module> --help`."""
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-m", module, "--help"],
+        capture_output=True,
+        check=True,
+    )
+    return (time.perf_counter() - start) * 1000
+
+
+@app.command()
+def main(
+    runs: int = 5,  # Fresh interpreters per entry point, the best is kept
+    top: int = 5,  # Slowest top-level imports to log per entry point
+    output: Path = None,  # Write the results as JSON to this file
+    cli: bool = True,  # Also time `--help` of every Typer entry point
+):
+    results = {}
+    for name, module in ENTRY_POINTS.items():
+        best = min(
+            (import_time(module) for _ in range(runs)),
+            key=lambda result: result["total_ms"],
+        )
+        result = {"module": module, "import_ms": best["total_ms"]}
+        if cli and name != "package":
+            result["help_ms"] = min(help_time(module) for _ in range(runs))
+        result["slowest"] = dict(list(best["imports"].items())[:top])
+        results[name] = result
+
+        logger.info(
+            f"{module}: import {result['import_ms']:.1f} ms"
+            + (
+                f", --help {result['help_ms']:.1f} ms"
+                if "help_ms" in result
+                else ""
+            )
+        )
+        for imported, ms in result["slowest"].items():
+            logger.info(f"    {imported:<40} {ms:8.1f} ms")
+
+    if output is not None:
+        output.write_text(json.dumps(results, indent=2))
+        logger.info(f"Wrote import times to {output}.")
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,29 @@
+# Memory of the current process, from its `/proc` status. Benchmarks run
+# each measurement in a freshly spawned process and reset its high-water
+# mark first; `ru_maxrss` cannot be used for this, a spawned process
+# inherits its parent's peak across the exec.
+
+
+def _status_mb(field: str) -> float:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith(f"{field}:"):
+                # Reported in kB
+                return int(line.split()[1]) / 1024
+    raise ValueError(f"No {field} in /proc/self/status.")
+
+
+def rss_mb() -> float:
+    """Resident set size of this process in MB."""
+    return _status_mb("VmRSS")
+
+
+def peak_rss_mb() -> float:
+    """Highest RSS of this process in MB since `reset_peak_rss`."""
+    return _status_mb("VmHWM")
+
+
+def reset_peak_rss():
+    """Set the high-water mark of this process back to its current RSS."""
+    with open("/proc/self/clear_refs", "w") as clearRefs:
+        clearRefs.write("5")
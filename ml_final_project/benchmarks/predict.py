@@ -0,0 +1,101 @@
+import json
+from pathlib import Path
+import time
+
+import numpy as np
+import polars as pl
+import typer
+
+from ml_final_project.config import PROCESSED_DATA_DIR, logger
+from ml_final_project.modeling.predict import TARGET
+from ml_final_project.modeling.train import FEATURES, evaluate, split, train
+
+app = typer.Typer()
+
+# Indexes compared with the brute force scan of the notebook
+INDEXES = ("kd_tree", "ball_tree")
+
+
+def latencies(model, matrix: np.ndarray, batch_size: int) -> np.ndarray:
+    """Seconds taken by each prediction request of `batch_size` rows."""
+    seconds = []
+    for start in range(0, len(matrix), batch_size):
+        batch = matrix[start : start + batch_size]
+        begin = time.perf_counter()
+        model.predict(batch)
+        seconds.append(time.perf_counter() - begin)
+    return np.array(seconds)
+
+
+@app.command()
+def main(
+    input: Path = None,  # Training parquet with the features
+    queries: int = 1000,  # Held out postings queried per configuration
+    batch_sizes: str = "1,64",  # Comma separated rows per request
+    reduction: str = "none",  # Also try pca or random before the index
+    components: int = 32,  # Dimensions kept by the reduction
+    seed: int = 0,  # Seed of the split, queries and reduction
+    output: Path = None,  # Write the results as JSON to this file
+):
+    inputPath = input or (
+        PROCESSED_DATA_DIR
+        / "CivilServiceCommission"
+        / "civilservicecommission-embedded-training-data-(finetuned-position).parquet"
+    )
+    data = pl.read_parquet(inputPath, columns=[*FEATURES, TARGET])
+    trainData, testData = split(data.drop_nulls(), seed=seed)
+    testData = testData.head(queries)
+
+    configurations = {"brute": {"index": "brute"}}
+    for index in INDEXES:
+        configurations[index] = {"index": index}
+        if reduction != "none":
+            configurations[f"{reduction}_{index}"] = {
+                "index": index,
+                "reduction": reduction,
+                "components": components,
+                "seed": seed,
+            }
+
+    results = {}
+    for name, options in configurations.items():
+        start = time.perf_counter()
+        model = train(trainData, **options)
+        fitSeconds = time.perf_counter() - start
+        if name == "brute":
+            baseline = model
+        # Built once up front, as the prediction service receives it
+        matrix = model.matrix(testData)
+
+        result = {"fit_seconds": fitSeconds}
+        for batchSize in map(int, batch_sizes.split(",")):
+            seconds = latencies(model, matrix, batchSize)
+            result[f"batch_{batchSize}"] = {
+                "p50_ms": float(np.percentile(seconds, 50) * 1000),
+                "p99_ms": float(np.percentile(seconds, 99) * 1000),
+                "rows_per_second": len(matrix) / seconds.sum(),
+            }
+        result.update(evaluate(model, testData, baseline))
+        results[name] = result
+
+        logger.info(
+            f"{name}: fit {fitSeconds:.2f}s, R² {result['r2']:.4f} "
+            f"(brute force {result['baseline_r2']:.4f}), "
+            f"{result['agreement']:.1%} equal predictions."
+        )
+        for batchSize in batch_sizes.split(","):
+            latency = result[f"batch_{batchSize}"]
+            logger.info(
+                f"  {batchSize} rows per request: "
+                f"P50 {latency['p50_ms']:.2f} ms, "
+                f"P99 {latency['p99_ms']:.2f} ms, "
+                f"{latency['rows_per_second']:.0f} rows/s."
+            )
+
+    if output is not None:
+        output.write_text(json.dumps(results, indent=2))
+        logger.info(f"Wrote prediction benchmark to {output}.")
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,113 @@
+from concurrent.futures import ProcessPoolExecutor
+import json
+from multiprocessing import get_context
+from pathlib import Path
+import tempfile
+import time
+
+import typer
+
+from ml_final_project.benchmarks.memory import (
+    peak_rss_mb,
+    reset_peak_rss,
+    rss_mb,
+)
+from ml_final_project.config import INTERIM_DATA_DIR, RAW_DATA_DIR, logger
+
+app = typer.Typer()
+
+
+def _measure(
+    engine: str,
+    dbPath: Path,
+    pdfDbPath: Path,
+    memory_limit: str | None,
+) -> dict:
+    # Runs in a fresh process, so its high-water mark is this run alone
+    from ml_final_project.preprocess import preprocess
+
+    reset_peak_rss()
+    baseline = rss_mb()
+    with tempfile.TemporaryDirectory() as savePath:
+        start = time.perf_counter()
+        rows = preprocess(
+            dbPath,
+            pdfDbPath,
+            Path(savePath),
+            engine=engine,
+            memory_limit=memory_limit,
+        )
+        seconds = time.perf_counter() - start
+    return {
+        "rows": rows,
+        "seconds": seconds,
+        "peak_rss_mb": peak_rss_mb(),
+        "import_rss_mb": baseline,
+    }
+
+
+def measure(
+    engine: str,
+    dbPath: Path,
+    pdfDbPath: Path,
+    memory_limit: str | None = None,
+) -> dict:
+    """Time one full preprocess run in a freshly spawned interpreter.
+    Args:
+        engine (str): "duckdb" or "polars", see `preprocess`.
+        dbPath (Path): DuckDB file of the scraped listing.
+        pdfDbPath (Path): DuckDB file of the parsed PDFs.
+        memory_limit (str): DuckDB memory limit, e.g. "1GB".
+    Returns:
+        dict: Rows written, wall time in seconds and peak RSS in MB.
+    """
+    with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as pool:
+        return pool.submit(
+            _measure, engine, dbPath, pdfDbPath, memory_limit
+        ).result()
+
+
+@app.command()
+def main(
+    runs: int = 3,  # Runs per engine, the fastest is reported
+    engines: str = "polars,duckdb",  # Comma separated engines to compare
+    memory_limit: str = None,  # DuckDB memory limit, e.g. 1GB
+    db_path: Path = None,  # Scraped listing DuckDB file
+    pdf_db_path: Path = None,  # Parsed PDFs DuckDB file
+    output: Path = None,  # Write the results as JSON to this file
+):
+    dbPath = db_path or (
+        RAW_DATA_DIR
+        / "CivilServiceCommission"
+        / "civilservicecommission.duckdb"
+    )
+    pdfDbPath = pdf_db_path or (
+        INTERIM_DATA_DIR
+        / "CivilServiceCommission"
+        / "civilservicecommission_pdfs.duckdb"
+    )
+
+    results = {}
+    for engine in engines.split(","):
+        measurements = [
+            measure(engine, dbPath, pdfDbPath, memory_limit)
+            for _ in range(runs)
+        ]
+        best = min(measurements, key=lambda result: result["seconds"])
+        best["max_peak_rss_mb"] = max(
+            result["peak_rss_mb"] for result in measurements
+        )
+        results[engine] = best
+        logger.info(
+            f"{engine}: {best['rows']} rows in {best['seconds']:.2f}s, "
+            f"peak RSS {best['max_peak_rss_mb']:.0f} MB "
+            f"({best['import_rss_mb']:.0f} MB after imports)."
+        )
+
+    if output is not None:
+        output.write_text(json.dumps(results, indent=2))
+        logger.info(f"Wrote preprocess benchmark to {output}.")
+
+
+if __name__ == "__main__":
+    app()
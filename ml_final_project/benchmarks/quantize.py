@@ -0,0 +1,194 @@
+import json
+from pathlib import Path
+import tempfile
+import time
+
+import numpy as np
+import polars as pl
+import typer
+
+from ml_final_project.config import PROCESSED_DATA_DIR, logger
+
+app = typer.Typer()
+
+# Exports compared against the full precision model, as export options
+VARIANTS = {
+    "int8": {"quantize": True, "torchscript": False},
+    "torchscript": {"quantize": False, "torchscript": True},
+    "int8_torchscript": {"quantize": True, "torchscript": True},
+}
+# Text columns of the salary model of notebook 3.2, and their features
+TEXT_FEATURES = {
+    "Position Title": "positiontitle_embedding",
+    "Agency": "agency_embedding",
+    "Education": "education_embedding",
+    "Eligibility": "eligibility_embedding",
+}
+TARGET = "MonthlySalary"
+
+
+def _features(vectors: np.ndarray, rows: dict, data: pl.DataFrame):
+    # Feature matrix of notebook 3.2: CLS sums of the text columns and the
+    # years of experience, in the order the notebook selects them
+    sums = vectors.sum(axis=1, dtype=np.float64)
+    columns = [sums[rows[column]] for column in TEXT_FEATURES]
+    columns.insert(3, data.get_column("experience_years").to_numpy())
+    return np.column_stack(columns)
+
+
+def salary_scores(features: dict, target: np.ndarray, seed: int = 0) -> dict:
+    """R² of the notebook's KNN salary model for each embedding variant.
+    Args:
+        features (dict): Variant name to feature matrix, "fp32" included.
+        target (np.ndarray): Monthly salaries.
+        seed (int): Seed of the 80/20 train test split.
+    Returns:
+        dict: Per variant, the R² of the fp32 trained model on the
+            variant's test features, as when new postings are embedded
+            with the export, and of a model retrained on the variant.
+    """
+    from sklearn.metrics import r2_score
+    from sklearn.model_selection import train_test_split
+    from sklearn.neighbors import KNeighborsRegressor
+
+    train, test = train_test_split(
+        np.arange(len(target)), test_size=0.2, random_state=seed
+    )
+    reference = KNeighborsRegressor(metric="manhattan", n_neighbors=11)
+    reference.fit(features["fp32"][train], target[train])
+
+    scores = {}
+    for name, matrix in features.items():
+        retrained = KNeighborsRegressor(metric="manhattan", n_neighbors=11)
+        retrained.fit(matrix[train], target[train])
+        scores[name] = {
+            "r2": r2_score(target[test], reference.predict(matrix[test])),
+            "retrained_r2": retrained.score(matrix[test], target[test]),
+        }
+    return scores
+
+
+def _time_embedding(engine, texts: list, runs: int) -> tuple:
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        vectors = engine.embed(texts)
+        best = min(best, time.perf_counter() - start)
+    return best, vectors
+
+
+@app.command()
+def main(
+    model_path: Path = None,  # Directory of the fine-tuned BERT model
+    data_path: Path = None,  # Training parquet with the text columns
+    sample: int = 5000,  # Postings to embed and score, 0 for all
+    runs: int = 1,  # Timed runs per variant, the fastest is reported
+    batch_size: int = 64,  # Texts per forward pass
+    threads: int = None,  # torch threads, defaults to torch's choice
+    seed: int = 0,  # Seed of the sample and the train test split
+    output: Path = None,  # Write the results as JSON to this file
+):
+    from ml_final_project.embeddings import MODEL_PATH, EmbeddingEngine
+    from ml_final_project.modeling.quantize import WEIGHTS_FILE, export
+
+    modelPath = model_path or MODEL_PATH
+    dataPath = data_path or (
+        PROCESSED_DATA_DIR
+        / "CivilServiceCommission"
+        / "civilservicecommission-embedded-training-data-(finetuned-position).parquet"
+    )
+    data = pl.read_parquet(
+        dataPath, columns=[*TEXT_FEATURES, "experience_years", TARGET]
+    ).drop_nulls()
+    if sample and sample < data.height:
+        data = data.sample(sample, seed=seed)
+
+    texts = (
+        pl.concat([data.get_column(column) for column in TEXT_FEATURES])
+        .unique(maintain_order=True)
+        .to_list()
+    )
+    index = {text: row for row, text in enumerate(texts)}
+    rows = {
+        column: np.fromiter(
+            (index[text] for text in data.get_column(column)),
+            dtype=np.int64,
+        )
+        for column in TEXT_FEATURES
+    }
+    logger.info(
+        f"Embedding {len(texts)} distinct texts of {data.height} postings."
+    )
+
+    results, vectors, features = {}, {}, {}
+    with tempfile.TemporaryDirectory() as exportDir:
+        paths = {"fp32": modelPath}
+        for name, options in VARIANTS.items():
+            paths[name] = export(modelPath, Path(exportDir) / name, **options)
+
+        for name, path in paths.items():
+            start = time.perf_counter()
+            engine = EmbeddingEngine(
+                path, batch_size=batch_size, threads=threads
+            )
+            loadSeconds = time.perf_counter() - start
+            seconds, vectors[name] = _time_embedding(engine, texts, runs)
+            features[name] = _features(vectors[name], rows, data)
+
+            weights = path / WEIGHTS_FILE
+            if not weights.exists():
+                weights = next(path.glob("*.safetensors"), None) or next(
+                    path.glob("pytorch_model.bin")
+                )
+            results[name] = {
+                "size_mb": weights.stat().st_size / 2**20,
+                "load_seconds": loadSeconds,
+                "embed_seconds": seconds,
+                "texts_per_second": len(texts) / seconds,
+            }
+
+    reference = vectors["fp32"]
+    referenceSums = reference.sum(axis=1, dtype=np.float64)
+    for name, matrix in vectors.items():
+        sums = matrix.sum(axis=1, dtype=np.float64)
+        cosine = np.sum(reference * matrix, axis=1) / (
+            np.linalg.norm(reference, axis=1) * np.linalg.norm(matrix, axis=1)
+        )
+        results[name].update(
+            {
+                "speedup": results["fp32"]["embed_seconds"]
+                / results[name]["embed_seconds"],
+                "cls_cosine_mean": float(cosine.mean()),
+                "cls_cosine_min": float(cosine.min()),
+                "cls_sum_max_abs_diff": float(
+                    np.abs(sums - referenceSums).max()
+                ),
+            }
+        )
+
+    scores = salary_scores(
+        features, data.get_column(TARGET).to_numpy(), seed=seed
+    )
+    for name, result in results.items():
+        result.update(scores[name])
+        logger.info(
+            f"{name}: {result['texts_per_second']:.0f} texts/s "
+            f"({result['speedup']:.2f}x), {result['size_mb']:.0f} MB, "
+            f"CLS cosine {result['cls_cosine_mean']:.4f} "
+            f"(min {result['cls_cosine_min']:.4f}), "
+            f"salary R² {result['r2']:.4f} "
+            f"(retrained {result['retrained_r2']:.4f})."
+        )
+
+    if output is not None:
+        output.write_text(
+            json.dumps(
+                {"texts": len(texts), "postings": data.height, **results},
+                indent=2,
+            )
+        )
+        logger.info(f"Wrote quantization report to {output}.")
+
+
+if __name__ == "__main__":
+    app()
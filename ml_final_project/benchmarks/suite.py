@@ -0,0 +1,276 @@
+from concurrent.futures import ProcessPoolExecutor
+import importlib
+import json
+from multiprocessing import get_context
+import os
+from pathlib import Path
+import platform
+import tempfile
+import time
+
+import typer
+
+from ml_final_project.benchmarks.fixtures import SCALES, build
+from ml_final_project.benchmarks.memory import (
+    peak_rss_mb,
+    reset_peak_rss,
+    rss_mb,
+)
+from ml_final_project.config import logger
+
+app = typer.Typer()
+
+# Outside the repository, and kept between runs since 100k PDFs take a
+# while to generate
+FIXTURES_DIR = Path(tempfile.gettempdir()) / "ml_final_project-fixtures"
+
+# Every stage runs offline on the fixtures of `fixtures.build`, writing
+# into a fresh work directory, and returns (items, seconds). Only the hot
+# part is timed, setup such as reading the inputs is not.
+
+
+def _listing_parse(fixtures: dict, work: Path) -> tuple:
+    from ml_final_project.scrapers.CSCHttp import CSCHttp, parse_listing_html
+
+    pages = [path.read_text() for path in sorted(fixtures["pages"].iterdir())]
+    start = time.perf_counter()
+    rows = 0
+    for page in pages:
+        rows += len(CSCHttp._to_frame(*parse_listing_html(page)))
+    return rows, time.perf_counter() - start
+
+
+def _listing_save(fixtures: dict, work: Path) -> tuple:
+    from ml_final_project.scrapers import BaseScraper
+    from ml_final_project.scrapers.CSCHttp import CSCHttp, parse_listing_html
+
+    frames = [
+        CSCHttp._to_frame(*parse_listing_html(path.read_text()))
+        for path in sorted(fixtures["pages"].iterdir())
+    ]
+    scraper = BaseScraper("CivilServiceCommission", "offline", data_dir=work)
+    # `save_to_duckdb` without the browser: the rows of each page are
+    # appended like `extract_rows` returns them
+    start = time.perf_counter()
+    for frame in frames:
+        scraper.write_duckdb(frame)
+    scraper.close()
+    return sum(len(frame) for frame in frames), time.perf_counter() - start
+
+
+def _pdf_parse(fixtures: dict, work: Path) -> tuple:
+    from ml_final_project.preprocessing.PDFParser import PDFParser
+
+    parser = PDFParser()
+    files = sorted(fixtures["pdfs"].iterdir())
+    start = time.perf_counter()
+    parsed = sum(parser.parse(path) is not None for path in files)
+    return parsed, time.perf_counter() - start
+
+
+def _pdfs_ingest(fixtures: dict, work: Path) -> tuple:
+    from ml_final_project.preprocessing.pdfs import process
+
+    start = time.perf_counter()
+    summary = process(fixtures["pdfs"], work / "pdfs.duckdb")
+    return summary["inserted"], time.perf_counter() - start
+
+
+def _preprocess(engine: str):
+    def stage(fixtures: dict, work: Path) -> tuple:
+        from ml_final_project.preprocess import preprocess
+
+        start = time.perf_counter()
+        rows = preprocess(
+            fixtures["listing_db"], fixtures["pdf_db"], work, engine=engine
+        )
+        return rows, time.perf_counter() - start
+
+    return stage
+
+
+STAGES = {
+    "listing_parse": _listing_parse,
+    "listing_save": _listing_save,
+    "pdf_parse": _pdf_parse,
+    "pdfs_ingest": _pdfs_ingest,
+    "preprocess_duckdb": _preprocess("duckdb"),
+    "preprocess_polars": _preprocess("polars"),
+}
+# Smallest increase of a stage's RSS growth reported as a regression
+MIN_RSS_GROWTH_MB = 5
+# Modules the stages import lazily, loaded before memory is measured so
+# that a stage's RSS growth is its work and not its imports
+STAGE_IMPORTS = {
+    "listing_parse": ["ml_final_project.scrapers.CSCHttp"],
+    "listing_save": [
+        "ml_final_project.scrapers.CSCHttp",
+        "ml_final_project.scrapers.DuckDBSink",
+    ],
+    "pdf_parse": ["ml_final_project.preprocessing.PDFParser"],
+    "pdfs_ingest": [
+        "duckdb",
+        "tqdm",
+        "ml_final_project.preprocessing.pdfs",
+        "ml_final_project.preprocessing.PDFManifest",
+        "ml_final_project.preprocessing.PDFParser",
+        "ml_final_project.preprocessing.PDFTableWriter",
+    ],
+    "preprocess_duckdb": ["ml_final_project.preprocess"],
+    "preprocess_polars": ["ml_final_project.preprocess"],
+}
+
+
+def _run_stage(name: str, fixtures: dict) -> dict:
+    # Runs in a fresh process, so its high-water mark is this stage alone
+    from ml_final_project.config import logger
+
+    # Stage logs would drown the results
+    logger.remove()
+    for module in STAGE_IMPORTS[name]:
+        importlib.import_module(module)
+    reset_peak_rss()
+    before = rss_mb()
+    with tempfile.TemporaryDirectory() as work:
+        items, seconds = STAGES[name](fixtures, Path(work))
+    peak = peak_rss_mb()
+    return {
+        "items": items,
+        "seconds": seconds,
+        "items_per_second": items / seconds if seconds else None,
+        "peak_rss_mb": peak,
+        "start_rss_mb": before,
+        # What the stage itself added on top of the interpreter and imports
+        "rss_growth_mb": peak - before,
+    }
+
+
+def measure(name: str, fixtures: dict, runs: int = 3) -> dict:
+    """Time a stage in freshly spawned interpreters.
+    Args:
+        name (str): Stage in `STAGES`.
+        fixtures (dict): Paths returned by `fixtures.build`.
+        runs (int): Runs, the fastest is reported.
+    Returns:
+        dict: Items processed, seconds and items per second of the fastest
+            run, and the highest peak RSS and RSS growth of all runs.
+    """
+    results = []
+    for _ in range(runs):
+        with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as pool:
+            results.append(pool.submit(_run_stage, name, fixtures).result())
+    best = min(results, key=lambda result: result["seconds"])
+    for metric in ["peak_rss_mb", "rss_growth_mb"]:
+        best[metric] = max(result[metric] for result in results)
+    return best
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Stages slower, or whose own RSS growth is higher, than in the baseline.
+
+    Memory is compared by how far RSS grew during the stage, not by the
+    peak, which also holds the interpreter and the imports. Growth of less
+    than `MIN_RSS_GROWTH_MB` more is noise and never a regression.
+    Args:
+        results (dict): Output of this run.
+        baseline (dict): Output of an earlier run at the same scale.
+        threshold (float): Allowed relative increase, 0.2 for 20%.
+    Returns:
+        list: Messages describing each regression.
+    """
+    if results["postings"] != baseline["postings"]:
+        raise ValueError(
+            f"Baseline has {baseline['postings']} postings, "
+            f"not {results['postings']}."
+        )
+    metrics = ["seconds"]
+    # Older baselines measured memory from ru_maxrss, which is not
+    # comparable
+    if baseline.get("memory") == results["memory"]:
+        metrics.append("rss_growth_mb")
+    regressions = []
+    for name, result in results["stages"].items():
+        previous = baseline["stages"].get(name)
+        if previous is None:
+            continue
+        for metric in metrics:
+            if metric == "rss_growth_mb" and (
+                result[metric] - previous[metric] < MIN_RSS_GROWTH_MB
+            ):
+                continue
+            change = result[metric] / max(previous[metric], 1e-9) - 1
+            if change > threshold:
+                message = (
+                    f"{name} {metric}: {previous[metric]:.3f} -> "
+                    f"{result[metric]:.3f} (+{change:.0%})"
+                )
+                if metric == "rss_growth_mb":
+                    message += (
+                        f", peak RSS {previous['peak_rss_mb']:.0f} -> "
+                        f"{result['peak_rss_mb']:.0f} MB"
+                    )
+                regressions.append(message)
+    return regressions
+
+
+@app.command()
+def main(
+    scale: str = "1k",  # 1k, 10k or 100k postings, or a number
+    stages: str = ",".join(STAGES),  # Comma separated stages to run
+    runs: int = 3,  # Runs per stage, the fastest is reported
+    seed: int = 0,  # Seed of the synthetic postings
+    fixtures_dir: Path = FIXTURES_DIR,  # Cache of generated fixtures
+    output: Path = None,  # Write the results as JSON to this file
+    baseline: Path = None,  # Results JSON to compare against
+    threshold: float = 0.2,  # Allowed slowdown against the baseline
+):
+    postings = SCALES[scale] if scale in SCALES else int(scale)
+    start = time.perf_counter()
+    fixtures = build(fixtures_dir, postings, seed)
+    logger.info(
+        f"Fixtures of {postings} postings ready in "
+        f"{time.perf_counter() - start:.1f}s."
+    )
+
+    results = {
+        "postings": postings,
+        "seed": seed,
+        "runs": runs,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "memory": "VmHWM",
+        "stages": {},
+    }
+    for name in stages.split(","):
+        if name not in STAGES:
+            raise typer.BadParameter(
+                f"Unknown stage {name!r}. Choose from {list(STAGES)}."
+            )
+        result = measure(name, fixtures, runs)
+        results["stages"][name] = result
+        logger.info(
+            f"{name}: {result['items']} items in {result['seconds']:.3f}s "
+            f"({result['items_per_second']:.0f}/s), "
+            f"peak RSS {result['peak_rss_mb']:.0f} MB, "
+            f"{result['rss_growth_mb']:.0f} MB of it grown by the stage."
+        )
+
+    if output is not None:
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(results, indent=2, default=str))
+        logger.info(f"Wrote benchmark results to {output}.")
+
+    if baseline is not None:
+        regressions = compare(
+            results, json.loads(baseline.read_text()), threshold
+        )
+        for regression in regressions:
+            logger.error(f"Regression: {regression}")
+        if regressions:
+            raise typer.Exit(1)
+        logger.success(f"No stage regressed by more than {threshold:.0%}.")
+
+
+if __name__ == "__main__":
+    app()
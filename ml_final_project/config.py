@@ -1,3 +1,4 @@
+from importlib.util import find_spec
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -8,7 +9,6 @@ load_dotenv()
 
 # Paths
 PROJ_ROOT = Path(__file__).resolve().parents[1]
-logger.info(f"PROJ_ROOT path is: {PROJ_ROOT}")
 
 DATA_DIR = PROJ_ROOT / "data"
 RAW_DATA_DIR = DATA_DIR / "raw"
@@ -24,10 +24,13 @@ FIGURES_DIR = REPORTS_DIR / "figures"
 
 # If tqdm is installed, configure loguru with tqdm.write
 # https://github.com/Delgan/loguru/issues/135
-try:
-    from tqdm import tqdm
+# tqdm itself is only imported once the first message is logged
+if find_spec("tqdm") is not None:
+
+    def _tqdm_sink(msg):
+        from tqdm import tqdm
+
+        tqdm.write(msg, end="")
 
     logger.remove(0)
-    logger.add(lambda msg: tqdm.write(msg, end=""), colorize=True)
-except ModuleNotFoundError:
-    pass
+    logger.add(_tqdm_sink, colorize=True)
@@ -0,0 +1,222 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+
+from ml_final_project.config import MODELS_DIR, logger
+
+STORE_DIR = MODELS_DIR / "embeddings"
+DTYPES = ("float32", "float16")
+# Files that determine a model's outputs, hashed into its store key
+MODEL_FILES = (
+    "config.json",
+    "model.safetensors",
+    "pytorch_model.bin",
+    "vocab.txt",
+    "tokenizer.json",
+    "export.json",
+    "model.pt",
+)
+
+
+def normalise_text(text: str) -> str:
+    """Collapse runs of whitespace, which BERT's tokenizer ignores."""
+    return " ".join(text.split())
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha1(normalise_text(text).encode()).hexdigest()
+
+
+def model_key(model_path: Path) -> str:
+    """Name of a model's store, its directory name and a content hash."""
+    model_path = Path(model_path)
+    digest = hashlib.sha256()
+    for name in MODEL_FILES:
+        path = model_path / name
+        if not path.exists():
+            continue
+        digest.update(name.encode())
+        with open(path, "rb") as f:
+            while chunk := f.read(1 << 20):
+                digest.update(chunk)
+    return f"{model_path.name}-{digest.hexdigest()[:16]}"
+
+
+class EmbeddingStore:
+    """Embeddings of one model, persisted across runs.
+
+    Vectors are rows of a memory-mapped matrix `vectors.<dtype>`, grown by
+    doubling, and `index.parquet` maps the SHA-1 of each normalised text
+    to its row. A text is only ever embedded once per model. `meta.json`
+    is written last, so rows added by a run that died before `flush` are
+    ignored when the store is opened again.
+    """
+
+    def __init__(self, path: Path, dim: int, dtype: str = "float32"):
+        """
+        Args:
+            path (Path): Directory of the store, created if missing.
+            dim (int): Vector size, the model's hidden size.
+            dtype (str): "float32", or "float16" to halve the file size.
+        """
+        if dtype not in DTYPES:
+            raise ValueError(f"Unknown dtype {dtype!r}. Choose from {DTYPES}.")
+
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.meta_path = self.path / "meta.json"
+        self.index_path = self.path / "index.parquet"
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.count = 0
+        # Key to row, and the key and text of every row
+        self.keys = {}
+        self.key_list = []
+        self.texts = []
+
+        if self.meta_path.exists():
+            meta = json.loads(self.meta_path.read_text())
+            if meta["dim"] != dim or meta["dtype"] != dtype:
+                raise ValueError(
+                    f"Store at {self.path} holds {meta['dim']}-d "
+                    f"{meta['dtype']} vectors, not {dim}-d {dtype}."
+                )
+            index = pl.read_parquet(self.index_path).head(meta["count"])
+            self.key_list = index["key"].to_list()
+            self.texts = index["text"].to_list()
+            self.keys = {key: row for row, key in enumerate(self.key_list)}
+            self.count = index.height
+
+        self.vectors_path = self.path / f"vectors.{dtype}"
+        capacity = max(1024, self.count)
+        if self.vectors_path.exists():
+            capacity = max(
+                capacity,
+                self.vectors_path.stat().st_size
+                // (dim * self.dtype.itemsize),
+            )
+        self._map(capacity)
+
+    @classmethod
+    def for_model(
+        cls, model_path: Path, root: Path = STORE_DIR, dtype: str = "float32"
+    ) -> "EmbeddingStore":
+        """Open the store of a model, keyed by its path and file hash."""
+        model_path, root = Path(model_path), Path(root)
+        config = json.loads((model_path / "config.json").read_text())
+        key = model_key(model_path)
+        path = root / key / dtype
+        logger.info(f"Embedding store for {model_path.name}: {path}")
+        return cls(path, config["hidden_size"], dtype)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """Memory-mapped view of all stored vectors, without copying."""
+        return self._vectors[: self.count]
+
+    def rows(self, texts: list) -> np.ndarray:
+        """Row of every text, -1 for texts that are not stored."""
+        return np.fromiter(
+            (self.keys.get(text_key(text), -1) for text in texts),
+            dtype=np.int64,
+            count=len(texts),
+        )
+
+    def missing(self, texts: list) -> list:
+        """Texts to embed: not stored yet, one per normalised text."""
+        seen = set(self.keys)
+        missing = []
+        for text in texts:
+            key = text_key(text)
+            if key not in seen:
+                seen.add(key)
+                missing.append(text)
+        return missing
+
+    def add(self, texts: list, vectors: np.ndarray) -> np.ndarray:
+        """Store the vectors of new texts.
+        Args:
+            texts (list): Texts not in the store yet, see `missing`.
+            vectors (np.ndarray): Matrix of shape (len(texts), dim).
+        Returns:
+            np.ndarray: Rows the texts were stored at.
+        """
+        start = self.count
+        rows = np.arange(start, start + len(texts), dtype=np.int64)
+        if start + len(texts) > len(self._vectors):
+            self._map(max(2 * len(self._vectors), start + len(texts)))
+        self._vectors[start : start + len(texts)] = vectors
+        for row, text in zip(rows.tolist(), texts):
+            key = text_key(text)
+            self.keys[key] = row
+            self.key_list.append(key)
+        self.texts.extend(texts)
+        self.count += len(texts)
+        return rows
+
+    def get(self, rows: np.ndarray) -> np.ndarray:
+        """Vectors of rows as float32, NaN for rows of -1."""
+        vectors = self.matrix[np.maximum(rows, 0)].astype(
+            np.float32, copy=False
+        )
+        vectors[rows < 0] = np.nan
+        return vectors
+
+    def to_arrow(self, rows: np.ndarray):
+        """Vectors of rows as a pyarrow FixedSizeListArray, no lists."""
+        import pyarrow as pa
+
+        vectors = self.get(rows)
+        return pa.FixedSizeListArray.from_arrays(
+            pa.array(vectors.reshape(-1)), self.dim
+        )
+
+    def flush(self):
+        """Persist the vectors, then the index, then the row count."""
+        self._vectors.flush()
+        index = pl.DataFrame({"key": self.key_list, "text": self.texts})
+        self._replace(self.index_path, index.write_parquet)
+        meta = {
+            "dim": self.dim,
+            "dtype": self.dtype.name,
+            "count": self.count,
+        }
+        self._replace(
+            self.meta_path,
+            lambda path: Path(path).write_text(json.dumps(meta, indent=2)),
+        )
+
+    def _map(self, capacity: int):
+        # Growing the file keeps the rows already written in place
+        size = capacity * self.dim * self.dtype.itemsize
+        if (
+            not self.vectors_path.exists()
+            or self.vectors_path.stat().st_size < size
+        ):
+            with open(self.vectors_path, "ab") as f:
+                f.truncate(size)
+        self._vectors = np.memmap(
+            self.vectors_path,
+            dtype=self.dtype,
+            mode="r+",
+            shape=(capacity, self.dim),
+        )
+
+    @staticmethod
+    def _replace(path: Path, write):
+        tmpPath = path.with_name(path.name + ".tmp")
+        write(tmpPath)
+        os.replace(tmpPath, path)
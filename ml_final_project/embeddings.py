@@ -0,0 +1,248 @@
+from pathlib import Path
+import time
+
+import numpy as np
+import polars as pl
+import typer
+
+from ml_final_project.config import PROCESSED_DATA_DIR, PROJ_ROOT, logger
+from ml_final_project.embedding_store import EmbeddingStore
+
+app = typer.Typer()
+
+# The job title adapted BERT of notebook 3.2
+MODEL_PATH = PROJ_ROOT / "notebooks" / "bert-jobtitles-adapted"
+
+# Text columns embedded for the salary models, and their output columns
+EMBEDDING_COLUMNS = {
+    "Position Title": "positiontitle_embedding",
+    "Agency": "agency_embedding",
+    "Education": "education_embedding",
+    "Experience": "experience_embedding",
+    "Eligibility": "eligibility_embedding",
+    "SalaryGrade": "salarygrade_embedding",
+}
+REDUCTIONS = ("cls", "cls_sum")
+
+
+class EmbeddingEngine:
+    """Batched CLS embeddings of text columns with a BERT model.
+
+    Every distinct text is embedded once. Texts are tokenized together,
+    sorted by token length and run through the model in batches that are
+    only padded to their longest member, under `torch.inference_mode`.
+    The vectors are then scattered back to the rows they came from.
+    """
+
+    def __init__(
+        self,
+        model_path: Path = MODEL_PATH,
+        batch_size: int = 64,
+        threads: int | None = None,
+        max_length: int = 512,
+        reduce: str = "cls",
+        store: EmbeddingStore | None = None,
+    ):
+        """
+        Args:
+            model_path (Path): Directory of the tokenizer and BERT model,
+                or of a model exported by `modeling.quantize`.
+            batch_size (int): Texts per forward pass.
+            threads (int): torch intra-op threads. None keeps the default.
+            max_length (int): Longer texts are truncated to this many
+                tokens, the model's position limit.
+            reduce (str): "cls" keeps the CLS vector, "cls_sum" sums it to
+                the single number notebook 3.2 used as the feature.
+            store (EmbeddingStore): Persistent store of this model's
+                vectors. Stored texts are not embedded again.
+        """
+        import torch
+        from transformers import AutoConfig, AutoTokenizer
+
+        from ml_final_project.modeling.quantize import load
+
+        if reduce not in REDUCTIONS:
+            raise ValueError(
+                f"Unknown reduction {reduce!r}. Choose from {REDUCTIONS}."
+            )
+        if threads is not None:
+            torch.set_num_threads(threads)
+
+        self.model_path = Path(model_path)
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.reduce = reduce
+        self.store = store
+        # The fast tokenizer gives the same token IDs as BertTokenizer
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_path)
+        # Full precision, or an int8 or TorchScript export of the model
+        self.model = load(self.model_path)
+        self.hidden_size = AutoConfig.from_pretrained(
+            self.model_path
+        ).hidden_size
+
+    def embed(self, texts: list) -> np.ndarray:
+        """CLS vectors of distinct texts, in the order given.
+        Args:
+            texts (list): Distinct, non-null strings.
+        Returns:
+            np.ndarray: float32 matrix of shape (len(texts), hidden size).
+        """
+        import torch
+
+        vectors = np.empty((len(texts), self.hidden_size), dtype=np.float32)
+        if not texts:
+            return vectors
+
+        encoded = self.tokenizer(
+            texts, truncation=True, max_length=self.max_length
+        )["input_ids"]
+        # Batches of similar lengths waste little compute on padding
+        order = sorted(range(len(texts)), key=lambda i: len(encoded[i]))
+
+        with torch.inference_mode():
+            for start in range(0, len(order), self.batch_size):
+                batch = order[start : start + self.batch_size]
+                inputs = self.tokenizer.pad(
+                    {"input_ids": [encoded[i] for i in batch]},
+                    return_tensors="pt",
+                )
+                vectors[batch] = self.model(
+                    inputs["input_ids"], inputs["attention_mask"]
+                ).numpy()
+        return vectors
+
+    def embed_series(self, series: pl.Series) -> pl.Series:
+        """Embed a text column, each distinct value once.
+        Args:
+            series (pl.Series): Strings, nulls stay null.
+        Returns:
+            pl.Series: Array(Float32, hidden size) for "cls", Float64 for
+                "cls_sum".
+        """
+        frame = self.embed_frame(series.to_frame(), {series.name: series.name})
+        return frame.get_column(series.name)
+
+    @staticmethod
+    def matrix(data: pl.DataFrame, columns: list) -> np.ndarray:
+        """Feature matrix of embedding columns, side by side.
+
+        A single Array column without nulls is returned as a view of its
+        buffer. Several columns are concatenated into one copy, scalar
+        columns such as `experience_years` taking one column each.
+        """
+        arrays = [
+            data.get_column(column).to_numpy(allow_copy=len(columns) > 1)
+            for column in columns
+        ]
+        if len(arrays) == 1 and arrays[0].ndim == 2:
+            return arrays[0]
+        return np.column_stack(
+            [array if array.ndim == 2 else array[:, None] for array in arrays]
+        )
+
+    def embed_frame(
+        self, data: pl.DataFrame, columns: dict = EMBEDDING_COLUMNS
+    ) -> pl.DataFrame:
+        """Add embedding columns to a frame.
+
+        The distinct texts of all columns are embedded together, so a
+        text found in several columns is embedded only once.
+        Args:
+            data (pl.DataFrame): Frame with the text columns.
+            columns (dict): Text column to output column.
+        Returns:
+            pl.DataFrame: `data` with the output columns added.
+        """
+        texts = (
+            pl.concat(
+                [data.get_column(column).drop_nulls() for column in columns]
+            )
+            .unique(maintain_order=True)
+            .to_list()
+        )
+
+        missing = texts if self.store is None else self.store.missing(texts)
+        start = time.perf_counter()
+        vectors = self.embed(missing)
+        seconds = time.perf_counter() - start
+        logger.info(
+            f"Embedded {len(missing)} new of {len(texts)} distinct texts of {data.height * len(columns)} "
+            f"cells in {seconds:.1f}s ({len(missing) / max(seconds, 1e-9):.0f} texts/s)."
+        )
+
+        if self.store is not None:
+            self.store.add(missing, vectors)
+            self.store.flush()
+            rows = self.store.rows(texts)
+            if self.reduce == "cls_sum":
+                vectors = self.store.get(rows)
+            else:
+                # Fixed-size Arrow array, wrapped by Polars without a copy
+                values = pl.Series(self.store.to_arrow(rows))
+
+        if self.reduce == "cls_sum":
+            values = pl.Series(vectors.sum(axis=1, dtype=np.float64))
+        elif self.store is None:
+            values = pl.Series(vectors)
+        index = pl.DataFrame(
+            {"text": texts, "row": np.arange(len(texts), dtype=np.uint32)}
+        )
+
+        # Rows of the distinct texts, gathered back onto every row
+        return data.with_columns(
+            values.gather(
+                data.select(pl.col(column).alias("text"))
+                .join(index, on="text", how="left", maintain_order="left")
+                .get_column("row")
+            ).alias(output)
+            for column, output in columns.items()
+        )
+
+
+@app.command()
+def main(
+    input: Path = None,  # Parquet file with the text columns
+    output: Path = None,  # Parquet file to write with embeddings added
+    model_path: Path = MODEL_PATH,  # Directory of the BERT model or export
+    batch_size: int = 64,  # Texts per forward pass
+    threads: int = None,  # torch threads, defaults to torch's choice
+    reduce: str = "cls_sum",  # cls (vectors) or cls_sum (notebook scalar)
+    store: bool = True,  # Reuse and keep vectors in the embedding store
+    store_dtype: str = "float32",  # Store vectors as float32 or float16
+):
+    inputPath = input or (
+        PROCESSED_DATA_DIR
+        / "CivilServiceCommission"
+        / "civilservicecommission-2.parquet"
+    )
+    outputPath = output or (
+        PROCESSED_DATA_DIR
+        / "CivilServiceCommission"
+        / "civilservicecommission-embedded.parquet"
+    )
+
+    data = pl.read_parquet(inputPath)
+    engine = EmbeddingEngine(
+        model_path,
+        batch_size=batch_size,
+        threads=threads,
+        reduce=reduce,
+        store=(
+            EmbeddingStore.for_model(model_path, dtype=store_dtype)
+            if store
+            else None
+        ),
+    )
+    columns = {
+        column: name
+        for column, name in EMBEDDING_COLUMNS.items()
+        if column in data.columns
+    }
+    embedded = engine.embed_frame(data, columns)
+    embedded.write_parquet(outputPath)
+    logger.success(f"Saved {embedded.height} embedded rows to {outputPath}.")
+
+
+if __name__ == "__main__":
+    app()
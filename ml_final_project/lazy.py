@@ -0,0 +1,40 @@
+from importlib import import_module
+import sys
+from types import ModuleType
+
+
+class _LazyPackage(ModuleType):
+    """Package whose classes are imported on first attribute access.
+
+    Every class lives in a submodule of the same name. The import system
+    binds a submodule on its package once loaded, which would shadow the
+    class, so those bindings are ignored and the class is kept instead.
+    """
+
+    def __setattr__(self, name: str, value):
+        if isinstance(value, ModuleType) and name in self._lazy_classes:
+            return
+        super().__setattr__(name, value)
+
+
+def lazy_package(name: str, classes: list):
+    """Import the classes of package `name` lazily (PEP 562).
+    Args:
+        name (str): `__name__` of the package.
+        classes (list): Class names, each defined in the submodule of the
+            same name.
+    Returns:
+        function: The package's module level `__getattr__`.
+    """
+    package = sys.modules[name]
+
+    def __getattr__(attr: str):
+        if attr not in classes:
+            raise AttributeError(f"module {name!r} has no attribute {attr!r}")
+        value = getattr(import_module(f"{name}.{attr}"), attr)
+        ModuleType.__setattr__(package, attr, value)
+        return value
+
+    package._lazy_classes = frozenset(classes)
+    package.__class__ = _LazyPackage
+    return __getattr__
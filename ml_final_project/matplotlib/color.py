@@ -1,8 +1,9 @@
 from enum import Enum
+from typing import TYPE_CHECKING
 
-import matplotlib.colors as mcolors
-
-from ml_final_project.config import logger
+# matplotlib is only imported by the colormap methods
+if TYPE_CHECKING:
+    import matplotlib.colors as mcolors
 
 
 class Color(Enum):
@@ -71,8 +72,10 @@ class Color(Enum):
         return pallete
 
     @classmethod
-    def BlWhOr(cls: type) -> mcolors.LinearSegmentedColormap:
+    def BlWhOr(cls: type) -> "mcolors.LinearSegmentedColormap":
         """Get a color palette for B/W."""
+        import matplotlib.colors as mcolors
+
         pallete: list = [
             cls.BLUE.value,
             cls.WHITE.value,
@@ -83,8 +86,10 @@ class Color(Enum):
         )
 
     @classmethod
-    def BlWhRd(cls: type) -> mcolors.LinearSegmentedColormap:
+    def BlWhRd(cls: type) -> "mcolors.LinearSegmentedColormap":
         """Get a color palette for B/W."""
+        import matplotlib.colors as mcolors
+
         pallete: list = [
             cls.BLUE.value,
             cls.WHITE.value,
@@ -95,8 +100,10 @@ class Color(Enum):
         )
 
     @classmethod
-    def WhBl(cls: type) -> mcolors.LinearSegmentedColormap:
+    def WhBl(cls: type) -> "mcolors.LinearSegmentedColormap":
         """Get a color palette for B/W."""
+        import matplotlib.colors as mcolors
+
         palette: list = [
             cls.WHITE.value,
             cls.BLUE.value,
@@ -104,8 +111,3 @@ class Color(Enum):
         return mcolors.LinearSegmentedColormap.from_list(
             "BlWhOr", palette, N=256
         )
-
-
-logger.info(
-    "Accessible color palette inspired by https://github.com/mpetroff/accessible-color-cycles."
-)
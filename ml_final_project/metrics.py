@@ -0,0 +1,534 @@
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from functools import wraps
+from itertools import count as counter
+import json
+import math
+import os
+from pathlib import Path
+import re
+import threading
+import time
+
+from ml_final_project.config import REPORTS_DIR, logger
+
+# Timers, counters and histograms of the pipeline stages, with optional
+# span tracing. Everything is off until `enable` (or `session`) is called,
+# and until then every call returns after checking a single flag, so the
+# hot paths can stay instrumented.
+
+METRICS_DIR = REPORTS_DIR / "metrics"
+PREFIX = "ml_final_project"
+PROFILERS = ("none", "cprofile", "py-spy")
+# Upper bounds of the histogram buckets, in seconds and in bytes
+BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+SIZE_BUCKETS = tuple(2**power for power in range(10, 27, 2))
+# Spans kept per run, later ones are only counted as dropped
+MAX_SPANS = 100_000
+
+_enabled = False
+_tracing = False
+_lock = threading.Lock()
+# (name, labels) -> value
+_counters = {}
+# (name, labels) -> Histogram
+_histograms = {}
+_spans = []
+_dropped_spans = 0
+_span_ids = counter(1)
+_current_span = ContextVar("current_span", default=None)
+_NULL = nullcontext()
+
+
+class Histogram:
+    """Bucketed observations of one metric, as Prometheus keeps them."""
+
+    __slots__ = ("buckets", "unit", "counts", "count", "sum", "min", "max")
+
+    def __init__(self, buckets: tuple = BUCKETS, unit: str = ""):
+        self.buckets = buckets
+        self.unit = unit
+        # The last count is the +Inf bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: "Histogram"):
+        if other.buckets != self.buckets:
+            raise ValueError("Cannot merge histograms with other buckets.")
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by interpolating inside its bucket."""
+        if not self.count:
+            return math.nan
+        rank = q * self.count
+        seen = 0
+        for i, bucketCount in enumerate(self.counts):
+            if seen + bucketCount >= rank and bucketCount:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                value = lower + (upper - lower) * (rank - seen) / bucketCount
+                return min(max(value, self.min), self.max)
+            seen += bucketCount
+        return self.max
+
+    def to_dict(self) -> dict:
+        cumulative = 0
+        buckets = {}
+        for bound, bucketCount in zip(self.buckets, self.counts):
+            cumulative += bucketCount
+            buckets[str(bound)] = cumulative
+        buckets["+Inf"] = self.count
+        return {
+            "unit": self.unit,
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else None,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "buckets": buckets,
+        }
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted(labels.items())) if labels else ()
+
+
+def _format_key(key: tuple) -> str:
+    name, labels = key
+    if not labels:
+        return name
+    pairs = ",".join(f'{label}="{value}"' for label, value in labels)
+    return f"{name}{{{pairs}}}"
+
+
+def _observe(key: tuple, value: float, buckets: tuple, unit: str):
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram(buckets, unit)
+        histogram.observe(value)
+
+
+class _Timer:
+    """Times a block into a histogram and, when tracing, records a span."""
+
+    __slots__ = ("key", "start", "span", "token")
+
+    def __init__(self, key: tuple):
+        self.key = key
+        self.span = None
+
+    def __enter__(self):
+        if _tracing:
+            self.span = {
+                "id": f"{os.getpid()}:{next(_span_ids)}",
+                "parent": _current_span.get(),
+                "name": _format_key(self.key),
+                "start": time.time(),
+            }
+            self.token = _current_span.set(self.span["id"])
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        _observe(self.key, seconds, BUCKETS, "seconds")
+        if self.span is not None:
+            _current_span.reset(self.token)
+            self.span["seconds"] = seconds
+            self.span["error"] = exc_type.__name__ if exc_type else None
+            _record_span(self.span)
+
+
+def _record_span(span: dict):
+    global _dropped_spans
+
+    with _lock:
+        if len(_spans) < MAX_SPANS:
+            _spans.append(span)
+        else:
+            _dropped_spans += 1
+
+
+def enable(tracing: bool = False):
+    """Start collecting metrics in this process.
+    Args:
+        tracing (bool): Also record a span, with its parent, for every
+            timed block.
+    """
+    global _enabled, _tracing
+    _enabled = True
+    _tracing = tracing
+
+
+def disable():
+    global _enabled, _tracing
+    _enabled = False
+    _tracing = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def is_tracing() -> bool:
+    return _tracing
+
+
+def reset():
+    """Drop everything collected so far."""
+    global _dropped_spans
+
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _spans.clear()
+        _dropped_spans = 0
+
+
+def timer(name: str, **labels):
+    """Context manager timing its block into the `name` histogram.
+    Args:
+        name (str): Metric name, dotted by stage, e.g. "pdf_parse.text".
+        **labels: Label values distinguishing series of the same metric.
+    """
+    if not _enabled:
+        return _NULL
+    return _Timer(_key(name, labels))
+
+
+def timed(name: str):
+    """Decorator timing every call of a function, see `timer`."""
+
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _Timer((name, ())):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def count(name: str, value: float = 1, **labels):
+    """Add `value` to the `name` counter."""
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(
+    name: str,
+    value: float,
+    buckets: tuple = SIZE_BUCKETS,
+    unit: str = "bytes",
+    **labels,
+):
+    """Record a value, such as a download size, in the `name` histogram."""
+    if not _enabled:
+        return
+    _observe(_key(name, labels), value, buckets, unit)
+
+
+def snapshot(reset: bool = False) -> dict:
+    """Everything collected so far, picklable to send between processes.
+    Args:
+        reset (bool): Clear the collected metrics, so a worker only sends
+            what is new since its last snapshot.
+    Returns:
+        dict: Counters, histograms, spans and the dropped span count.
+    """
+    global _dropped_spans
+
+    with _lock:
+        data = {
+            "counters": dict(_counters),
+            "histograms": {
+                key: (h.buckets, h.unit, h.counts, h.sum, h.min, h.max)
+                for key, h in _histograms.items()
+            },
+            "spans": list(_spans),
+            "dropped_spans": _dropped_spans,
+        }
+        if reset:
+            _counters.clear()
+            _histograms.clear()
+            _spans.clear()
+            _dropped_spans = 0
+    return data
+
+
+def merge(data: dict | None):
+    """Add a `snapshot`, e.g. of a worker process, to this process."""
+    global _dropped_spans
+
+    if not data:
+        return
+    with _lock:
+        for key, value in data["counters"].items():
+            _counters[key] = _counters.get(key, 0) + value
+        for key, (buckets, unit, counts, total, low, high) in data[
+            "histograms"
+        ].items():
+            other = Histogram(buckets, unit)
+            other.counts = counts
+            other.count = sum(counts)
+            other.sum, other.min, other.max = total, low, high
+            if key not in _histograms:
+                _histograms[key] = Histogram(buckets, unit)
+            _histograms[key].merge(other)
+        room = MAX_SPANS - len(_spans)
+        _spans.extend(data["spans"][:room])
+        _dropped_spans += data["dropped_spans"]
+        _dropped_spans += max(len(data["spans"]) - room, 0)
+
+
+def summary() -> dict:
+    """Counters, histogram statistics and spans as a JSON-ready dict."""
+    with _lock:
+        result = {
+            "counters": {
+                _format_key(key): value
+                for key, value in sorted(_counters.items())
+            },
+            "histograms": {
+                _format_key(key): histogram.to_dict()
+                for key, histogram in sorted(_histograms.items())
+            },
+        }
+        if _spans or _dropped_spans:
+            result["spans"] = list(_spans)
+            result["dropped_spans"] = _dropped_spans
+    return result
+
+
+def _prometheus_name(name: str, suffix: str = "") -> str:
+    name = re.sub(r"[^a-zA-Z0-9_]", "_", f"{PREFIX}_{name}")
+    return f"{name}_{suffix}" if suffix else name
+
+
+def _prometheus_labels(labels: tuple, extra: tuple = ()) -> str:
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ""
+    escaped = (
+        (label, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for label, value in pairs
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def to_prometheus() -> str:
+    """The metrics in the Prometheus text exposition format."""
+    lines = []
+    typed = set()
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted(_histograms.items())
+
+    for (name, labels), value in counters:
+        metric = _prometheus_name(name, "total")
+        if metric not in typed:
+            typed.add(metric)
+            lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric}{_prometheus_labels(labels)} {value}")
+
+    for (name, labels), histogram in histograms:
+        metric = _prometheus_name(name, histogram.unit)
+        if metric not in typed:
+            typed.add(metric)
+            lines.append(f"# TYPE {metric} histogram")
+        cumulative = 0
+        for bound, bucketCount in zip(
+            [*map(str, histogram.buckets), "+Inf"], histogram.counts
+        ):
+            cumulative += bucketCount
+            bucketLabels = _prometheus_labels(labels, (("le", bound),))
+            lines.append(f"{metric}_bucket{bucketLabels} {cumulative}")
+        lines.append(
+            f"{metric}_sum{_prometheus_labels(labels)} {histogram.sum}"
+        )
+        lines.append(
+            f"{metric}_count{_prometheus_labels(labels)} {histogram.count}"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def write(name: str, directory: Path = METRICS_DIR, **info) -> Path:
+    """Write the run's summary as `<name>.json` and `<name>.prom`.
+    Args:
+        name (str): File name of the run, without suffix.
+        directory (Path): Directory of the metric files.
+        **info: Extra fields stored at the top of the JSON summary.
+    Returns:
+        Path: The JSON summary.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    jsonPath = directory / f"{name}.json"
+    jsonPath.write_text(
+        json.dumps({**info, **summary()}, indent=2, default=str)
+    )
+    (directory / f"{name}.prom").write_text(to_prometheus())
+    return jsonPath
+
+
+def log_summary(top: int = 10):
+    """Log the timers that took the most time in total."""
+    with _lock:
+        timers = sorted(
+            (
+                (key, histogram)
+                for key, histogram in _histograms.items()
+                if histogram.unit == "seconds"
+            ),
+            key=lambda item: item[1].sum,
+            reverse=True,
+        )
+    for key, histogram in timers[:top]:
+        logger.info(
+            f"{_format_key(key)}: {histogram.count} calls, "
+            f"{histogram.sum:.2f}s total, "
+            f"P50 {histogram.quantile(0.5) * 1000:.1f} ms, "
+            f"P99 {histogram.quantile(0.99) * 1000:.1f} ms"
+        )
+
+
+@contextmanager
+def _cprofile(path: Path):
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        logger.info(f"Wrote cProfile stats to {path}.")
+
+
+@contextmanager
+def _py_spy(path: Path):
+    # Samples this process from outside, including native frames, at a
+    # far lower overhead than cProfile
+    import shutil
+    import signal
+    import subprocess
+
+    executable = shutil.which("py-spy")
+    if executable is None:
+        logger.warning("py-spy is not installed, not profiling.")
+        yield
+        return
+    process = subprocess.Popen(
+        [
+            executable,
+            "record",
+            "--pid",
+            str(os.getpid()),
+            "--subprocesses",
+            "--output",
+            str(path),
+        ]
+    )
+    try:
+        yield
+    finally:
+        process.send_signal(signal.SIGINT)
+        process.wait()
+        logger.info(f"Wrote py-spy flame graph to {path}.")
+
+
+@contextmanager
+def session(
+    run: str,
+    enabled: bool = True,
+    tracing: bool = False,
+    profile: str = "none",
+    directory: Path = METRICS_DIR,
+):
+    """Collect the metrics of a command and write them when it ends.
+    Args:
+        run (str): Name of the run, the files are `<run>-<timestamp>.*`.
+        enabled (bool): Collect metrics. When False only profiling runs.
+        tracing (bool): Also record spans, see `enable`.
+        profile (str): "cprofile" to write `.prof` stats, "py-spy" to
+            record a flame graph, or "none".
+        directory (Path): Directory of the metric and profile files.
+    """
+    if profile not in PROFILERS:
+        raise ValueError(
+            f"Unknown profiler {profile!r}. Choose from {PROFILERS}."
+        )
+
+    name = f"{run}-{time.strftime('%Y%m%d-%H%M%S')}"
+    if profile != "none":
+        directory.mkdir(parents=True, exist_ok=True)
+    profiler = {
+        "none": lambda: nullcontext(),
+        "cprofile": lambda: _cprofile(directory / f"{name}.prof"),
+        "py-spy": lambda: _py_spy(directory / f"{name}.svg"),
+    }[profile]
+
+    if enabled:
+        reset()
+        enable(tracing)
+    started = time.time()
+    start = time.perf_counter()
+    try:
+        with profiler():
+            yield
+    finally:
+        if enabled:
+            disable()
+            path = write(
+                name,
+                directory,
+                run=run,
+                started=time.strftime(
+                    "%Y-%m-%dT%H:%M:%S", time.localtime(started)
+                ),
+                seconds=time.perf_counter() - start,
+            )
+            log_summary()
+            logger.info(f"Wrote metrics to {path}.")
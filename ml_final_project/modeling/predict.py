@@ -0,0 +1,236 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+from pathlib import Path
+import time
+
+import numpy as np
+import polars as pl
+import typer
+
+from ml_final_project.config import MODELS_DIR, PROCESSED_DATA_DIR, logger
+
+app = typer.Typer()
+
+MODEL_FILE = MODELS_DIR / "salary-knn.joblib"
+TARGET = "MonthlySalary"
+# Feature derived from the Experience text, see `prepare`
+EXPERIENCE_FEATURE = "experience_years"
+# Errors caused by a malformed request rather than by the server
+REQUEST_ERRORS = (KeyError, TypeError, ValueError, pl.exceptions.PolarsError)
+
+
+class SalaryModel:
+    """Salary regressor of notebook 3.2, bundled with its preprocessing.
+
+    The bundle holds the feature columns in order, an optional fitted
+    dimensionality reduction and a `KNeighborsRegressor` whose neighbour
+    index (a KD or ball tree) is built when it is fitted, so queries do
+    not scan the training matrix. Saved with joblib, uncompressed, so the
+    training matrix and tree arrays are memory-mapped when loaded.
+    """
+
+    def __init__(
+        self,
+        features: list,
+        regressor,
+        reducer=None,
+        reduce: str = "cls_sum",
+        metrics: dict | None = None,
+    ):
+        """
+        Args:
+            features (list): Feature columns, scalars or Array embeddings.
+            regressor: Fitted `KNeighborsRegressor`.
+            reducer: Fitted PCA or random projection, or None.
+            reduce (str): `EmbeddingEngine` reduction of the embedding
+                features, "cls_sum" for scalars and "cls" for vectors.
+            metrics (dict): Evaluation results stored with the model.
+        """
+        self.features = features
+        self.regressor = regressor
+        self.reducer = reducer
+        self.reduce = reduce
+        self.metrics = metrics or {}
+
+    def matrix(self, data: pl.DataFrame) -> np.ndarray:
+        """Features of `data` side by side, Array columns expanded."""
+        columns = []
+        for feature in self.features:
+            series = data.get_column(feature)
+            # Vectors arrive as lists in JSON requests, not as arrays
+            if isinstance(series.dtype, pl.List):
+                width = series.list.len().max()
+                series = series.cast(pl.Array(pl.Float64, width))
+            columns.append(series.to_numpy())
+        return np.column_stack(
+            [c if c.ndim == 2 else c[:, None] for c in columns]
+        ).astype(np.float64, copy=False)
+
+    def transform(self, matrix: np.ndarray) -> np.ndarray:
+        if self.reducer is None:
+            return matrix
+        return self.reducer.transform(matrix)
+
+    def predict(self, data: pl.DataFrame | np.ndarray) -> np.ndarray:
+        """Monthly salaries of a batch of postings.
+        Args:
+            data (pl.DataFrame | np.ndarray): Frame with the feature
+                columns, or their matrix as built by `matrix`.
+        Returns:
+            np.ndarray: One predicted salary per row.
+        """
+        if isinstance(data, pl.DataFrame):
+            data = self.matrix(data)
+        return self.regressor.predict(self.transform(data)).reshape(-1)
+
+    def save(self, path: Path = MODEL_FILE) -> Path:
+        import joblib
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        joblib.dump(self, path)
+        return path
+
+    @classmethod
+    def load(cls, path: Path = MODEL_FILE, mmap: bool = True):
+        import joblib
+
+        return joblib.load(path, mmap_mode="r" if mmap else None)
+
+
+def prepare(data: pl.DataFrame, model: SalaryModel, engine=None):
+    """Compute the model's features that `data` only has as text.
+
+    `experience_years` is derived from an `Experience` column, and
+    embedding features from their text columns with `engine`, an
+    `EmbeddingEngine` configured like the one that built the training data.
+    """
+    from ml_final_project.embeddings import EMBEDDING_COLUMNS
+
+    missing = [f for f in model.features if f not in data.columns]
+    if EXPERIENCE_FEATURE in missing and "Experience" in data.columns:
+        from ml_final_project.features import add_experience_years
+
+        data = add_experience_years(data).rename(
+            {"Experience_years": EXPERIENCE_FEATURE}
+        )
+
+    columns = {
+        text: feature
+        for text, feature in EMBEDDING_COLUMNS.items()
+        if feature in missing and text in data.columns
+    }
+    if columns:
+        if engine is None:
+            raise ValueError(
+                f"Computing {list(columns.values())} needs an embedding model."
+            )
+        data = engine.embed_frame(data, columns)
+    return data
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Set on the subclass made by `serve`
+    model: SalaryModel = None
+    engine = None
+
+    def _reply(self, status: int, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path != "/health":
+            return self._reply(404, {"error": f"No route {self.path}"})
+        self._reply(200, {"status": "ok", "features": self.model.features})
+
+    def do_POST(self):
+        if self.path != "/predict":
+            return self._reply(404, {"error": f"No route {self.path}"})
+        start = time.perf_counter()
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            instances = json.loads(self.rfile.read(length))["instances"]
+            data = prepare(pl.DataFrame(instances), self.model, self.engine)
+            predictions = self.model.predict(data)
+        except REQUEST_ERRORS as e:
+            return self._reply(400, {"error": str(e)})
+        self._reply(
+            200,
+            {
+                "predictions": predictions.tolist(),
+                "milliseconds": (time.perf_counter() - start) * 1000,
+            },
+        )
+
+    def log_message(self, format: str, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+def serve(
+    model: SalaryModel,
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    engine=None,
+):
+    """Answer prediction requests over HTTP until interrupted.
+
+    POST /predict takes `{"instances": [{feature: value, ...}, ...]}`, a
+    batch of postings with the model's features or their texts, and
+    returns `{"predictions": [...]}`. GET /health lists the features.
+    """
+    handler = type("Handler", (_Handler,), {"model": model, "engine": engine})
+    with ThreadingHTTPServer((host, port), handler) as server:
+        logger.info(f"Serving salary predictions on http://{host}:{port}.")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logger.info("Stopped serving.")
+
+
+@app.command()
+def main(
+    input: Path = None,  # Parquet file of postings to predict
+    output: Path = None,  # Parquet file to write with predictions added
+    model_path: Path = MODEL_FILE,  # Model bundle written by train
+    embedding_model: Path = None,  # BERT model to embed text columns with
+    http: bool = False,  # Serve predictions over HTTP instead
+    host: str = "127.0.0.1",  # Address to serve on
+    port: int = 8000,  # Port to serve on
+):
+    model = SalaryModel.load(model_path)
+    engine = None
+    if embedding_model is not None:
+        from ml_final_project.embeddings import EmbeddingEngine
+
+        engine = EmbeddingEngine(embedding_model, reduce=model.reduce)
+
+    if http:
+        return serve(model, host, port, engine)
+
+    inputPath = input or (
+        PROCESSED_DATA_DIR
+        / "CivilServiceCommission"
+        / "civilservicecommission-embedded-training-data-(finetuned-position).parquet"
+    )
+    outputPath = output or inputPath.with_name(
+        inputPath.stem + "-predictions.parquet"
+    )
+    data = prepare(pl.read_parquet(inputPath), model, engine)
+    start = time.perf_counter()
+    predictions = model.predict(data)
+    seconds = time.perf_counter() - start
+    data.with_columns(
+        pl.Series(f"Predicted{TARGET}", predictions)
+    ).write_parquet(outputPath)
+    logger.success(
+        f"Predicted {len(predictions)} salaries in {seconds:.2f}s, saved to "
+        f"{outputPath}."
+    )
+
+
+if __name__ == "__main__":
+    app()
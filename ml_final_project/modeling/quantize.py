@@ -0,0 +1,169 @@
+import json
+from pathlib import Path
+import time
+import warnings
+
+import torch
+import typer
+
+from ml_final_project.config import MODELS_DIR, logger
+
+app = typer.Typer()
+
+# Describes how an exported model is stored, next to its tokenizer files
+EXPORT_FILE = "export.json"
+WEIGHTS_FILE = "model.pt"
+
+
+class ClsEncoder(torch.nn.Module):
+    """BERT returning only the CLS vector of the last hidden state.
+
+    Taking plain tensors and returning one makes the model traceable, and
+    gives eager and exported models the same call signature.
+    """
+
+    def __init__(self, model: torch.nn.Module):
+        super().__init__()
+        self.model = model
+
+    def forward(
+        self, input_ids: torch.Tensor, attention_mask: torch.Tensor
+    ) -> torch.Tensor:
+        outputs = self.model(
+            input_ids=input_ids, attention_mask=attention_mask
+        )
+        return outputs.last_hidden_state[:, 0]
+
+
+def quantize_dynamic(model: torch.nn.Module) -> torch.nn.Module:
+    """Quantize the weights of every linear layer to int8.
+
+    Activations are quantized on the fly, so no calibration data is
+    needed. Linear layers hold nearly all of BERT's weights and compute.
+    """
+    with warnings.catch_warnings():
+        # torch.ao.quantization is deprecated in favour of torchao, which is
+        # not a dependency of this project
+        warnings.simplefilter("ignore", DeprecationWarning)
+        return torch.ao.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+
+
+def export(
+    model_path: Path,
+    output: Path,
+    quantize: bool = True,
+    torchscript: bool = False,
+) -> Path:
+    """Export a BERT model for CPU inference.
+    Args:
+        model_path (Path): Directory of the tokenizer and BERT model.
+        output (Path): Directory to write the artifact to. It holds the
+            tokenizer, `config.json`, `export.json` and `model.pt`.
+        quantize (bool): Quantize the linear layers to int8.
+        torchscript (bool): Trace and freeze the model into a TorchScript
+            graph, which runs without the Python model code.
+    Returns:
+        Path: `output`, loadable with `load` or `EmbeddingEngine`.
+    """
+    from transformers import AutoTokenizer, BertModel
+
+    model_path, output = Path(model_path), Path(output)
+    output.mkdir(parents=True, exist_ok=True)
+
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    model = BertModel.from_pretrained(model_path).eval()
+    tokenizer.save_pretrained(output)
+    model.config.save_pretrained(output)
+
+    if quantize:
+        model = quantize_dynamic(model)
+
+    if torchscript:
+        # Padding in the example makes the trace keep the attention mask
+        example = tokenizer(
+            ["job title", "a longer job title"],
+            padding=True,
+            return_tensors="pt",
+        )
+        with torch.no_grad(), warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            traced = torch.jit.trace(
+                ClsEncoder(model).eval(),
+                (example["input_ids"], example["attention_mask"]),
+            )
+            torch.jit.save(torch.jit.freeze(traced), output / WEIGHTS_FILE)
+    else:
+        torch.save(model.state_dict(), output / WEIGHTS_FILE)
+
+    (output / EXPORT_FILE).write_text(
+        json.dumps(
+            {
+                "source": model_path.name,
+                "quantize": quantize,
+                "torchscript": torchscript,
+                "torch": torch.__version__,
+            },
+            indent=2,
+        )
+    )
+    size = (output / WEIGHTS_FILE).stat().st_size / 2**20
+    logger.success(f"Exported {model_path.name} to {output} ({size:.0f} MB).")
+    return output
+
+
+def is_exported(model_path: Path) -> bool:
+    return (Path(model_path) / EXPORT_FILE).exists()
+
+
+def load(model_path: Path) -> torch.nn.Module:
+    """Load a model for inference as a `ClsEncoder`.
+
+    Directories written by `export` are loaded from their artifact, any
+    other directory as the full precision Hugging Face model.
+    """
+    from transformers import BertConfig, BertModel
+
+    model_path = Path(model_path)
+    if not is_exported(model_path):
+        return ClsEncoder(BertModel.from_pretrained(model_path)).eval()
+
+    meta = json.loads((model_path / EXPORT_FILE).read_text())
+    if meta["torchscript"]:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", FutureWarning)
+            return torch.jit.load(model_path / WEIGHTS_FILE)
+
+    # The quantized modules must exist before their weights can be loaded
+    model = BertModel(BertConfig.from_pretrained(model_path)).eval()
+    if meta["quantize"]:
+        model = quantize_dynamic(model)
+    model.load_state_dict(torch.load(model_path / WEIGHTS_FILE))
+    return ClsEncoder(model).eval()
+
+
+@app.command()
+def main(
+    model_path: Path = None,  # Directory of the fine-tuned BERT model
+    output: Path = None,  # Directory of the exported model
+    quantize: bool = True,  # Quantize the linear layers to int8
+    torchscript: bool = False,  # Trace the model into a TorchScript graph
+):
+    from ml_final_project.embeddings import MODEL_PATH
+
+    modelPath = model_path or MODEL_PATH
+    suffix = "-".join(
+        name
+        for name, enabled in [("int8", quantize), ("torchscript", torchscript)]
+        if enabled
+    )
+    savePath = output or MODELS_DIR / f"{modelPath.name}-{suffix or 'fp32'}"
+
+    start = time.perf_counter()
+    export(modelPath, savePath, quantize=quantize, torchscript=torchscript)
+    logger.info(f"Export took {time.perf_counter() - start:.1f}s.")
+
+
+if __name__ == "__main__":
+    app()
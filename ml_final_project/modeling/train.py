@@ -0,0 +1,171 @@
+from pathlib import Path
+import time
+
+import numpy as np
+import polars as pl
+import typer
+
+from ml_final_project.config import PROCESSED_DATA_DIR, logger
+from ml_final_project.modeling.predict import MODEL_FILE, TARGET, SalaryModel
+
+app = typer.Typer()
+
+# Features of the best salary model of notebook 3.2, in its order
+FEATURES = [
+    "positiontitle_embedding",
+    "agency_embedding",
+    "education_embedding",
+    "experience_years",
+    "eligibility_embedding",
+]
+REDUCTIONS = ("none", "pca", "random")
+# Neighbour indexes of scikit-learn supporting the manhattan metric
+INDEXES = ("brute", "kd_tree", "ball_tree")
+
+
+def split(data: pl.DataFrame, test_size: float = 0.2, seed: int = 0):
+    """Shuffle `data` into a train and a test frame."""
+    data = data.sample(fraction=1.0, shuffle=True, seed=seed)
+    testRows = int(round(data.height * test_size))
+    return data.slice(testRows), data.head(testRows)
+
+
+def train(
+    data: pl.DataFrame,
+    features: list = FEATURES,
+    reduction: str = "none",
+    components: int = 32,
+    index: str = "kd_tree",
+    n_neighbors: int = 11,
+    leaf_size: int = 40,
+    seed: int = 0,
+) -> SalaryModel:
+    """Fit the notebook's KNN salary regressor behind a neighbour index.
+    Args:
+        data (pl.DataFrame): Training postings with the features and
+            `MonthlySalary`.
+        features (list): Feature columns, scalars or Array embeddings.
+        reduction (str): "pca" or "random" (Gaussian random projection)
+            to reduce the features to `components` dimensions first. Tree
+            indexes only beat brute force in a few dozen dimensions.
+        components (int): Dimensions kept by the reduction.
+        index (str): "kd_tree" or "ball_tree", built once at fit time, or
+            "brute" for the notebook's full scan.
+        n_neighbors (int): Neighbours averaged per prediction.
+        leaf_size (int): Points per tree leaf.
+        seed (int): Seed of the random projection.
+    Returns:
+        SalaryModel: The fitted model bundle.
+    """
+    from sklearn.decomposition import PCA
+    from sklearn.neighbors import KNeighborsRegressor
+    from sklearn.random_projection import GaussianRandomProjection
+
+    if reduction not in REDUCTIONS:
+        raise ValueError(
+            f"Unknown reduction {reduction!r}. Choose from {REDUCTIONS}."
+        )
+    if index not in INDEXES:
+        raise ValueError(f"Unknown index {index!r}. Choose from {INDEXES}.")
+
+    vectors = any(
+        isinstance(data.schema[feature], pl.Array) for feature in features
+    )
+    model = SalaryModel(
+        features, regressor=None, reduce="cls" if vectors else "cls_sum"
+    )
+    matrix = model.matrix(data)
+
+    if reduction != "none" and components >= matrix.shape[1]:
+        logger.warning(
+            f"{matrix.shape[1]} features are no more than {components} "
+            "components, not reducing them."
+        )
+    elif reduction == "pca":
+        model.reducer = PCA(n_components=components, random_state=seed)
+    elif reduction == "random":
+        model.reducer = GaussianRandomProjection(
+            n_components=components, random_state=seed
+        )
+    if model.reducer is not None:
+        matrix = model.reducer.fit_transform(matrix)
+
+    model.regressor = KNeighborsRegressor(
+        n_neighbors=n_neighbors,
+        metric="manhattan",
+        algorithm=index,
+        leaf_size=leaf_size,
+    ).fit(matrix, data.get_column(TARGET).to_numpy())
+    return model
+
+
+def evaluate(
+    model: SalaryModel, test: pl.DataFrame, baseline: SalaryModel
+) -> dict:
+    """Accuracy of `model` on `test`, and against a brute force baseline.
+    Returns:
+        dict: R² of both models, the largest difference between their
+            predictions and the share of predictions that are equal.
+    """
+    from sklearn.metrics import r2_score
+
+    target = test.get_column(TARGET).to_numpy()
+    predictions = model.predict(test)
+    expected = baseline.predict(test)
+    return {
+        "r2": r2_score(target, predictions),
+        "baseline_r2": r2_score(target, expected),
+        "max_abs_diff": float(np.abs(predictions - expected).max()),
+        "agreement": float(np.isclose(predictions, expected).mean()),
+    }
+
+
+@app.command()
+def main(
+    input: Path = None,  # Training parquet with the features
+    model_path: Path = MODEL_FILE,  # Model bundle to write
+    reduction: str = "none",  # none, pca or random (projection)
+    components: int = 32,  # Dimensions kept by the reduction
+    index: str = "kd_tree",  # kd_tree, ball_tree or brute
+    n_neighbors: int = 11,  # Neighbours averaged per prediction
+    test_size: float = 0.2,  # Share of postings held out for evaluation
+    refit: bool = True,  # Refit on all postings after evaluating
+    seed: int = 0,  # Seed of the split and the reduction
+):
+    inputPath = input or (
+        PROCESSED_DATA_DIR
+        / "CivilServiceCommission"
+        / "civilservicecommission-embedded-training-data-(finetuned-position).parquet"
+    )
+    data = pl.read_parquet(inputPath, columns=[*FEATURES, TARGET])
+    data = data.drop_nulls()
+    trainData, testData = split(data, test_size, seed)
+
+    options = {
+        "reduction": reduction,
+        "components": components,
+        "index": index,
+        "n_neighbors": n_neighbors,
+        "seed": seed,
+    }
+    start = time.perf_counter()
+    model = train(trainData, **options)
+    logger.info(f"Fitted in {time.perf_counter() - start:.2f}s.")
+    baseline = train(trainData, n_neighbors=n_neighbors, index="brute")
+    metrics = evaluate(model, testData, baseline)
+    logger.info(
+        f"Test R² {metrics['r2']:.4f}, brute force "
+        f"{metrics['baseline_r2']:.4f}, {metrics['agreement']:.1%} of "
+        "predictions equal."
+    )
+
+    if refit:
+        model = train(data, **options)
+    rows = model.regressor.n_samples_fit_
+    model.metrics = {**metrics, **options, "rows": rows}
+    model.save(model_path)
+    logger.success(f"Saved salary model to {model_path}.")
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,460 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from itertools import product
+import json
+import math
+from multiprocessing import get_context
+import os
+from pathlib import Path
+import time
+
+import duckdb
+import numpy as np
+import polars as pl
+import typer
+
+from ml_final_project.config import (
+    FIGURES_DIR,
+    MPL_STYLE_DIR,
+    PROCESSED_DATA_DIR,
+    logger,
+)
+from ml_final_project.modeling.predict import TARGET
+from ml_final_project.modeling.train import FEATURES
+
+app = typer.Typer()
+
+DATASET = "civilservicecommission"
+RESULTS_DB = (
+    PROCESSED_DATA_DIR / "CivilServiceCommission" / f"{DATASET}-tuning.duckdb"
+)
+# Grids of the notebook searches, see civilservicecommission-gridsearch-*.csv
+SEARCH_SPACES = {
+    "knn": {
+        "metric": ["manhattan", "euclidean", "cosine"],
+        "n_neighbors": list(range(1, 101)),
+    },
+    "random_forest": {
+        "max_features": ["sqrt", "log2"],
+        "min_samples_leaf": [1, 2],
+        "min_samples_split": [2, 5],
+        "n_estimators": [10, 20, 50, 80, 100, 200],
+        "max_depth": [None, 10, 20, 30, 40, 50],
+    },
+}
+STRATEGIES = ("grid", "halving")
+
+RESULTS_SQL = """
+CREATE TABLE IF NOT EXISTS trials (
+    search VARCHAR,
+    model VARCHAR,
+    params JSON,
+    fold INTEGER,
+    -- Training rows of the fold the candidate was fitted on
+    budget INTEGER,
+    train_score DOUBLE,
+    test_score DOUBLE,
+    fit_seconds DOUBLE,
+    score_seconds DOUBLE,
+    finished_at TIMESTAMP,
+    PRIMARY KEY (search, params, fold, budget)
+)
+"""
+
+# Set in every worker process by `_init_worker`
+_X = _y = _folds = None
+
+
+def candidates(model: str) -> list:
+    """Every parameter combination of a model's search space."""
+    space = SEARCH_SPACES[model]
+    return [dict(zip(space, values)) for values in product(*space.values())]
+
+
+def params_key(params: dict) -> str:
+    # Canonical JSON, so the same candidate always has the same key
+    return json.dumps(params, sort_keys=True)
+
+
+def make_estimator(model: str, params: dict):
+    if model == "knn":
+        from sklearn.neighbors import KNeighborsRegressor
+
+        return KNeighborsRegressor(**params)
+    if model == "random_forest":
+        from sklearn.ensemble import RandomForestRegressor
+
+        # One core per trial, the pool runs a trial on every core
+        return RandomForestRegressor(**params, n_jobs=1, random_state=0)
+    raise ValueError(
+        f"Unknown model {model!r}. Choose from {list(SEARCH_SPACES)}."
+    )
+
+
+def _init_worker(dataPath: Path, features: list, folds: int, seed: int):
+    from sklearn.model_selection import KFold
+
+    from ml_final_project.embeddings import EmbeddingEngine
+
+    global _X, _y, _folds
+    data = pl.read_parquet(dataPath, columns=[*features, TARGET]).drop_nulls()
+    # Array embeddings, as `reduce="cls"` writes them, expand to columns
+    _X = EmbeddingEngine.matrix(data, features)
+    _y = data.get_column(TARGET).to_numpy()
+    rng = np.random.default_rng(seed)
+    splitter = KFold(folds, shuffle=True, random_state=seed)
+    _folds = [
+        # Shuffled, so a budget of n rows takes a random subsample
+        (rng.permutation(train), test)
+        for train, test in splitter.split(_X)
+    ]
+
+
+def _run_trial(model: str, params: dict, fold: int, budget: int) -> dict:
+    train, test = _folds[fold]
+    train = train[:budget]
+    estimator = make_estimator(model, params)
+
+    start = time.perf_counter()
+    estimator.fit(_X[train], _y[train])
+    fitSeconds = time.perf_counter() - start
+    start = time.perf_counter()
+    testScore = estimator.score(_X[test], _y[test])
+    scoreSeconds = time.perf_counter() - start
+
+    return {
+        "params": params_key(params),
+        "fold": fold,
+        "budget": budget,
+        "train_score": estimator.score(_X[train], _y[train]),
+        "test_score": testScore,
+        "fit_seconds": fitSeconds,
+        "score_seconds": scoreSeconds,
+    }
+
+
+def rung_budgets(
+    n_candidates: int, samples: int, factor: int, min_samples: int
+) -> list:
+    """Training rows per successive halving rung, the last uses all.
+
+    A rung keeps the best 1/`factor` of its candidates for the next, which
+    gets `factor` times the rows, until one candidate or `min_samples`
+    rows for the first rung is reached.
+    """
+    rungs = 1
+    while (
+        factor**rungs < n_candidates
+        and samples // factor**rungs >= min_samples
+    ):
+        rungs += 1
+    return [samples // factor ** (rungs - 1 - rung) for rung in range(rungs)]
+
+
+def finished(con, search: str) -> set:
+    """(params, fold, budget) of every trial of `search` already stored."""
+    return set(
+        con.execute(
+            "SELECT params, fold, budget FROM trials WHERE search = ?",
+            [search],
+        ).fetchall()
+    )
+
+
+def best(con, search: str, budget: int, n: int) -> list:
+    """Parameters of the `n` candidates with the best mean test score."""
+    rows = con.execute(
+        """
+        SELECT params, avg(test_score) AS score
+        FROM trials
+        WHERE search = ? AND budget = ?
+        GROUP BY params
+        ORDER BY score DESC, params
+        LIMIT ?
+        """,
+        [search, budget, n],
+    ).fetchall()
+    return [json.loads(params) for params, _ in rows]
+
+
+def run_trials(
+    con,
+    pool: ProcessPoolExecutor,
+    search: str,
+    model: str,
+    trials: list,
+) -> int:
+    """Run the trials not stored yet, storing each once it finishes.
+    Args:
+        trials (list): (params, fold, budget) tuples.
+    Returns:
+        int: Trials run, the others were stored by an earlier run.
+    """
+    done = finished(con, search)
+    pending = [
+        trial
+        for trial in trials
+        if (params_key(trial[0]), trial[1], trial[2]) not in done
+    ]
+    if len(pending) < len(trials):
+        logger.info(
+            f"Resuming {search}: {len(trials) - len(pending)} of "
+            f"{len(trials)} trials already stored."
+        )
+
+    futures = [pool.submit(_run_trial, model, *trial) for trial in pending]
+    for count, future in enumerate(as_completed(futures), start=1):
+        result = future.result()
+        con.execute(
+            """
+            INSERT OR REPLACE INTO trials VALUES (
+                $search, $model, $params, $fold, $budget, $train_score,
+                $test_score, $fit_seconds, $score_seconds, $finished_at
+            )
+            """,
+            {
+                "search": search,
+                "model": model,
+                **result,
+                "finished_at": datetime.now(),
+            },
+        )
+        if count % 50 == 0 or count == len(futures):
+            logger.info(f"{search}: {count}/{len(futures)} trials done.")
+    return len(pending)
+
+
+def tune(
+    model: str,
+    search: str | None = None,
+    strategy: str = "grid",
+    dataPath: Path | None = None,
+    dbPath: Path = RESULTS_DB,
+    folds: int = 5,
+    jobs: int | None = None,
+    factor: int = 3,
+    min_samples: int = 1000,
+    seed: int = 0,
+) -> list:
+    """Cross-validate a model's search space across all cores.
+
+    Every finished trial, one candidate on one fold, is stored in the
+    `trials` table of `dbPath` at once. Rerunning an interrupted search
+    skips the stored trials, so it resumes where it stopped.
+    Args:
+        model (str): "knn" or "random_forest", see `SEARCH_SPACES`.
+        search (str): Name the trials are stored under, the model name
+            by default.
+        strategy (str): "grid" fits every candidate on all training rows.
+            "halving" fits them on a subsample first and only keeps the
+            best 1/`factor` for each larger rung, see `rung_budgets`.
+        dataPath (Path): Training parquet with the features.
+        dbPath (Path): DuckDB file of the results.
+        folds (int): Cross validation folds.
+        jobs (int): Worker processes, all cores by default.
+        factor (int): Halving factor between rungs.
+        min_samples (int): Fewest training rows of the first rung.
+        seed (int): Seed of the folds and subsamples.
+    Returns:
+        list: The best parameters, by mean test score on all rows.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(
+            f"Unknown strategy {strategy!r}. Choose from {STRATEGIES}."
+        )
+    search = search or model
+    dataPath = dataPath or (
+        PROCESSED_DATA_DIR
+        / "CivilServiceCommission"
+        / "civilservicecommission-embedded-training-data-(finetuned-position).parquet"
+    )
+    # Rows of the largest training fold, as in `_init_worker`
+    rows = pl.scan_parquet(dataPath).select(FEATURES + [TARGET])
+    rows = rows.drop_nulls().select(pl.len()).collect().item()
+    samples = rows - rows // folds
+
+    params = candidates(model)
+    if strategy == "grid":
+        budgets = [samples]
+    else:
+        budgets = rung_budgets(len(params), samples, factor, min_samples)
+    logger.info(
+        f"Tuning {model} as {search!r}: {len(params)} candidates, "
+        f"{folds} folds, rungs of {budgets} rows."
+    )
+
+    dbPath.parent.mkdir(parents=True, exist_ok=True)
+    with (
+        duckdb.connect(dbPath) as con,
+        ProcessPoolExecutor(
+            jobs or os.cpu_count(),
+            mp_context=get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(dataPath, FEATURES, folds, seed),
+        ) as pool,
+    ):
+        con.execute(RESULTS_SQL)
+        for rung, budget in enumerate(budgets):
+            if rung > 0:
+                params = best(con, search, budgets[rung - 1], len(params))
+                params = params[: math.ceil(len(params) / factor)]
+            trials = [
+                (candidate, fold, budget)
+                for candidate in params
+                for fold in range(folds)
+            ]
+            start = time.perf_counter()
+            ran = run_trials(con, pool, search, model, trials)
+            logger.info(
+                f"Rung {rung}: {len(params)} candidates on {budget} rows, "
+                f"{ran} trials in {time.perf_counter() - start:.1f}s."
+            )
+        top = best(con, search, budgets[-1], 5)
+
+    logger.success(f"Best {model} parameters: {top[0]}")
+    return top
+
+
+def _style(ax, title: str, xlabel: str, ylabel: str):
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.legend()
+
+
+def plot(
+    search: str,
+    dbPath: Path = RESULTS_DB,
+    param: str | None = None,
+    hue: str | None = None,
+    output: Path | None = None,
+) -> Path:
+    """Plot the cross validation scores of a search on all training rows.
+
+    KNN searches are drawn like the notebook's grid search figures, the
+    mean test score against `n_neighbors` per `metric`. Otherwise the mean
+    train and validation scores against `param` are drawn, with a band of
+    one standard deviation over the other parameters and the folds, like
+    the random forest figures.
+    Args:
+        search (str): Name the trials are stored under.
+        dbPath (Path): DuckDB file of the results.
+        param (str): Parameter on the x axis.
+        hue (str): Parameter drawn as one line per value, KNN only.
+        output (Path): Image to write, in `FIGURES_DIR` by default.
+    Returns:
+        Path: The written figure.
+    """
+    import matplotlib.pyplot as plt
+
+    from ml_final_project.matplotlib import Color
+
+    with duckdb.connect(dbPath, read_only=True) as con:
+        model, budget, folds = con.execute(
+            """
+            SELECT any_value(model), max(budget), count(DISTINCT fold)
+            FROM trials
+            WHERE search = ?
+            """,
+            [search],
+        ).fetchone()
+        if model is None:
+            raise ValueError(f"No trials of search {search!r} in {dbPath}.")
+        param = param or ("n_neighbors" if model == "knn" else "n_estimators")
+        hue = hue or ("metric" if model == "knn" else None)
+
+        columns = [param] + ([hue] if hue else [])
+        selects = ", ".join(
+            f"params->>'$.{column}' AS \"{column}\"" for column in columns
+        )
+        scores = con.execute(
+            f"""
+            SELECT {selects},
+                avg(test_score) AS mean_test_score,
+                stddev_samp(test_score) AS std_test_score,
+                avg(train_score) AS mean_train_score,
+                stddev_samp(train_score) AS std_train_score
+            FROM trials
+            WHERE search = ? AND budget = ?
+            GROUP BY ALL
+            """,
+            [search, budget],
+        ).pl()
+    # Parameters come back as JSON text, numbers are plotted as numbers
+    scores = scores.with_columns(
+        pl.col(param).cast(pl.Float64, strict=False)
+    ).sort(columns)
+
+    plt.style.use(MPL_STYLE_DIR / "iragca_ml.mplstyle")
+    fig, ax = plt.subplots()
+    if hue:
+        colors = iter(Color.get_primary_colors())
+        for value, group in scores.group_by(hue, maintain_order=True):
+            ax.plot(
+                group[param],
+                group["mean_test_score"],
+                label=value[0],
+                color=next(colors),
+            )
+        _style(
+            ax,
+            f"Grid Search Results {folds}-fold cv",
+            param,
+            "Mean test R2 Score",
+        )
+        ax.get_legend().set_title(hue)
+    else:
+        for split, color, label in [
+            ("train", Color.BLUE.value, "Train Score"),
+            ("test", Color.ORANGE.value, "Validation Score"),
+        ]:
+            mean = scores[f"mean_{split}_score"].to_numpy()
+            std = scores[f"std_{split}_score"].fill_null(0).to_numpy()
+            ax.plot(scores[param], mean, color=color, label=label)
+            ax.fill_between(
+                scores[param], mean - std, mean + std, color=color, alpha=0.2
+            )
+        _style(ax, "Training vs Validation Score", param, "R2 Score")
+
+    name = f"{DATASET}-{search}-tuning-{param.replace('_', '-')}.png"
+    savePath = output or FIGURES_DIR / name
+    savePath.parent.mkdir(parents=True, exist_ok=True)
+    fig.savefig(savePath, bbox_inches="tight")
+    plt.close(fig)
+    logger.success(f"Saved {search} plot to {savePath}.")
+    return savePath
+
+
+@app.command()
+def main(
+    model: str = "knn",  # knn or random_forest
+    search: str = None,  # Name of the search in the results table
+    strategy: str = "grid",  # grid or halving (successive halving)
+    folds: int = 5,  # Cross validation folds
+    jobs: int = None,  # Worker processes, defaults to all cores
+    factor: int = 3,  # Candidates kept per halving rung: 1 / factor
+    min_samples: int = 1000,  # Training rows of the first halving rung
+    seed: int = 0,  # Seed of the folds and subsamples
+    input: Path = None,  # Training parquet with the features
+    db_path: Path = RESULTS_DB,  # DuckDB file of the results table
+    plot_param: str = None,  # Parameter on the x axis of the plot
+    plot_only: bool = False,  # Only redraw the plot from stored results
+):
+    if not plot_only:
+        tune(
+            model,
+            search,
+            strategy,
+            dataPath=input,
+            dbPath=db_path,
+            folds=folds,
+            jobs=jobs,
+            factor=factor,
+            min_samples=min_samples,
+            seed=seed,
+        )
+    plot(search or model, db_path, param=plot_param)
+
+
+if __name__ == "__main__":
+    app()
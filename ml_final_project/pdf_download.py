@@ -1,17 +1,359 @@
-import duckdb
-import typer
-from loguru import logger
-from tqdm import tqdm
+import asyncio
+import base64
+from collections.abc import AsyncGenerator
+from contextlib import aclosing
+import os
+from pathlib import Path
+import random
 import time
+from typing import TYPE_CHECKING
+
+from loguru import logger
+import typer
 
+from ml_final_project import metrics
 from ml_final_project.config import RAW_DATA_DIR, REPORTS_DIR
-from playwright.sync_api import sync_playwright
+
+# duckdb, httpx, playwright and tqdm are imported when a download starts,
+# so that `--help` does not pay for them
+if TYPE_CHECKING:
+    import httpx
+    from playwright.async_api import BrowserContext
+    from tqdm import tqdm
 
 app = typer.Typer()
 
+# The job URL serves the PDF itself, so pages only ever load the listing
+CAREER_URL = "https://csc.gov.ph/career/"
+JOB_URL = "https://csc.gov.ph/career/job/{pdf_id}"
+CHUNK_SIZE = 1 << 16
+TRANSFERS = ("request", "httpx", "base64")
+# In-page fetch of a PDF as base64, for `_chunks_via_base64`
+FETCH_BASE64_JS = """
+async (url) => {
+    const response = await fetch(url);
+    if (!response.ok) throw new Error(`HTTP ${response.status}`);
+    const blob = await response.blob();
+    return await new Promise((resolve, reject) => {
+        const reader = new FileReader();
+        reader.onload = () => resolve(reader.result.split(",")[1]);
+        reader.onerror = reject;
+        reader.readAsDataURL(blob);
+    });
+}
+"""
+
+
+class RateLimiter:
+    """Politeness limit shared by all download workers.
+
+    Request starts are spaced at least `1 / rate` seconds apart, however
+    many workers are running.
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0.0
+        self.lock = asyncio.Lock()
+        self.next_slot = 0.0
+
+    async def wait(self):
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+async def save_atomic(pdf_path: Path, chunks: AsyncGenerator[bytes]):
+    """Stream chunks to a temporary sibling and rename it in place.
+
+    The `.part` file never has a `.pdf` suffix, so the skip check cannot
+    mistake a partial download for a finished one.
+    """
+    tmp_path = pdf_path.with_name(pdf_path.name + ".part")
+    try:
+        async with aclosing(chunks):
+            with open(tmp_path, "wb") as f:
+                first = True
+                size = 0
+                async for chunk in chunks:
+                    if first and not chunk.startswith(b"%PDF"):
+                        raise ValueError("response is not a PDF")
+                    first = False
+                    f.write(chunk)
+                    size += len(chunk)
+                if first:
+                    raise ValueError("empty response")
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, pdf_path)
+        metrics.observe("download.pdf_size", size)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+async def _warm_up(page):
+    """Load the career listing so the context holds the site's cookies.
+
+    Never the job URL: it serves the PDF, which a headless browser treats
+    as a download, and `goto` fails with "Download is starting".
+    """
+    await page.goto(CAREER_URL)
+    await page.wait_for_load_state("networkidle")
+
+
+async def _chunks_via_request(context: "BrowserContext", url: str):
+    # APIRequestContext shares the browser context's cookies and returns
+    # raw bytes, not a JSON array of numbers
+    response = await context.request.get(url)
+    try:
+        if not response.ok:
+            raise ValueError(f"HTTP {response.status}")
+        body = memoryview(await response.body())
+        for start in range(0, len(body), CHUNK_SIZE):
+            yield body[start : start + CHUNK_SIZE].tobytes()
+    finally:
+        await response.dispose()
+
+
+async def _chunks_via_httpx(
+    client: "httpx.AsyncClient", context: "BrowserContext", page, url: str
+):
+    # Replays the browser's cookies and user agent so the body is streamed
+    # straight to disk without passing through the browser at all
+    cookies = "; ".join(
+        f"{cookie['name']}={cookie['value']}"
+        for cookie in await context.cookies(url)
+    )
+    headers = {
+        "Cookie": cookies,
+        "User-Agent": await page.evaluate("navigator.userAgent"),
+    }
+    async with client.stream("GET", url, headers=headers) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_bytes(CHUNK_SIZE):
+            yield chunk
+
+
+async def _chunks_via_base64(page, url: str):
+    # Fallback for sites that only serve the PDF to an in-page fetch. The
+    # page stays on the listing, which has the same origin as the PDF
+    encoded = await page.evaluate(FETCH_BASE64_JS, url)
+    data = memoryview(base64.b64decode(encoded))
+    for start in range(0, len(data), CHUNK_SIZE):
+        yield data[start : start + CHUNK_SIZE].tobytes()
+
+
+async def _download_worker(
+    context: "BrowserContext",
+    client: "httpx.AsyncClient",
+    transfer: str,
+    queue: asyncio.Queue,
+    save_path: Path,
+    limiter: RateLimiter,
+    retries: int,
+    backoff: float,
+    stats: dict,
+    pbar: "tqdm",
+    on_saved=None,
+):
+    page = await context.new_page()
+    warm = False
+    try:
+        while True:
+            try:
+                pdf_id = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+
+            pdf_path = save_path / f"{pdf_id}.pdf"
+            url = JOB_URL.format(pdf_id=pdf_id)
+            saved = False
+            for attempt in range(retries + 1):
+                with metrics.timer("download.rate_wait"):
+                    await limiter.wait()
+                try:
+                    if not warm:
+                        with metrics.timer("download.warm_up"):
+                            await _warm_up(page)
+                        warm = True
+                    if transfer == "base64":
+                        chunks = _chunks_via_base64(page, url)
+                    elif transfer == "httpx":
+                        chunks = _chunks_via_httpx(client, context, page, url)
+                    else:
+                        chunks = _chunks_via_request(context, url)
+
+                    with metrics.timer("download.transfer", via=transfer):
+                        await save_atomic(pdf_path, chunks)
+                    stats["downloaded"] += 1
+                    metrics.count("download.pdfs", status="downloaded")
+                    saved = True
+                    break
+                except Exception as e:
+                    # Cookies may have expired, load the listing again
+                    warm = False
+                    if attempt == retries:
+                        logger.error(
+                            f"Failed to download {pdf_id}.pdf after {retries + 1} attempts: {e}"
+                        )
+                        stats["failed"] += 1
+                        metrics.count("download.pdfs", status="failed")
+                        break
+
+                    metrics.count("download.retries")
+
+                    delay = backoff * 2**attempt + random.uniform(0, backoff)
+                    logger.warning(
+                        f"Download of {pdf_id}.pdf failed ({e}). Retrying in {delay:.1f}s."
+                    )
+                    await asyncio.sleep(delay)
+
+            pbar.update(1)
+            # Outside the retry loop, so its errors are not download errors
+            if saved and on_saved is not None:
+                await on_saved(pdf_path)
+    finally:
+        await page.close()
+
+
+async def download_pdfs(
+    pdf_ids: set,
+    save_path: Path,
+    concurrency: int = 4,
+    rate: float = 2.0,
+    retries: int = 3,
+    backoff: float = 2.0,
+    headless: bool = True,
+    transfer: str = "request",
+    on_saved=None,
+) -> dict:
+    """Download job posting PDFs with a pool of browser contexts.
+    Args:
+        pdf_ids (set): Job IDs to download.
+        save_path (Path): Directory to write `<jobId>.pdf` files to.
+        concurrency (int): Number of browser contexts downloading at once.
+        rate (float): Maximum number of PDF requests per second overall.
+        retries (int): Retries per PDF before giving up on it.
+        backoff (float): Base delay in seconds of the exponential backoff.
+        headless (bool): Run the browser without a window.
+        transfer (str): How the PDF bytes reach Python. "request" uses
+            Playwright's APIRequestContext, "httpx" streams with the
+            browser's cookies and "base64" fetches inside the page.
+        on_saved (function): Coroutine function awaited with the path of
+            every saved PDF. The worker only moves on once it returns, so
+            a slow consumer holds the downloads back.
+    Returns:
+        dict: Number of PDFs downloaded and failed.
+    """
+    import httpx
+    from playwright.async_api import async_playwright
+    from tqdm import tqdm
+
+    queue = asyncio.Queue()
+    for pdf_id in pdf_ids:
+        queue.put_nowait(pdf_id)
+
+    if transfer not in TRANSFERS:
+        raise ValueError(
+            f"Unknown transfer {transfer!r}. Choose from {TRANSFERS}."
+        )
+
+    limiter = RateLimiter(rate)
+    stats = {"downloaded": 0, "failed": 0}
+
+    async with (
+        async_playwright() as pw,
+        httpx.AsyncClient(follow_redirects=True, timeout=60) as client,
+    ):
+        browser = await pw.chromium.launch(headless=headless)
+        contexts = [
+            await browser.new_context(accept_downloads=True)
+            for _ in range(min(concurrency, len(pdf_ids)))
+        ]
+
+        pbar = tqdm(total=len(pdf_ids), desc="Downloading PDFs")
+        try:
+            await asyncio.gather(
+                *(
+                    _download_worker(
+                        context,
+                        client,
+                        transfer,
+                        queue,
+                        save_path,
+                        limiter,
+                        retries,
+                        backoff,
+                        stats,
+                        pbar,
+                        on_saved,
+                    )
+                    for context in contexts
+                )
+            )
+        finally:
+            pbar.close()
+            for context in contexts:
+                await context.close()
+            await browser.close()
+
+    return stats
+
+
+def pending_ids(dbPath: Path, savePath: Path) -> set:
+    """Job IDs of the scraped listing whose PDF is not downloaded yet.
+    Args:
+        dbPath (Path): DuckDB file of the scraped listing.
+        savePath (Path): Directory of the `<jobId>.pdf` files, created if
+            missing. Leftovers of interrupted downloads are removed.
+    Returns:
+        set: Job IDs, as strings, to download.
+    """
+    import duckdb
+
+    from ml_final_project.preprocessing.PDFManifest import scan_pdf_ids
+
+    logger.info(f"Connecting to DuckDB database at {dbPath}.")
+    db = duckdb.connect(dbPath, read_only=True)
+    savePath.mkdir(parents=True, exist_ok=True)
+
+    pdf_ids = set(
+        db.sql("SELECT action FROM civilservicecommission")
+        .pl()
+        .unique()
+        .to_series()
+    )
+    db.close()
+
+    # Leftovers of interrupted downloads
+    for part in savePath.glob("*.pdf.part"):
+        part.unlink()
+
+    existing_pdfs = set(map(str, scan_pdf_ids(savePath)))
+
+    logger.info(
+        f"{len(pdf_ids)} PDF IDs found in the database. {len(existing_pdfs)} downloaded PDFs. Identifying new ones to download..."
+    )
+    pdf_ids = pdf_ids - existing_pdfs
+
+    logger.info(f"Found {len(pdf_ids)} PDF IDs to download from the database.")
+    return pdf_ids
+
 
 @app.command()
-def main():
+def main(
+    concurrency: int = 4,  # Browser contexts downloading at once
+    rate: float = 2.0,  # Maximum PDF requests per second overall
+    retries: int = 3,  # Retries per PDF before giving up on it
+    headless: bool = True,  # Run the browser without a window
+    transfer: str = "request",  # PDF byte transfer: request, httpx or base64
+    metrics_report: bool = False,  # Write timers to reports/metrics
+    trace: bool = False,  # Also record a span for every timed call
+    profile: str = "none",  # Profiler: none, cprofile or py-spy
+):
     try:
         logger.add(
             str(REPORTS_DIR / "logs" / "CSC-PDF-download.log"),
@@ -26,66 +368,30 @@ def main():
             / "CivilServiceCommission"
             / "civilservicecommission.duckdb"
         )
-        logger.info(f"Connecting to DuckDB database at {dbPath}.")
-        db = duckdb.connect(dbPath, read_only=True)
         PDF_SAVE_PATH = RAW_DATA_DIR / "CivilServiceCommission" / "pdfs"
-
-        pdf_ids = set(
-            db.sql("SELECT action FROM civilservicecommission").pl().unique().to_series()
-        )
-
-        existing_pdfs = PDF_SAVE_PATH.iterdir()
-        existing_pdfs = set([pdf.stem for pdf in existing_pdfs])
-
-        logger.info(f"{len(pdf_ids)} PDF IDs found in the database. {len(existing_pdfs)} downloaded PDFs. Identifying new ones to download...")
-        pdf_ids = pdf_ids - existing_pdfs
-
-        logger.info(
-            f"Found {len(pdf_ids)} PDF IDs to download from the database."
-        )
+        pdf_ids = pending_ids(dbPath, PDF_SAVE_PATH)
 
         if not pdf_ids:
             logger.info("No new PDF IDs to download. Exiting.")
             return
 
-        with sync_playwright() as pw:
-            browser = pw.chromium.launch(headless=False)
-            context = browser.new_context(accept_downloads=True)
-            page = context.new_page()
-
-            pbar = tqdm(total=len(pdf_ids), desc="Downloading PDFs")
-            for pdf_id in pbar:
-                pdf_path = PDF_SAVE_PATH / f"{pdf_id}.pdf"
-                if not pdf_path.exists():
-                    pbar.set_postfix_str(f"Downloading {pdf_id}.pdf")
-
-                    # Download the PDF file
-                    url = f"https://csc.gov.ph/career/job/{pdf_id}"
-
-                    page.goto(url)
-                    page.wait_for_load_state("networkidle")
-
-                    # Use fetch inside the browser context (inherits cookies/auth!)
-                    pdf_data = page.evaluate(
-                        """
-                        async () => {
-                            const response = await fetch(window.location.href);
-                            const buffer = await response.arrayBuffer();
-                            return Array.from(new Uint8Array(buffer));
-                        }
-                    """
-                    )
-
-                    # Convert to binary and save
-                    with open(f"{pdf_path}", "wb") as f:
-                        f.write(bytes(pdf_data))
-
-                    # time.sleep(2)
-
-                else:
-                    logger.info(
-                        f"{pdf_id}.pdf already exists. Skipping download."
-                    )
+        with metrics.session(
+            "pdf_download", metrics_report or trace, trace, profile
+        ):
+            stats = asyncio.run(
+                download_pdfs(
+                    pdf_ids,
+                    PDF_SAVE_PATH,
+                    concurrency=concurrency,
+                    rate=rate,
+                    retries=retries,
+                    headless=headless,
+                    transfer=transfer,
+                )
+            )
+        logger.success(
+            f"Downloaded {stats['downloaded']} PDFs, {stats['failed']} failed."
+        )
 
     except KeyboardInterrupt:
         logger.info("Download interrupted by user.")
@@ -0,0 +1,391 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing import get_context
+from pathlib import Path
+import queue
+import threading
+import time
+
+import typer
+
+from ml_final_project import metrics
+from ml_final_project.config import (
+    INTERIM_DATA_DIR,
+    PROCESSED_DATA_DIR,
+    RAW_DATA_DIR,
+    REPORTS_DIR,
+    logger,
+)
+
+app = typer.Typer()
+
+# Download, parse and load as one stream. Downloads run on the event loop,
+# every saved PDF goes straight to a parser process, and a single thread
+# owns the DuckDB connection and writes the parsed rows. Both hand-offs
+# are bounded, so the slowest stage holds the others back and memory stays
+# flat however many PDFs there are.
+
+# Tells the writer thread that nothing more is coming
+_DONE = None
+
+
+def _write_results(
+    results: queue.Queue,
+    manifest,
+    writer,
+    flush_seconds: float,
+    stats: dict,
+    total: int,
+    on_error=None,
+):
+    """Drain parsed chunks into the PDF table until `_DONE` arrives.
+
+    After a write error nothing more is stored or flushed, and `on_error`
+    is called once so the caller can stop the downloads. The error is left
+    in `stats["error"]`.
+    """
+    from tqdm import tqdm
+
+    from ml_final_project.preprocessing.pdfs import store
+
+    pbar = tqdm(total=total, desc="Parsing PDFs")
+    error = None
+
+    def fail(e: Exception):
+        nonlocal error
+        logger.error(f"Writing parsed PDFs failed: {e}")
+        error = e
+        if on_error is not None:
+            on_error()
+
+    try:
+        while True:
+            try:
+                item = results.get(timeout=flush_seconds)
+            except queue.Empty:
+                # Commit what trickled in while the downloads are slow
+                if error is None:
+                    try:
+                        writer.flush()
+                    except Exception as e:
+                        fail(e)
+                continue
+            if item is _DONE:
+                break
+            # Keep draining after an error, so the parsers never block
+            if error is not None:
+                continue
+
+            _, parsed, _, backends, snapshot = item
+            try:
+                metrics.merge(snapshot)
+                stats["failed"] += store(parsed, manifest, writer)
+                stats["parsed"] += len(parsed)
+                for backend, pdfs in backends.items():
+                    stats["backends"][backend] = (
+                        stats["backends"].get(backend, 0) + pdfs
+                    )
+                pbar.update(len(parsed))
+            except Exception as e:
+                fail(e)
+
+        # Not after an error, it would only raise again and hide the first
+        if error is None:
+            try:
+                writer.flush()
+            except Exception as e:
+                logger.error(f"Writing parsed PDFs failed: {e}")
+                error = e
+    finally:
+        pbar.close()
+        stats["error"] = error
+
+
+async def run_pipeline(
+    listingDbPath: Path,
+    pdfsPath: Path,
+    pdfDbPath: Path,
+    download: bool = True,
+    concurrency: int = 4,
+    rate: float = 2.0,
+    retries: int = 3,
+    headless: bool = True,
+    transfer: str = "request",
+    workers: int = 2,
+    backend: str = "auto",
+    queue_size: int = 64,
+    batch_size: int = 500,
+    flush_seconds: float = 5.0,
+    verify: bool = False,
+    skip_failed: bool = False,
+) -> dict:
+    """Download new PDFs while parsing and loading them.
+
+    PDFs that were downloaded but never parsed, e.g. by an interrupted
+    run, are parsed alongside the new downloads.
+    Args:
+        listingDbPath (Path): DuckDB file of the scraped listing.
+        pdfsPath (Path): Directory of the `<jobId>.pdf` files.
+        pdfDbPath (Path): DuckDB file of the parsed PDFs.
+        download (bool): Download the missing PDFs. When False only the
+            downloaded backlog is parsed.
+        concurrency (int): Browser contexts downloading at once.
+        rate (float): Maximum number of PDF requests per second overall.
+        retries (int): Retries per PDF before giving up on it.
+        headless (bool): Run the browser without a window.
+        transfer (str): PDF byte transfer of `download_pdfs`.
+        workers (int): Number of parser processes.
+        backend (str): Text extraction backend of `PDFParser`.
+        queue_size (int): PDFs saved but not parsed yet, and parsed PDFs
+            not written yet, before the stage feeding them waits.
+        batch_size (int): Rows per bulk insert and commit.
+        flush_seconds (float): Longest time parsed rows wait for a batch
+            to fill before they are committed anyway.
+        verify (bool): Re-queue processed PDFs whose content changed.
+        skip_failed (bool): Do not retry PDFs that failed to parse.
+    Returns:
+        dict: PDFs downloaded, failed to download, parsed, inserted,
+            duplicates, failed to parse or insert, and the seconds taken.
+    """
+    import duckdb
+
+    from ml_final_project.pdf_download import download_pdfs, pending_ids
+    from ml_final_project.preprocessing import PDFManifest, PDFTableWriter
+    from ml_final_project.preprocessing.pdfs import _init_worker, _parse_chunk
+
+    start = time.perf_counter()
+    pdfsPath.mkdir(parents=True, exist_ok=True)
+    pdfDbPath.parent.mkdir(parents=True, exist_ok=True)
+    pdf_ids = pending_ids(listingDbPath, pdfsPath) if download else set()
+
+    logger.info(f"Connecting to DuckDB database at {pdfDbPath}.")
+    db = duckdb.connect(pdfDbPath)
+    manifest = PDFManifest(db)
+    writer = PDFTableWriter(db, batch_size=batch_size, manifest=manifest)
+    backlog = manifest.backlog(pdfsPath, verify, skip_failed)
+    logger.info(
+        f"{len(pdf_ids)} PDFs to download and {len(backlog)} downloaded "
+        f"PDFs to parse, with {workers} parser(s)."
+    )
+
+    stats = {
+        "downloaded": 0,
+        "download_failed": 0,
+        "parsed": 0,
+        "failed": 0,
+        "parse_errors": 0,
+        "backends": {},
+    }
+    loop = asyncio.get_running_loop()
+    # Set by the writer thread once parsed rows can no longer be stored
+    writeFailed = asyncio.Event()
+    # Parsed chunks waiting for the writer, who alone uses `db` from now on
+    results = queue.Queue(maxsize=queue_size)
+    writerThread = threading.Thread(
+        target=_write_results,
+        args=(
+            results,
+            manifest,
+            writer,
+            flush_seconds,
+            stats,
+            len(pdf_ids) + len(backlog),
+            partial(loop.call_soon_threadsafe, writeFailed.set),
+        ),
+        name="pdf-writer",
+    )
+    writerThread.start()
+
+    # PDFs saved but not parsed yet, including the ones being parsed
+    slots = asyncio.Semaphore(queue_size)
+    tasks = set()
+
+    try:
+        # Spawned, a fork would copy the writer thread's DuckDB connection
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(backend, metrics.is_enabled(), metrics.is_tracing()),
+        ) as pool:
+
+            async def parse_one(pdf_file: Path):
+                try:
+                    result = await loop.run_in_executor(
+                        pool, _parse_chunk, [pdf_file]
+                    )
+                    # Waits, off the event loop, while the writer is behind
+                    await asyncio.to_thread(results.put, result)
+                except Exception as e:
+                    # Not in the manifest, so the next run parses it again
+                    stats["parse_errors"] += 1
+                    logger.error(f"Parsing {pdf_file.name} failed: {e}")
+                finally:
+                    slots.release()
+
+            async def parse(pdf_file: Path):
+                # Downloaders wait here while the parsers are behind
+                with metrics.timer("pipeline.backpressure"):
+                    await slots.acquire()
+                task = asyncio.create_task(parse_one(pdf_file))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+            async def parse_backlog():
+                for pdf_file in backlog:
+                    await parse(pdf_file)
+
+            async def download():
+                if not pdf_ids:
+                    return
+                downloads = await download_pdfs(
+                    pdf_ids,
+                    pdfsPath,
+                    concurrency=concurrency,
+                    rate=rate,
+                    retries=retries,
+                    headless=headless,
+                    transfer=transfer,
+                    on_saved=parse,
+                )
+                stats["downloaded"] = downloads["downloaded"]
+                stats["download_failed"] = downloads["failed"]
+
+            async def stream():
+                await asyncio.gather(parse_backlog(), download())
+                while tasks:
+                    await asyncio.gather(*tasks)
+
+            # A write error stops the downloads, nothing more can be stored
+            streaming = asyncio.create_task(stream())
+            stopping = asyncio.create_task(writeFailed.wait())
+            try:
+                await asyncio.wait(
+                    {streaming, stopping},
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if streaming.done():
+                    await streaming
+            finally:
+                pending = [streaming, stopping, *tasks]
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+    finally:
+        await asyncio.to_thread(results.put, _DONE)
+        await asyncio.to_thread(writerThread.join)
+        db.close()
+
+    if stats["error"] is not None:
+        raise stats["error"]
+    return {
+        "downloaded": stats["downloaded"],
+        "download_failed": stats["download_failed"],
+        "parsed": stats["parsed"],
+        "inserted": writer.inserted,
+        "duplicates": writer.duplicates,
+        "failed": stats["failed"] + stats["parse_errors"] + writer.failed,
+        "backends": stats["backends"],
+        "seconds": time.perf_counter() - start,
+    }
+
+
+@app.callback()
+def callback():
+    """Streaming download, parsing and loading of the CSC job PDFs."""
+
+
+@app.command()
+def run(
+    download: bool = True,  # Download new PDFs, or only parse the backlog
+    concurrency: int = 4,  # Browser contexts downloading at once
+    rate: float = 2.0,  # Maximum PDF requests per second overall
+    retries: int = 3,  # Retries per PDF before giving up on it
+    headless: bool = True,  # Run the browser without a window
+    transfer: str = "request",  # PDF byte transfer: request, httpx or base64
+    workers: int = 2,  # Parser processes
+    backend: str = "auto",  # Text backend: auto, pypdf or pdfplumber
+    queue_size: int = 64,  # PDFs waiting per hand-off before backpressure
+    batch_size: int = 500,  # Rows per bulk insert and commit
+    flush_seconds: float = 5.0,  # Commit partial batches this often
+    verify: bool = False,  # Re-queue processed PDFs whose content changed
+    skip_failed: bool = False,  # Do not retry PDFs that failed to parse
+    preprocess: bool = False,  # Add the new postings to the dataset after
+    engine: str = "duckdb",  # Preprocessing engine: duckdb or polars
+    metrics_report: bool = False,  # Write timers to reports/metrics
+    trace: bool = False,  # Also record a span for every timed call
+    profile: str = "none",  # Profiler: none, cprofile or py-spy
+):
+    logger.add(
+        REPORTS_DIR / "logs" / "CSC-pipeline.log",
+        rotation="10 MB",
+        retention="10 days",
+        level="INFO",
+    )
+    listingDbPath = (
+        RAW_DATA_DIR
+        / "CivilServiceCommission"
+        / "civilservicecommission.duckdb"
+    )
+    pdfsPath = RAW_DATA_DIR / "CivilServiceCommission" / "pdfs"
+    pdfDbPath = (
+        INTERIM_DATA_DIR
+        / "CivilServiceCommission"
+        / "civilservicecommission_pdfs.duckdb"
+    )
+
+    try:
+        with metrics.session(
+            "pipeline", metrics_report or trace, trace, profile
+        ):
+            summary = asyncio.run(
+                run_pipeline(
+                    listingDbPath,
+                    pdfsPath,
+                    pdfDbPath,
+                    download=download,
+                    concurrency=concurrency,
+                    rate=rate,
+                    retries=retries,
+                    headless=headless,
+                    transfer=transfer,
+                    workers=workers,
+                    backend=backend,
+                    queue_size=queue_size,
+                    batch_size=batch_size,
+                    flush_seconds=flush_seconds,
+                    verify=verify,
+                    skip_failed=skip_failed,
+                )
+            )
+    except KeyboardInterrupt:
+        logger.info("Pipeline interrupted by user.")
+        return
+
+    logger.success(
+        f"Downloaded {summary['downloaded']} PDFs "
+        f"({summary['download_failed']} failed), parsed {summary['parsed']} "
+        f"and inserted {summary['inserted']} rows in "
+        f"{summary['seconds']:.1f}s."
+    )
+    logger.info(
+        f"{summary['duplicates']} duplicates, {summary['failed']} failed to "
+        f"parse or insert. Text backends used: {summary['backends']}"
+    )
+
+    if preprocess:
+        from ml_final_project.preprocess import preprocess as run_preprocess
+
+        rows = run_preprocess(
+            listingDbPath,
+            pdfDbPath,
+            PROCESSED_DATA_DIR / "CivilServiceCommission",
+            engine,
+            incremental=True,
+        )
+        logger.success(f"Added {rows} rows to the processed dataset.")
+
+
+if __name__ == "__main__":
+    app()
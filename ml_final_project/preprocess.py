@@ -1,111 +1,434 @@
+from datetime import datetime
+import json
+import os
+from pathlib import Path
+
 import duckdb
 import polars as pl
+import typer
 
 from ml_final_project.config import (
-    RAW_DATA_DIR,
-    PROCESSED_DATA_DIR,
     INTERIM_DATA_DIR,
+    PROCESSED_DATA_DIR,
+    RAW_DATA_DIR,
     logger,
 )
 
-if __name__ == "__main__":
+app = typer.Typer()
 
-    try:
-        # Load the data as a polars DataFrame
-        pdfDbPath = (
-            INTERIM_DATA_DIR
-            / "CivilServiceCommission"
-            / "civilservicecommission_pdfs.duckdb"
+# Hive partition key of the incremental dataset, the Posting Date month
+PARTITION = "PostingMonth"
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+# Written next to the dataset directory, where readers of the partitions
+# never see it
+MANIFEST_SUFFIX = ".manifest.json"
+ENGINES = ("duckdb", "polars")
+OUTPUT = "civilservicecommission.parquet"
+DATASET = "civilservicecommission"
+
+# Incremental Polars runs read only the PDFs not in the registered `known`
+# jobIds, and the listing rows of the registered `new_ids`
+NEW_PDFS_SQL = """
+SELECT p.* FROM civilservicecommission_pdfs p
+ANTI JOIN known k ON p.jobId = k.jobId
+"""
+NEW_LISTING_SQL = """
+SELECT c.* FROM civilservicecommission c
+SEMI JOIN new_ids n ON TRY_CAST(c.Action AS INT) = n.jobId
+"""
+
+# Streams a query into Parquet, the last run of `run_duckdb` per mode
+COPY_SQL = """
+COPY ({query}) TO {target} (FORMAT parquet, COMPRESSION zstd)
+"""
+COPY_PARTITIONED_SQL = """
+COPY ({query}) TO {target} (
+    FORMAT parquet,
+    COMPRESSION zstd,
+    PARTITION_BY ({partition}),
+    FILENAME_PATTERN {pattern},
+    APPEND,
+    RETURN_FILES
+)
+"""
+
+# The `transform` join as one DuckDB plan over the attached databases.
+# Only the listing columns that are used are read, duplicate listing rows
+# are dropped by Action, and {filter} may anti-join processed jobIds.
+PROCESSED_SQL = """
+SELECT DISTINCT ON (p.jobId)
+    p.jobId,
+    c.Agency,
+    c.Region,
+    p.PlaceOfAssignment,
+    strptime(c."Posting Date", '%d %b %Y')::DATE AS "Posting Date",
+    strptime(c."Closing Date", '%d %b %Y')::DATE AS "Closing Date",
+    c."Position Title",
+    p.SalaryGrade,
+    p.MonthlySalary,
+    p.Eligibility,
+    p.Education,
+    p.Training,
+    p.Experience,
+    p.Competency,
+    c."Plantilla Item No."{partition}
+FROM pdfs.civilservicecommission_pdfs p
+JOIN (
+    SELECT DISTINCT ON ("Action")
+        CAST("Action" AS INT) AS jobId,
+        Agency,
+        Region,
+        "Posting Date",
+        "Closing Date",
+        "Position Title",
+        "Plantilla Item No."
+    FROM raw.civilservicecommission
+) c ON c.jobId = p.jobId
+{filter}
+"""
+
+
+def transform(data: pl.DataFrame, pdfData: pl.DataFrame) -> pl.DataFrame:
+    """Join the scraped listing with the parsed PDFs.
+    Args:
+        data (pl.DataFrame): Rows of the `civilservicecommission` table.
+        pdfData (pl.DataFrame): Rows of the `civilservicecommission_pdfs`
+            table.
+    Returns:
+        pl.DataFrame: One row per jobId with parsed dates.
+    """
+    data = data.unique(subset=["Action"]).with_columns(
+        [pl.col("Action").cast(pl.Int32).alias("Action")]
+    )
+
+    joined_data = pdfData.join(
+        data, left_on="jobId", right_on="Action", how="inner"
+    )
+
+    return (
+        joined_data.drop(["Agency", "PositionTitle", "PlantillaNo"])
+        .with_columns(
+            [
+                pl.col("Agency_right").alias("Agency"),
+            ]
         )
-        dbPath = (
-            RAW_DATA_DIR
-            / "CivilServiceCommission"
-            / "civilservicecommission.duckdb"
+        .drop(["Agency_right"])
+        .with_columns(
+            [
+                pl.col("Posting Date")
+                .str.strptime(
+                    pl.Date, "%d %b %Y"
+                )  # Convert from "20 Apr 2025"
+                .alias("Posting Date"),
+                pl.col("Closing Date")
+                .str.strptime(
+                    pl.Date, "%d %b %Y"
+                )  # Convert from "20 Apr 2025"
+                .alias("Closing Date"),
+            ]
         )
+        .select(
+            [
+                pl.col("jobId"),
+                pl.col("Agency"),
+                pl.col("Region"),
+                pl.col("PlaceOfAssignment"),
+                pl.col("Posting Date"),
+                pl.col("Closing Date"),
+                pl.col("Position Title"),
+                pl.col("SalaryGrade"),
+                pl.col("MonthlySalary"),
+                pl.col("Eligibility"),
+                pl.col("Education"),
+                pl.col("Training"),
+                pl.col("Experience"),
+                pl.col("Competency"),
+                pl.col("Plantilla Item No."),
+            ]
+        )
+    ).unique(subset=["jobId"])
 
-        db = duckdb.connect(dbPath, read_only=True)
-        pdfDb = duckdb.connect(pdfDbPath, read_only=True)
 
-        data = (
-            db.sql("SELECT * FROM civilservicecommission")
-            .pl()
-            .unique(subset=["Action"])
-            .with_columns([pl.col("Action").cast(pl.Int32).alias("Action")])
-        )
-        pdfData = pdfDb.sql("SELECT * FROM civilservicecommission_pdfs").pl()
+def partition_files(datasetPath: Path) -> list:
+    """Parquet files of the partitioned dataset."""
+    return sorted(datasetPath.glob(f"{PARTITION}=*/*.parquet"))
+
+
+def processed_job_ids(datasetPath: Path) -> pl.DataFrame:
+    """jobIds already written to the partitioned dataset.
 
-        logger.info(
-            f"Loaded {data.shape[0]} rows and {data.shape[1]} columns from the database."
+    Only the jobId column of the partitions is read. The partitions, not
+    the manifest, are the source of truth, so rows written by a run that
+    died before updating the manifest are not processed twice.
+    """
+    if not partition_files(datasetPath):
+        return pl.DataFrame(schema={"jobId": pl.Int32})
+    return (
+        pl.scan_parquet(
+            datasetPath / f"{PARTITION}=*" / "*.parquet",
+            hive_partitioning=True,
         )
-        logger.info(f"Data sample:\n{data.head(2)}")
+        .select("jobId")
+        .collect()
+    )
 
-        joined_data = pdfData.join(
-            data, left_on="jobId", right_on="Action", how="inner"
+
+def write_partitions(data: pl.DataFrame, datasetPath: Path) -> list:
+    """Write rows as new files of the monthly partitions.
+    Args:
+        data (pl.DataFrame): Processed rows, see `transform`.
+        datasetPath (Path): Root of the partitioned dataset.
+    Returns:
+        list: Manifest entries of the files written.
+    """
+    runId = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    month = (
+        pl.col("Posting Date").dt.strftime("%Y-%m").fill_null(NULL_PARTITION)
+    )
+    entries = []
+    for (key,), part in data.with_columns(month.alias(PARTITION)).group_by(
+        PARTITION, maintain_order=True
+    ):
+        partPath = datasetPath / f"{PARTITION}={key}" / f"part-{runId}.parquet"
+        partPath.parent.mkdir(parents=True, exist_ok=True)
+        part.drop(PARTITION).sort("jobId").write_parquet(partPath)
+        entries.append(
+            {
+                "path": partPath.relative_to(datasetPath).as_posix(),
+                PARTITION: key,
+                "rows": part.height,
+                "minJobId": part["jobId"].min(),
+                "maxJobId": part["jobId"].max(),
+                "createdAt": runId,
+            }
         )
+    return entries
 
-        formatted_data = (
-            joined_data.drop(["Agency", "PositionTitle", "PlantillaNo"])
-            .with_columns(
-                [
-                    pl.col("Agency_right").alias("Agency"),
-                ]
-            )
-            .drop(["Agency_right"])
-            .with_columns(
-                [
-                    pl.col("Posting Date")
-                    .str.strptime(
-                        pl.Date, "%d %b %Y"
-                    )  # Convert from "20 Apr 2025"
-                    .alias("Posting Date"),
-                    pl.col("Closing Date")
-                    .str.strptime(
-                        pl.Date, "%d %b %Y"
-                    )  # Convert from "20 Apr 2025"
-                    .alias("Closing Date"),
-                ]
-            )
-            .select(
-                [
-                    pl.col("jobId"),
-                    pl.col("Agency"),
-                    pl.col("Region"),
-                    pl.col("PlaceOfAssignment"),
-                    pl.col("Posting Date"),
-                    pl.col("Closing Date"),
-                    pl.col("Position Title"),
-                    pl.col("SalaryGrade"),
-                    pl.col("MonthlySalary"),
-                    pl.col("Eligibility"),
-                    pl.col("Education"),
-                    pl.col("Training"),
-                    pl.col("Experience"),
-                    pl.col("Competency"),
-                    pl.col("Plantilla Item No."),
-                ]
+
+def manifest_path(datasetPath: Path) -> Path:
+    """Manifest of a partitioned dataset, `<dataset>.manifest.json`."""
+    return datasetPath.with_name(datasetPath.name + MANIFEST_SUFFIX)
+
+
+def update_manifest(datasetPath: Path, entries: list) -> dict:
+    """Append file entries to the dataset manifest, replacing it atomically."""
+    manifestPath = manifest_path(datasetPath)
+    # Older runs kept it inside the dataset, where it broke hive scans
+    legacyPath = datasetPath / "_manifest.json"
+    if legacyPath.exists() and not manifestPath.exists():
+        os.replace(legacyPath, manifestPath)
+    manifest = {"files": []}
+    if manifestPath.exists():
+        manifest = json.loads(manifestPath.read_text())
+
+    manifest["files"].extend(entries)
+    manifest["rows"] = sum(entry["rows"] for entry in manifest["files"])
+    manifest["updatedAt"] = datetime.now().isoformat(timespec="seconds")
+
+    tmpPath = manifestPath.with_suffix(".json.tmp")
+    tmpPath.write_text(json.dumps(manifest, indent=2))
+    os.replace(tmpPath, manifestPath)
+    return manifest
+
+
+def run_polars(
+    dbPath: Path, pdfDbPath: Path, savePath: Path, incremental: bool
+) -> int:
+    """Preprocess in eager Polars, the tables are read fully into memory.
+    Returns:
+        int: Number of rows written.
+    """
+    datasetPath = savePath / DATASET
+    db = duckdb.connect(dbPath, read_only=True)
+    pdfDb = duckdb.connect(pdfDbPath, read_only=True)
+    try:
+        if incremental:
+            known = processed_job_ids(datasetPath)
+            logger.info(f"{known.height} jobIds already processed.")
+
+            # Only the new PDFs, and the listing rows of their jobIds, are
+            # read out of DuckDB
+            pdfDb.register("known", known)
+            pdfData = pdfDb.sql(NEW_PDFS_SQL).pl()
+            db.register("new_ids", pdfData.select("jobId"))
+            data = db.sql(NEW_LISTING_SQL).pl()
+        else:
+            data = db.sql("SELECT * FROM civilservicecommission").pl()
+            pdfData = pdfDb.sql(
+                "SELECT * FROM civilservicecommission_pdfs"
+            ).pl()
+    finally:
+        db.close()
+        pdfDb.close()
+
+    logger.info(
+        f"Loaded {data.shape[0]} rows and {data.shape[1]} columns from the database."
+    )
+
+    formatted_data = transform(data, pdfData)
+
+    if not incremental:
+        formatted_data.write_parquet(savePath / OUTPUT)
+        return formatted_data.height
+
+    if not formatted_data.is_empty():
+        entries = write_partitions(formatted_data, datasetPath)
+        update_manifest(datasetPath, entries)
+    return formatted_data.height
+
+
+def sql_string(value) -> str:
+    """`value` as a SQL string literal, e.g. a path that may hold quotes."""
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def run_duckdb(
+    dbPath: Path,
+    pdfDbPath: Path,
+    savePath: Path,
+    incremental: bool,
+    memory_limit: str | None = None,
+) -> int:
+    """Preprocess as one DuckDB plan streamed into Parquet with `COPY`.
+
+    Both databases are attached read-only to an in-memory connection, so
+    rows flow from the tables through the join into the Parquet writer
+    without being collected in Python. Peak memory is bounded by
+    `memory_limit`, past which DuckDB spills to disk.
+    Returns:
+        int: Number of rows written.
+    """
+    datasetPath = savePath / DATASET
+    db = duckdb.connect()
+    try:
+        if memory_limit is not None:
+            db.execute(f"SET memory_limit = {sql_string(memory_limit)}")
+        # Row order is not part of the output, so the plan need not keep it
+        db.execute("SET preserve_insertion_order = false")
+        db.execute(f"ATTACH {sql_string(dbPath)} AS raw (READ_ONLY)")
+        db.execute(f"ATTACH {sql_string(pdfDbPath)} AS pdfs (READ_ONLY)")
+
+        if not incremental:
+            query = PROCESSED_SQL.format(partition="", filter="")
+            copy = COPY_SQL.format(
+                query=query, target=sql_string(savePath / OUTPUT)
             )
-        ).unique(subset=["jobId"])
+            (rows,) = db.execute(copy).fetchone()
+            return rows
 
-        logger.info(f"Converted data sample:\n{formatted_data.head(2)}")
-        logger.info(
-            f"Loaded {formatted_data.shape[0]} rows and {formatted_data.shape[1]} columns from the database."
+        files = partition_files(datasetPath)
+        known = ", ".join(sql_string(file) for file in files)
+        logger.info(f"{len(files)} partition files already written.")
+        runId = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+        query = PROCESSED_SQL.format(
+            partition=f""",
+    coalesce(
+        strftime(strptime(c."Posting Date", '%d %b %Y'), '%Y-%m'),
+        '{NULL_PARTITION}'
+    ) AS {PARTITION}""",
+            filter=(
+                f"ANTI JOIN read_parquet([{known}]) k ON k.jobId = p.jobId"
+                if files
+                else ""
+            ),
         )
+        copy = COPY_PARTITIONED_SQL.format(
+            query=query,
+            target=sql_string(datasetPath),
+            partition=PARTITION,
+            pattern=sql_string(f"part-{runId}-{{uuid}}"),
+        )
+        rows, written = db.execute(copy).fetchone()
+        if not rows:
+            return 0
 
-        # Save the formatted data to a CSV file
-        SAVE_PATH = PROCESSED_DATA_DIR / "CivilServiceCommission"
-        if not SAVE_PATH.exists():
-            SAVE_PATH.mkdir(parents=True, exist_ok=True)
-            logger.info(f"Created directory for the CSV file: {SAVE_PATH}")
+        entries = [
+            {
+                "path": Path(path).relative_to(datasetPath).as_posix(),
+                PARTITION: Path(path).parent.name.split("=", 1)[1],
+                "rows": count,
+                "minJobId": minJobId,
+                "maxJobId": maxJobId,
+                "createdAt": runId,
+            }
+            for path, count, minJobId, maxJobId in db.execute(
+                """
+                SELECT filename, count(*), min(jobId), max(jobId)
+                FROM read_parquet(?, filename = true)
+                GROUP BY filename ORDER BY filename
+                """,
+                [written],
+            ).fetchall()
+        ]
+        update_manifest(datasetPath, entries)
+        return rows
+    finally:
+        db.close()
 
-        formatted_data.write_parquet(
-            SAVE_PATH / "civilservicecommission.parquet"
-        )
 
-        logger.success(
-            f"Saved the formatted data to {SAVE_PATH / "civilservicecommission.parquet"}."
+def preprocess(
+    dbPath: Path,
+    pdfDbPath: Path,
+    savePath: Path,
+    engine: str = "duckdb",
+    incremental: bool = False,
+    memory_limit: str | None = None,
+) -> int:
+    """Join the scraped listing with the parsed PDFs into Parquet.
+    Args:
+        dbPath (Path): DuckDB file of the scraped listing.
+        pdfDbPath (Path): DuckDB file of the parsed PDFs.
+        savePath (Path): Directory of the processed dataset.
+        engine (str): "duckdb" streams the join into Parquet, "polars"
+            loads both tables into memory first.
+        incremental (bool): Only add jobIds not in the partitioned
+            dataset yet.
+        memory_limit (str): DuckDB memory limit, e.g. "1GB".
+    Returns:
+        int: Number of rows written.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}. Choose from {ENGINES}.")
+    savePath.mkdir(parents=True, exist_ok=True)
+    if engine == "polars":
+        return run_polars(dbPath, pdfDbPath, savePath, incremental)
+    return run_duckdb(dbPath, pdfDbPath, savePath, incremental, memory_limit)
+
+
+@app.command()
+def main(
+    incremental: bool = False,  # Only add jobIds not in the dataset yet
+    engine: str = "duckdb",  # duckdb (streaming SQL) or polars (in memory)
+    memory_limit: str = None,  # DuckDB memory limit, e.g. 1GB
+):
+    pdfDbPath = (
+        INTERIM_DATA_DIR
+        / "CivilServiceCommission"
+        / "civilservicecommission_pdfs.duckdb"
+    )
+    dbPath = (
+        RAW_DATA_DIR
+        / "CivilServiceCommission"
+        / "civilservicecommission.duckdb"
+    )
+    SAVE_PATH = PROCESSED_DATA_DIR / "CivilServiceCommission"
+
+    try:
+        rows = preprocess(
+            dbPath, pdfDbPath, SAVE_PATH, engine, incremental, memory_limit
         )
     except Exception as e:
         logger.error(f"An error occurred: {e}")
-    finally:
-        db.close()
-        logger.info("Closed the database connection.")
+        return
+
+    if incremental:
+        if not rows:
+            logger.info("No new jobIds to process.")
+        else:
+            logger.success(f"Added {rows} rows to {SAVE_PATH / DATASET}.")
+    else:
+        logger.success(f"Saved {rows} rows to {SAVE_PATH / OUTPUT}.")
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,83 @@
+import re
+
+
+class FieldExtractor:
+    """Extract labelled fields from the lines of a posting in one pass.
+
+    Every label is matched at once with a precompiled alternation, so the
+    lines are walked a single time instead of once per label. The value of
+    a label is the text after its first occurrence, up to the next
+    occurrence of the same label on that line, with colons removed. This
+    mirrors `line.split(label)[1]` and keeps first-match semantics.
+
+    Labels listed in `blocks` also capture the lines that follow them, up
+    to the line containing the given end marker. This is how multi-line
+    values such as the Competency section are read.
+    """
+
+    def __init__(self, labels: list, blocks: dict | None = None):
+        """
+        Args:
+            labels (list): Labels to extract, e.g. "Position Title".
+            blocks (dict): Label -> end marker of labels whose value spans
+                several lines, e.g. {"Competency": "Instructions/Remarks"}.
+        """
+        self.labels = list(labels)
+        self.blocks = blocks or {}
+        # Longest first so a label is never shadowed by one of its prefixes
+        self.pattern = re.compile(
+            "|".join(
+                re.escape(label)
+                for label in sorted(self.labels, key=len, reverse=True)
+            )
+        )
+
+    def extract(self, lines: list) -> dict:
+        """Extract every label from the lines of a posting.
+        Args:
+            lines (list): Text lines of the posting, in reading order.
+        Returns:
+            dict: Label -> value, None for labels that were not found.
+        """
+        # One regex scan over the whole text instead of a Python-level
+        # loop over the lines; only the matches are visited in Python.
+        text = "\n".join(lines)
+        values = dict.fromkeys(self.labels)
+        remaining = len(self.labels)
+
+        for match in self.pattern.finditer(text):
+            label = match.group()
+            if values[label] is not None:
+                continue
+
+            line_end = text.find("\n", match.end())
+            if line_end == -1:
+                line_end = len(text)
+
+            stop = text.find(label, match.end(), line_end)
+            value = text[match.end() : stop if stop != -1 else line_end]
+            values[label] = value.strip().replace(":", "").strip()
+
+            if label in self.blocks:
+                values[label] = self._extract_block(
+                    text, line_end, values[label], self.blocks[label]
+                )
+
+            remaining -= 1
+            if remaining == 0:
+                break
+
+        return values
+
+    def _extract_block(
+        self, text: str, line_end: int, first: str, end: str
+    ) -> str:
+        end_at = text.find(end, line_end)
+        if end_at == -1:
+            # A block without its end marker keeps its single-line value
+            return first
+
+        block_end = text.rfind("\n", line_end, end_at)
+        if block_end <= line_end:
+            return first
+        return " ".join([first] + text[line_end + 1 : block_end].split("\n"))
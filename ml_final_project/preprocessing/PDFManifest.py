@@ -0,0 +1,187 @@
+import hashlib
+import os
+from pathlib import Path
+
+import duckdb
+import polars as pl
+
+from ml_final_project.config import logger
+
+
+def scan_pdf_ids(pdfsPath: Path) -> dict:
+    """List the downloaded PDFs by jobId without a stat() per file.
+    Args:
+        pdfsPath (Path): Directory holding `<jobId>.pdf` files.
+    Returns:
+        dict: jobId -> file name.
+    """
+    pdf_ids = {}
+    with os.scandir(pdfsPath) as entries:
+        for entry in entries:
+            stem, _, suffix = entry.name.rpartition(".")
+            if suffix == "pdf" and stem.isdigit():
+                pdf_ids[int(stem)] = entry.name
+    return pdf_ids
+
+
+def fingerprint(pdf_file: Path) -> tuple:
+    """Size, mtime and SHA-256 of a file, read in 1 MiB chunks.
+    Args:
+        pdf_file (Path): File to fingerprint.
+    Returns:
+        tuple: (size, mtime, sha256 hex digest).
+    """
+    stat = pdf_file.stat()
+    digest = hashlib.sha256()
+    with open(pdf_file, "rb") as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return stat.st_size, stat.st_mtime, digest.hexdigest()
+
+
+class PDFManifest:
+    """Ingestion manifest of the PDFs that were already processed.
+
+    One row per jobId with the size, mtime and content hash of the file
+    that was parsed, stored next to `civilservicecommission_pdfs`. The
+    backlog is the anti-join of the directory listing against the manifest,
+    so unchanged files are skipped without touching them. Files that failed
+    to parse are retried on every run unless the caller skips them.
+
+    Files that changed since they were processed keep their rows and entry
+    until the new version is parsed and stored, so a failed re-parse or an
+    interrupted run loses nothing. Their jobIds are kept in `replacing`
+    for `PDFTableWriter` to swap the rows.
+    """
+
+    TABLE = "civilservicecommission_pdfs_manifest"
+    SCHEMA = {
+        "jobId": pl.Int32,
+        "size": pl.Int64,
+        "mtime": pl.Float64,
+        "sha256": pl.Utf8,
+        "status": pl.Utf8,
+    }
+
+    def __init__(self, db: duckdb.DuckDBPyConnection):
+        self.db = db
+        self.buffer = []
+        # jobIds whose stored row is replaced once the new file is stored
+        self.replacing = set()
+
+        create_query = f"""
+        CREATE TABLE IF NOT EXISTS {self.TABLE} (
+            jobId INT PRIMARY KEY,
+            size BIGINT,
+            mtime DOUBLE,
+            sha256 VARCHAR,
+            status VARCHAR,
+            processedAt TIMESTAMP DEFAULT current_timestamp
+        )
+        """
+        self.db.sql(create_query)
+
+    def add(self, jobId: int, fingerprint: tuple, status: str):
+        """Buffer a manifest entry until the next `flush`.
+        Args:
+            jobId (int): Job ID of the PDF.
+            fingerprint (tuple): (size, mtime, sha256) of the parsed file.
+            status (str): "parsed" or "failed".
+        """
+        self.buffer.append((int(jobId), *fingerprint, status))
+
+    def flush(self):
+        if not self.buffer:
+            return
+
+        rows, self.buffer = self.buffer, []
+        self.write(rows)
+
+    def write(self, rows: list):
+        """Store manifest entries now, e.g. inside the caller's transaction.
+        Args:
+            rows (list): (jobId, size, mtime, sha256, status) tuples.
+        """
+        entries = pl.DataFrame(rows, schema=self.SCHEMA, orient="row")
+        insert_query = f"""
+        INSERT OR REPLACE INTO {self.TABLE}
+            (jobId, size, mtime, sha256, status)
+        SELECT DISTINCT ON (jobId) * FROM manifest_batch
+        """
+        self.db.register("manifest_batch", entries.to_arrow())
+        try:
+            self.db.execute(insert_query)
+        finally:
+            self.db.unregister("manifest_batch")
+
+    def backlog(
+        self,
+        pdfsPath: Path,
+        verify: bool = False,
+        skip_failed: bool = False,
+    ) -> list:
+        """PDFs that still need to be parsed.
+
+        Files are new when neither the manifest nor the PDF table knows
+        their jobId; the PDF table covers rows inserted before the manifest
+        existed.
+        Args:
+            pdfsPath (Path): Directory holding `<jobId>.pdf` files.
+            verify (bool): Also stat the known files and re-queue the ones
+                whose content changed since they were processed.
+            skip_failed (bool): Leave out the files that failed to parse on
+                an earlier run. By default they are retried on every run.
+        Returns:
+            list: Paths of the PDFs to parse.
+        """
+        on_disk = scan_pdf_ids(pdfsPath)
+        disk = pl.DataFrame(
+            {"jobId": list(on_disk.keys()), "name": list(on_disk.values())},
+            schema={"jobId": pl.Int32, "name": pl.Utf8},
+        )
+        known_filter = "" if skip_failed else "AND m.status = 'parsed'"
+        new_query = f"""
+        SELECT d.name FROM pdfs_on_disk d
+        ANTI JOIN {self.TABLE} m ON m.jobId = d.jobId {known_filter}
+        ANTI JOIN civilservicecommission_pdfs p ON p.jobId = d.jobId
+        """
+        known_query = f"""
+        SELECT d.jobId, d.name, m.size, m.mtime, m.sha256
+        FROM pdfs_on_disk d
+        JOIN {self.TABLE} m ON m.jobId = d.jobId
+        """
+        self.db.register("pdfs_on_disk", disk.to_arrow())
+
+        try:
+            new = self.db.execute(new_query).fetchall()
+            pdf_files = [pdfsPath / name for (name,) in new]
+
+            if verify:
+                known = self.db.execute(known_query).fetchall()
+                pdf_files.extend(self._changed(pdfsPath, known))
+        finally:
+            self.db.unregister("pdfs_on_disk")
+
+        return pdf_files
+
+    def _changed(self, pdfsPath: Path, known: list) -> list:
+        changed = []
+        for jobId, name, size, mtime, sha256 in known:
+            pdf_file = pdfsPath / name
+            stat = pdf_file.stat()
+            if stat.st_size == size and stat.st_mtime == mtime:
+                continue
+
+            current = fingerprint(pdf_file)
+            if current[2] == sha256:
+                # Touched but identical, only refresh the stat fields
+                self.db.execute(
+                    f"UPDATE {self.TABLE} SET size = ?, mtime = ? WHERE jobId = ?",
+                    [current[0], current[1], jobId],
+                )
+                continue
+
+            logger.info(f"{name} changed since it was processed. Re-queued.")
+            self.replacing.add(jobId)
+            changed.append(pdf_file)
+        return changed
@@ -1,48 +1,93 @@
+from collections import Counter
+import re
+
 import pdfplumber
+from pypdf import PdfReader
 
+from ml_final_project import metrics
 from ml_final_project.config import logger
+from ml_final_project.preprocessing.FieldExtractor import FieldExtractor
 
 
 class PDFParser:
 
-    def __init__(self):
-        pass
+    LABELS = [
+        "Place of Assignment",
+        "Position Title",
+        "Plantilla Item No.",
+        "Salary/Job/Pay Grade",
+        "Monthly Salary",
+        "Eligibility",
+        "Education",
+        "Training",
+        "Experience",
+        "Competency",
+    ]
+    # Labels the fast text layer must yield before its output is trusted
+    REQUIRED_LABELS = [
+        "Position Title",
+        "Plantilla Item No.",
+        "Monthly Salary",
+    ]
+    # Header line of the agency and region, "<office> | <region>"
+    REGION_LINE = re.compile(r"^(?P<office>[^|]+?)\s*\|\s*\S")
+    BACKENDS = ("auto", "pypdf", "pdfplumber")
+
+    def __init__(
+        self, multiline_competency: bool = False, backend: str = "auto"
+    ):
+        """
+        Args:
+            multiline_competency (bool): Capture the whole Competency block
+                up to "Instructions/Remarks" instead of its first line.
+            backend (str): Text extraction backend. "pypdf" reads the raw
+                text layer, "pdfplumber" runs full layout analysis and
+                "auto" tries pypdf first, falling back to pdfplumber when
+                the required labels are missing.
+        """
+        if backend not in self.BACKENDS:
+            raise ValueError(
+                f"Unknown backend {backend!r}. Choose from {self.BACKENDS}."
+            )
+
+        self.backend = backend
+        # backend -> number of PDFs whose text came from it
+        self.backend_counts = Counter()
+        blocks = (
+            {"Competency": "Instructions/Remarks"}
+            if multiline_competency
+            else None
+        )
+        self.extractor = FieldExtractor(self.LABELS, blocks=blocks)
 
     def parse(self, pdf_file):
+        with metrics.timer("pdf_parse.total"):
+            parsed_pdf = self._parse(pdf_file)
+        metrics.count(
+            "pdf_parse.pdfs", status="failed" if parsed_pdf is None else "ok"
+        )
+        return parsed_pdf
+
+    def _parse(self, pdf_file):
         try:
             try:
-                with pdfplumber.open(pdf_file) as pdf:
-                    page_container = []
-
-                    for page in pdf.pages:
-                        text = page.extract_text()
-                        page_container.extend(text.split("\n"))
+                page_container, fields = self._read(pdf_file)
             except Exception as e:
                 logger.error(f"Failed to open file {pdf_file.name}: {e}")
                 return None
 
             jobId = pdf_file.stem
             LocalRegion = self._extract_local_region(page_container)
-            PlaceOfAssignment = self._extract_from_list(
-                page_container, "Place of Assignment"
-            )
-            PositionTitle = self._extract_from_list(
-                page_container, "Position Title"
-            )
-            PlantillaNo = self._extract_from_list(
-                page_container, "Plantilla Item No."
-            )
-            SalaryGrade = self._extract_from_list(
-                page_container, "Salary/Job/Pay Grade"
-            )
-            MonthlySalary = self._extract_php(
-                self._extract_from_list(page_container, "Monthly Salary")
-            )
-            Eligibility = self._extract_from_list(page_container, "Eligibility")
-            Education = self._extract_from_list(page_container, "Education")
-            Training = self._extract_from_list(page_container, "Training")
-            Experience = self._extract_from_list(page_container, "Experience")
-            Competency = self._extract_from_list(page_container, "Competency")
+            PlaceOfAssignment = fields["Place of Assignment"]
+            PositionTitle = fields["Position Title"]
+            PlantillaNo = fields["Plantilla Item No."]
+            SalaryGrade = fields["Salary/Job/Pay Grade"]
+            MonthlySalary = self._extract_php(fields["Monthly Salary"])
+            Eligibility = fields["Eligibility"]
+            Education = fields["Education"]
+            Training = fields["Training"]
+            Experience = fields["Experience"]
+            Competency = fields["Competency"]
 
             return (
                 jobId,
@@ -62,22 +107,67 @@ class PDFParser:
             logger.error(f"Failed to process {pdf_file.name}: {e}")
             return None
 
-    def _extract_from_list(self, page_container: list, key: str) -> str | None:
-        try:
-            for line in page_container:
-                if key in line:
-                    # Extract the value after the key
-                    value = line.split(key)[1].strip().replace(":", "").strip()
-                    return value
-        except ValueError:
-            return []
+    def pop_backend_counts(self) -> Counter:
+        """Return the backend usage counts and reset them."""
+        counts, self.backend_counts = self.backend_counts, Counter()
+        return counts
 
-    def _extract_local_region(self, page_container: list) -> str | None:
-        try:
-            return page_container[1].split("|")[0].strip()
+    def _read(self, pdf_file) -> tuple:
+        """Read the text lines of a PDF and extract the labelled fields.
+        Returns:
+            tuple: (page_container, fields).
+        """
+        if self.backend != "pdfplumber":
+            try:
+                with metrics.timer("pdf_parse.text", backend="pypdf"):
+                    page_container = self._read_pypdf(pdf_file)
+                with metrics.timer("pdf_parse.fields"):
+                    fields = self.extractor.extract(page_container)
+                if self.backend == "pypdf" or self._complete(
+                    page_container, fields
+                ):
+                    self.backend_counts["pypdf"] += 1
+                    return page_container, fields
+            except Exception as e:
+                if self.backend == "pypdf":
+                    raise
+                logger.debug(f"pypdf failed on {pdf_file.name}: {e}")
 
-        except ValueError:
-            return []
+        with metrics.timer("pdf_parse.text", backend="pdfplumber"):
+            page_container = self._read_pdfplumber(pdf_file)
+        self.backend_counts["pdfplumber"] += 1
+        with metrics.timer("pdf_parse.fields"):
+            fields = self.extractor.extract(page_container)
+        return page_container, fields
+
+    def _complete(self, page_container: list, fields: dict) -> bool:
+        """Whether the required labels and the region line were found."""
+        return all(fields[label] for label in self.REQUIRED_LABELS) and bool(
+            self._extract_local_region(page_container)
+        )
+
+    def _read_pypdf(self, pdf_file) -> list:
+        page_container = []
+        for page in PdfReader(pdf_file).pages:
+            text = page.extract_text().rstrip("\n")
+            page_container.extend(text.split("\n"))
+        return page_container
+
+    def _read_pdfplumber(self, pdf_file) -> list:
+        with pdfplumber.open(pdf_file) as pdf:
+            page_container = []
+
+            for page in pdf.pages:
+                text = page.extract_text()
+                page_container.extend(text.split("\n"))
+        return page_container
+
+    def _extract_local_region(self, page_container: list) -> str | None:
+        for line in page_container:
+            match = self.REGION_LINE.match(line)
+            if match:
+                return match.group("office").strip()
+        return None
 
     def _extract_php(self, text: str) -> str | None:
         try:
@@ -0,0 +1,211 @@
+import duckdb
+import polars as pl
+
+from ml_final_project import metrics
+from ml_final_project.config import logger
+
+
+class PDFTableWriter:
+    """Buffered writer for the `civilservicecommission_pdfs` table.
+
+    Parsed PDFs are collected in memory and appended in bulk from a
+    registered Polars frame. Rows whose jobId already exists are dropped
+    with an anti-join, and every batch is committed on its own so an
+    interrupted run keeps everything flushed before the interruption.
+    With a manifest, each file's entry is written in the transaction that
+    stores its row, and rows of changed files replace the stored ones.
+    """
+
+    TABLE = "civilservicecommission_pdfs"
+    COLUMNS = [
+        "jobId",
+        "Agency",
+        "PlaceOfAssignment",
+        "PositionTitle",
+        "PlantillaNo",
+        "SalaryGrade",
+        "MonthlySalary",
+        "Eligibility",
+        "Education",
+        "Training",
+        "Experience",
+        "Competency",
+    ]
+
+    def __init__(
+        self,
+        db: duckdb.DuckDBPyConnection,
+        batch_size: int = 500,
+        manifest=None,
+    ):
+        self.db = db
+        self.batch_size = batch_size
+        # Optional PDFManifest, flushed after every committed batch
+        self.manifest = manifest
+        self.buffer = []
+        self.inserted = 0
+        self.duplicates = 0
+        self.failed = 0
+
+        self.create_table()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+    def create_table(self):
+        create_query = f"""
+        CREATE TABLE IF NOT EXISTS {self.TABLE} (
+            jobId INT PRIMARY KEY,
+            Agency VARCHAR,
+            PlaceOfAssignment VARCHAR,
+            PositionTitle VARCHAR,
+            PlantillaNo VARCHAR,
+            SalaryGrade VARCHAR,
+            MonthlySalary INT,
+            Eligibility VARCHAR,
+            Education VARCHAR,
+            Training VARCHAR,
+            Experience VARCHAR,
+            Competency VARCHAR
+        )
+        """
+        self.db.sql(create_query)
+
+    def add(self, parsed_pdf: tuple, fingerprint: tuple | None = None):
+        """Buffer a parsed PDF, flushing once the batch is full.
+        Args:
+            parsed_pdf (tuple): Row returned by `PDFParser.parse`.
+            fingerprint (tuple): Fingerprint of the parsed file, entered
+                in the manifest in the same transaction as its row.
+        """
+        self.buffer.append((parsed_pdf, fingerprint))
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Append the buffered rows in one transaction and commit."""
+        if not self.buffer:
+            self._flush_manifest()
+            return
+
+        with metrics.timer("pdfs.insert"):
+            self._insert_batch()
+        self._flush_manifest()
+
+    def _replacing(self, rows: list) -> list:
+        """jobIds of `rows` that replace a changed file's stored row."""
+        if self.manifest is None or not self.manifest.replacing:
+            return []
+        jobIds = {int(row[0]) for row in rows if str(row[0]).isdigit()}
+        return sorted(jobIds & self.manifest.replacing)
+
+    def _record(self, entries: list, status: str):
+        """Enter stored (or failed) rows in the manifest."""
+        if self.manifest is None:
+            return
+        rows = [
+            (int(row[0]), *fingerprint, status)
+            for row, fingerprint in entries
+            if fingerprint is not None
+        ]
+        if rows:
+            self.manifest.write(rows)
+
+    def _insert_batch(self):
+        entries, self.buffer = self.buffer, []
+        rows = [row for row, _ in entries]
+        replacing = self._replacing(rows)
+        metrics.count("pdfs.insert_rows", len(rows))
+        batch = pl.DataFrame(
+            rows,
+            schema={column: pl.Utf8 for column in self.COLUMNS},
+            orient="row",
+        )
+        self.db.register("pdf_batch", batch.to_arrow())
+        duplicates_query = f"""
+        SELECT b.jobId FROM pdf_batch b
+        SEMI JOIN {self.TABLE} t ON t.jobId = CAST(b.jobId AS INT)
+        """
+        insert_query = f"""
+        INSERT INTO {self.TABLE}
+        SELECT DISTINCT ON (b.jobId) b.* FROM pdf_batch b
+        ANTI JOIN {self.TABLE} t ON t.jobId = CAST(b.jobId AS INT)
+        """
+
+        try:
+            # The old rows of changed files, the new rows and their
+            # manifest entries are committed together or not at all
+            self.db.begin()
+            if replacing:
+                self.db.execute(
+                    f"DELETE FROM {self.TABLE} WHERE list_contains(?, jobId)",
+                    [replacing],
+                )
+            duplicates = self.db.execute(duplicates_query).fetchall()
+            inserted = self.db.execute(insert_query).fetchone()[0]
+            self._record(entries, "parsed")
+            self.db.commit()
+        except duckdb.Error as e:
+            # A single bad row fails the whole statement, so fall back to
+            # row-by-row inserts to keep the per-row accounting.
+            self.db.rollback()
+            logger.warning(
+                f"Bulk insert of {len(rows)} rows failed ({e}). Retrying row by row."
+            )
+            self._insert_rows(entries)
+        else:
+            for (jobId,) in duplicates:
+                logger.warning(
+                    f"Duplicate entry for jobId: {jobId} Skipping insertion."
+                )
+            self.inserted += inserted
+            self.duplicates += len(rows) - inserted
+            if replacing:
+                self.manifest.replacing.difference_update(replacing)
+        finally:
+            self.db.unregister("pdf_batch")
+
+    def _flush_manifest(self):
+        if self.manifest is not None:
+            self.manifest.flush()
+
+    def _insert_rows(self, entries: list):
+        insert_query = f"""
+        INSERT INTO {self.TABLE} ({", ".join(self.COLUMNS)})
+        VALUES ({", ".join("?" for _ in self.COLUMNS)})
+        """
+        delete_query = f"DELETE FROM {self.TABLE} WHERE jobId = ?"
+
+        # One transaction per row, as a failed statement aborts it
+        for row, fingerprint in entries:
+            jobId = row[0]
+            replacing = bool(self._replacing([row]))
+            try:
+                self.db.begin()
+                if replacing:
+                    self.db.execute(delete_query, [jobId])
+                self.db.execute(insert_query, row)
+                self._record([(row, fingerprint)], "parsed")
+                self.db.commit()
+                self.inserted += 1
+                if replacing:
+                    self.manifest.replacing.discard(int(jobId))
+            except duckdb.ConstraintException:
+                self.db.rollback()
+                self.duplicates += 1
+                # The row stored under this jobId stands for the file
+                self._record([(row, fingerprint)], "parsed")
+                logger.warning(
+                    f"Duplicate entry for jobId: {jobId} Skipping insertion."
+                )
+            except Exception as e:
+                self.db.rollback()
+                self.failed += 1
+                # A replaced file keeps its old row and entry, so a later
+                # --verify run queues it again
+                if not replacing and str(jobId).isdigit():
+                    self._record([(row, fingerprint)], "failed")
+                logger.error(f"Error inserting data for jobId: {jobId} - {e}")
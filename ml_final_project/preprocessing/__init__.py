@@ -1,3 +1,6 @@
-from .PDFParser import PDFParser
+from ml_final_project.lazy import lazy_package
 
-__all__ = ["PDFParser"]
+__all__ = ["FieldExtractor", "PDFManifest", "PDFParser", "PDFTableWriter"]
+
+# Importing the package does not pull in polars, duckdb or the PDF readers
+__getattr__ = lazy_package(__name__, __all__)
@@ -1,24 +1,184 @@
-from itertools import count
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+import os
+from pathlib import Path
+import time
+from typing import TYPE_CHECKING
 
-import duckdb
-from tqdm import tqdm
+import typer
 
+from ml_final_project import metrics
 from ml_final_project.config import (
     INTERIM_DATA_DIR,
     RAW_DATA_DIR,
     REPORTS_DIR,
     logger,
 )
-from ml_final_project.preprocessing.PDFParser import PDFParser
 
+# duckdb, polars, tqdm and the PDF readers are imported when parsing
+# starts, so that `--help` does not pay for them
+if TYPE_CHECKING:
+    from ml_final_project.preprocessing.PDFParser import PDFParser
 
-def main():
-    dbPath = (
-        INTERIM_DATA_DIR
-        / "CivilServiceCommission"
-        / "civilservicecommission_pdfs.duckdb"
+app = typer.Typer()
+
+# One parser per worker process, created by the pool initializer
+_parser: "PDFParser | None" = None
+
+
+def _init_worker(
+    backend: str = "auto", collect: bool = False, tracing: bool = False
+):
+    from ml_final_project.preprocessing.PDFParser import PDFParser
+
+    global _parser
+    _parser = PDFParser(backend=backend)
+    if collect:
+        # Start empty, whatever the start method copied from the parent
+        metrics.reset()
+        metrics.enable(tracing)
+
+
+def _parse_chunk(pdf_files: list) -> tuple:
+    """Parse and fingerprint a chunk of PDFs inside a worker process.
+    Args:
+        pdf_files (list): Paths of the PDFs to parse.
+    Returns:
+        tuple: (worker pid, [(pdf_file, parsed_pdf, fingerprint), ...],
+            seconds spent, text backend usage counts, metrics snapshot).
+    """
+    from ml_final_project.preprocessing.PDFManifest import fingerprint
+
+    start = time.perf_counter()
+    results = []
+    for pdf_file in pdf_files:
+        parsed_pdf = _parser.parse(pdf_file)
+        with metrics.timer("pdfs.fingerprint"):
+            results.append((pdf_file, parsed_pdf, fingerprint(pdf_file)))
+    seconds = time.perf_counter() - start
+    # Workers send what they collected since the last chunk, to be merged
+    # into the parent's metrics
+    snapshot = metrics.snapshot(reset=True) if metrics.is_enabled() else None
+    return (
+        os.getpid(),
+        results,
+        seconds,
+        _parser.pop_backend_counts(),
+        snapshot,
     )
-    pdfsPath = RAW_DATA_DIR / "CivilServiceCommission" / "pdfs"
+
+
+def _chunked(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def iter_parsed(
+    pdf_files: list,
+    workers: int = 1,
+    chunk_size: int = 16,
+    backend: str = "auto",
+):
+    """Parse PDFs and yield the results chunk by chunk.
+
+    With more than one worker the chunks are spread over a process pool and
+    yielded in completion order, so callers must not rely on file order.
+    Args:
+        pdf_files (list): Paths of the PDFs to parse.
+        workers (int): Number of parser processes. 1 parses in-process.
+        chunk_size (int): Number of PDFs handed to a worker at a time.
+        backend (str): Text extraction backend of `PDFParser`.
+    Yields:
+        tuple: (worker id, [(pdf_file, parsed_pdf, fingerprint), ...],
+            seconds spent, text backend usage counts, metrics snapshot).
+    """
+    if workers <= 1:
+        _init_worker(backend)
+        for chunk in _chunked(pdf_files, chunk_size):
+            yield _parse_chunk(chunk)
+        return
+
+    # Spawned, callers may hold a DuckDB connection a fork would copy
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(backend, metrics.is_enabled(), metrics.is_tracing()),
+    ) as executor:
+        futures = [
+            executor.submit(_parse_chunk, chunk)
+            for chunk in _chunked(pdf_files, chunk_size)
+        ]
+        try:
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _log_worker_stats(worker_stats: dict):
+    for worker, (files, seconds) in sorted(worker_stats.items()):
+        rate = files / seconds if seconds else 0.0
+        logger.info(
+            f"Worker {worker}: {files} PDFs in {seconds:.1f}s ({rate:.2f} PDFs/s)"
+        )
+
+
+def store(results: list, manifest, writer) -> int:
+    """Record parsed PDFs in the manifest and buffer their rows.
+    Args:
+        results (list): [(pdf_file, parsed_pdf, fingerprint), ...] of
+            `_parse_chunk`.
+        manifest (PDFManifest): Manifest of the processed PDFs.
+        writer (PDFTableWriter): Writer of the PDF table.
+    Returns:
+        int: Number of PDFs that failed to parse.
+    """
+    failed = 0
+    for pdf_file, parsed_pdf, pdf_fingerprint in results:
+        jobId = int(pdf_file.stem)
+        if parsed_pdf is None:
+            failed += 1
+            # A changed file keeps its previous row and entry, so a later
+            # --verify run queues it again
+            if jobId not in manifest.replacing:
+                manifest.add(jobId, pdf_fingerprint, "failed")
+            logger.warning(f"Failed to parse {pdf_file.name}. Skipping.")
+            continue
+
+        # Entered in the manifest once the writer has stored the row
+        writer.add(parsed_pdf, pdf_fingerprint)
+    return failed
+
+
+def process(
+    pdfsPath: Path,
+    dbPath: Path,
+    workers: int = 1,
+    chunk_size: int = 16,
+    batch_size: int = 500,
+    verify: bool = False,
+    skip_failed: bool = False,
+    backend: str = "auto",
+) -> dict:
+    """Parse the new PDFs of a directory into the PDF table.
+    Args:
+        pdfsPath (Path): Directory of the downloaded `<jobId>.pdf` files.
+        dbPath (Path): DuckDB file of the parsed PDFs, created if missing.
+        workers (int): Number of parser processes. 1 parses in-process.
+        chunk_size (int): Number of PDFs handed to a worker at a time.
+        batch_size (int): Rows per bulk insert and commit.
+        verify (bool): Re-queue processed PDFs whose content changed.
+        skip_failed (bool): Do not retry PDFs that failed to parse.
+        backend (str): Text extraction backend of `PDFParser`.
+    Returns:
+        dict: PDFs queued, rows inserted, duplicates and failures.
+    """
+    import duckdb
+    from tqdm import tqdm
+
+    from ml_final_project.preprocessing import PDFManifest, PDFTableWriter
 
     if not dbPath.parent.exists():
         dbPath.parent.mkdir(parents=True, exist_ok=True)
@@ -27,81 +187,95 @@ def main():
     logger.info(f"Connecting to DuckDB database at {dbPath}.")
     db = duckdb.connect(dbPath)
 
-    #  Create the table if it doesn't exist
-    db.sql(
-        """
-CREATE TABLE IF NOT EXISTS civilservicecommission_pdfs (
-        jobId INT PRIMARY KEY,
-        Agency VARCHAR,
-        PlaceOfAssignment VARCHAR,
-        PositionTitle VARCHAR,
-        PlantillaNo VARCHAR,
-        SalaryGrade VARCHAR,
-        MonthlySalary INT,
-        Eligibility VARCHAR,
-        Education VARCHAR,
-        Training VARCHAR,
-        Experience VARCHAR,
-        Competency VARCHAR
-    )
-        """
-    )
-
-    insert_query = """
-    INSERT INTO civilservicecommission_pdfs (
-        jobId, Agency, PlaceOfAssignment, PositionTitle, PlantillaNo, SalaryGrade,
-        MonthlySalary, Eligibility, Education, Training, Experience, Competency
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """
+    manifest = PDFManifest(db)
+    writer = PDFTableWriter(db, batch_size=batch_size, manifest=manifest)
 
     already_inserted = db.execute(
-        "SELECT jobId FROM civilservicecommission_pdfs"
-    ).fetchnumpy()["jobId"]
+        "SELECT count(*) FROM civilservicecommission_pdfs"
+    ).fetchone()[0]
 
     logger.info(
-        f"{len(already_inserted)} existing records. Identifying new PDF files to process..."
+        f"{already_inserted} existing records. Identifying new PDF files to process..."
     )
-    pdf_files = [
-        f
-        for f in pdfsPath.iterdir()
-        if (f.suffix == ".pdf") and (int(f.stem) not in already_inserted)
-    ]
+    with metrics.timer("pdfs.backlog"):
+        pdf_files = manifest.backlog(pdfsPath, verify, skip_failed)
 
-    logger.info("Processing and inserting data into the database.")
-    parser = PDFParser()
-    counter = count()
+    logger.info(
+        f"Processing and inserting data into the database with {workers} worker(s)."
+    )
+    failed = 0
+    # worker id -> [PDFs parsed, seconds spent parsing]
+    worker_stats = defaultdict(lambda: [0, 0.0])
+    backend_counts = Counter()
 
     try:
-        for pdf_file in tqdm(pdf_files, desc="Processing PDFs"):
-            parsed_pdf = parser.parse(pdf_file)
-
-            if parsed_pdf is None:
-                logger.warning(f"Failed to parse {pdf_file.name}. Skipping.")
-                continue
-
-            jobId = parsed_pdf[0]
-
-            try:
-                db.execute(
-                    insert_query,
-                    parsed_pdf,
-                )
-                next(counter)
-            except duckdb.ConstraintException:
-                logger.warning(
-                    f"Duplicate entry for jobId: {jobId} Skipping insertion."
-                )
-            except Exception as e:
-                logger.error(f"Error inserting data for jobId: {jobId} - {e}")
+        pbar = tqdm(total=len(pdf_files), desc="Processing PDFs")
+        for worker, results, seconds, backends, snapshot in iter_parsed(
+            pdf_files, workers, chunk_size, backend
+        ):
+            metrics.merge(snapshot)
+            worker_stats[worker][0] += len(results)
+            worker_stats[worker][1] += seconds
+            backend_counts.update(backends)
+            pbar.update(len(results))
+            failed += store(results, manifest, writer)
     except KeyboardInterrupt:
         logger.info("PDF processing interrupted by user.")
     else:
         logger.success("Data insertion completed.")
     finally:
-        logger.info(f"Total records inserted: {counter}")
-        db.commit()
+        writer.flush()
+        logger.info(f"Total records inserted: {writer.inserted}")
+        logger.info(
+            f"{writer.duplicates} duplicates, {failed} failed to parse, "
+            f"{writer.failed} failed to insert."
+        )
+        _log_worker_stats(worker_stats)
+        logger.info(f"Text backends used: {dict(backend_counts)}")
+        metrics.count("pdfs.inserted", writer.inserted)
+        metrics.count("pdfs.duplicates", writer.duplicates)
+        metrics.count("pdfs.failed", failed + writer.failed)
         db.close()
 
+    return {
+        "queued": len(pdf_files),
+        "inserted": writer.inserted,
+        "duplicates": writer.duplicates,
+        "failed": failed + writer.failed,
+    }
+
+
+@app.command()
+def main(
+    workers: int = 1,  # Number of parser processes. 1 parses in-process.
+    chunk_size: int = 16,  # PDFs handed to a worker at a time
+    batch_size: int = 500,  # Rows per bulk insert and commit
+    verify: bool = False,  # Re-queue processed PDFs whose content changed
+    skip_failed: bool = False,  # Do not retry PDFs that failed to parse
+    backend: str = "auto",  # Text backend: auto, pypdf or pdfplumber
+    metrics_report: bool = False,  # Write timers to reports/metrics
+    trace: bool = False,  # Also record a span for every timed call
+    profile: str = "none",  # Profiler: none, cprofile or py-spy
+):
+    dbPath = (
+        INTERIM_DATA_DIR
+        / "CivilServiceCommission"
+        / "civilservicecommission_pdfs.duckdb"
+    )
+    pdfsPath = RAW_DATA_DIR / "CivilServiceCommission" / "pdfs"
+
+    with metrics.session("pdfs", metrics_report or trace, trace, profile):
+        process(
+            pdfsPath,
+            dbPath,
+            workers=workers,
+            chunk_size=chunk_size,
+            batch_size=batch_size,
+            verify=verify,
+            skip_failed=skip_failed,
+            backend=backend,
+        )
+
 
 if __name__ == "__main__":
     try:
@@ -112,7 +286,7 @@ if __name__ == "__main__":
             level="INFO",
         )
         logger.info("Starting PDF processing.")
-        main()
+        app()
     except Exception as e:
         logger.error(f"Something went wrong: {e}")
     except KeyboardInterrupt:
@@ -1,7 +1,7 @@
 import typer
 
+from ml_final_project import metrics
 from ml_final_project.config import REPORTS_DIR, logger
-from ml_final_project.scrapers import CSC
 
 app = typer.Typer()
 
@@ -11,7 +11,29 @@ def CSCJobBoard(
     num_pages: int = -1,  # Number of pages to scrape. -1 for all pages.
     headless: bool = False,  # Run in headless mode (no GUI)
     use_duckdb: bool = True,  # Save to DuckDB instead of CSV
+    batch_pages: int = 5,  # Pages buffered per DuckDB insert
+    dedupe: bool = True,  # Skip rows whose Action is already stored
+    engine: str = "browser",  # browser (Playwright) or http (httpx)
+    url: str = "https://csc.gov.ph/career/",  # Listing page (http engine)
+    endpoint: str = None,  # DataTables URL (http engine), default: the page's
+    page_size: int = 1000,  # Rows per endpoint request (http engine)
+    concurrency: int = 4,  # Requests in flight at once (http engine)
+    incremental: bool = False,  # Stop once pages hold only known postings
+    stop_after: int = 3,  # Consecutive known pages before stopping
+    resume: bool = False,  # Continue an interrupted crawl (DuckDB only)
+    min_delay: float = 1.0,  # Shortest pause between pages (browser engine)
+    max_delay: float = 60.0,  # Longest pause between pages (browser engine)
+    lookup_ip: bool = False,  # Log the public IP the scrape runs from
+    metrics_report: bool = False,  # Write timers to reports/metrics
+    trace: bool = False,  # Also record a span for every timed call
+    profile: str = "none",  # Profiler: none, cprofile or py-spy
 ):
+    """Scrape the CSC job board listing.
+
+    The browser engine pages through the whole listing. The http engine
+    pages through the DataTables data URL given as `--endpoint`, or the
+    one the listing page configures, and fails if there is neither.
+    """
     try:
         logger.add(
             str(REPORTS_DIR / "CSC-scrape.log"),
@@ -19,8 +41,46 @@ def CSCJobBoard(
             retention="10 days",
             level="INFO",
         )
-        scraper = CSC()
-        scraper.start_scrape(num_pages, headless, use_duckdb)
+        session = metrics.session(
+            "scrape", metrics_report or trace, trace, profile
+        )
+        if engine == "http":
+            from ml_final_project.scrapers import CSCHttp
+
+            scraper = CSCHttp(
+                url=url,
+                endpoint=endpoint,
+                page_size=page_size,
+                concurrency=concurrency,
+                batch_pages=batch_pages,
+                dedupe=dedupe,
+                lookup_ip=lookup_ip,
+            )
+            with session:
+                scraper.start_scrape(
+                    num_pages, use_duckdb, incremental, stop_after, resume
+                )
+        elif engine == "browser":
+            from ml_final_project.scrapers import CSC
+
+            scraper = CSC(
+                min_delay=min_delay,
+                max_delay=max_delay,
+                batch_pages=batch_pages,
+                dedupe=dedupe,
+                lookup_ip=lookup_ip,
+            )
+            with session:
+                scraper.start_scrape(
+                    num_pages,
+                    headless,
+                    use_duckdb,
+                    incremental,
+                    stop_after,
+                    resume,
+                )
+        else:
+            raise typer.BadParameter(f"Unknown engine {engine!r}.")
     except KeyboardInterrupt:
         logger.info("Scraping interrupted by user.")
 
@@ -1,29 +1,83 @@
-import re
+from functools import cached_property
+from pathlib import Path
 import time
-from io import StringIO
+from urllib.request import urlopen
 
-import duckdb
-import pandas as pd
-import requests
 from loguru import logger
+import pandas as pd
 
 from ml_final_project.config import RAW_DATA_DIR
+from ml_final_project.scrapers.CSVSink import CSVSink
+from ml_final_project.scrapers.DuckDBSink import DuckDBSink
+
+# Headers, cell texts and `info_<jobId>` button ID of every row of the
+# first table on the page, matching what pd.read_html(...)[0] used to parse
+EXTRACT_ROWS_JS = """
+() => {
+    const table = document.querySelector("table");
+    if (!table) {
+        return {headers: [], rows: []};
+    }
+    const text = (cell) => cell.textContent.trim();
+    const headers = Array.from(table.querySelectorAll("thead th"), text);
+    const rows = [];
+    for (const tr of table.querySelectorAll("tbody tr")) {
+        const button = Array.from(tr.querySelectorAll("button[id]")).find(
+            (b) => /^info_\\d+$/.test(b.id)
+        );
+        // Skips placeholder rows such as "No data available in table"
+        if (!button) {
+            continue;
+        }
+        rows.push({
+            cells: Array.from(tr.querySelectorAll("td"), text),
+            infoId: button.id.slice(5),
+        });
+    }
+    return {headers, rows};
+}
+"""
 
 
 class BaseScraper:
 
-    def __init__(self, name: str, url: str):
+    def __init__(
+        self,
+        name: str,
+        url: str,
+        csv_max_rows: int | None = None,
+        batch_pages: int = 5,
+        dedupe: bool = True,
+        lookup_ip: bool = False,
+        ip_timeout: float = 5.0,
+        data_dir: Path | None = None,
+    ):
         self.NAME = name
         self.URL = url
-        self.DATA_DIR = RAW_DATA_DIR / self.NAME
-        self.PUBLIC_IP = requests.get("https://api.ipify.org").text
+        # Output directory, RAW_DATA_DIR/<name> unless given
+        self.DATA_DIR = Path(data_dir or RAW_DATA_DIR / self.NAME)
+        # Rows per CSV partition, None keeps a single CSV file
+        self.csv_max_rows = csv_max_rows
+        # Pages per DuckDB insert, and whether to skip known `Action`s
+        self.batch_pages = batch_pages
+        self.dedupe = dedupe
+        self.csv_sink = None
+        self._duckdb_sink = None
+
+        # Incremental mode, see `start_incremental`
+        self.known_ids = None
+        self.stop_after = None
+        self.known_streak = 0
+        self.pages_skipped = 0
+        # Public IP discovery, deferred to `log_public_ip`
+        self.lookup_ip = lookup_ip
+        self.ip_timeout = ip_timeout
 
         if " " in self.NAME:
             logger.error("Name cannot contain spaces.")
             raise ValueError("Name cannot contain spaces.")
 
         logger.info(f"STARTING SCRAPING {self.NAME}")
-        logger.info(f"SCRAPING FROM {self.PUBLIC_IP}")
         logger.info(f"SCRAPING URL {self.URL}")
 
         if not self.DATA_DIR.exists():
@@ -36,85 +90,167 @@ class BaseScraper:
     def __repr__(self):
         return f"<{self.NAME}Scraper({self.url=})>"
 
-    def save_to_csv(self, page):
-        """Save the DataFrame to a CSV file.
+    @cached_property
+    def PUBLIC_IP(self) -> str | None:
+        """Public IP address of this machine, None if it is unknown."""
+        if not self.lookup_ip:
+            return None
+        try:
+            with urlopen(
+                "https://api.ipify.org", timeout=self.ip_timeout
+            ) as response:
+                return response.read().decode().strip()
+        except OSError as e:
+            logger.warning(f"Could not look up the public IP ({e}).")
+            return None
+
+    def log_public_ip(self):
+        """Log the public IP the scrape runs from, if lookups are on."""
+        if self.PUBLIC_IP is not None:
+            logger.info(f"SCRAPING FROM {self.PUBLIC_IP}")
+
+    @property
+    def duckdb_sink(self) -> DuckDBSink:
+        """DuckDB writer kept open for the whole run."""
+        if self._duckdb_sink is None:
+            self._duckdb_sink = DuckDBSink(
+                self.DATA_DIR / f"{self.NAME}.duckdb",
+                self.NAME,
+                batch_pages=self.batch_pages,
+                dedupe=self.dedupe,
+            )
+        return self._duckdb_sink
+
+    def close(self):
+        """Flush and close the output sinks."""
+        if self.csv_sink is not None:
+            self.csv_sink.close()
+            self.csv_sink = None
+        if self._duckdb_sink is not None:
+            self._duckdb_sink.close()
+            logger.info(
+                f"{self._duckdb_sink.inserted} rows inserted, "
+                f"{self._duckdb_sink.skipped} duplicates skipped."
+            )
+            self._duckdb_sink = None
+
+    def start_incremental(self, stop_after: int):
+        """Stop the crawl once `stop_after` consecutive pages are known.
         Args:
-            df (pd.DataFrame): DataFrame to save.
-            filename (str): Filename for the CSV file.
+            stop_after (int): Consecutive pages holding only `Action` IDs
+                that are already stored before the crawl stops.
         """
-        data = pd.read_html(StringIO(page.content()))[0]
-        logger.info(f"Retrieved data's shape {data.shape}")
+        self.known_ids = self.duckdb_sink.known_ids()
+        self.stop_after = stop_after
+        logger.info(
+            f"Incremental scrape: {len(self.known_ids)} known IDs, stopping after {stop_after} known pages."
+        )
 
-        buttons = page.locator("button").all()
+    def is_caught_up(self, data: pd.DataFrame) -> bool:
+        """Track a scraped page in incremental mode.
+        Args:
+            data (pd.DataFrame): Rows with the job ID in `infoId`.
+        Returns:
+            bool: True once enough consecutive pages held only known IDs.
+        """
+        if self.known_ids is None:
+            return False
+
+        ids = set(data["infoId"])
+        if ids - self.known_ids:
+            self.known_streak = 0
+        else:
+            self.known_streak += 1
+            self.pages_skipped += 1
+        self.known_ids |= ids
 
-        # Regex to match buttons with 'id_' followed by dynamic jobId
-        pattern = re.compile(
-            r"^info_\d+$"
-        )  # You can adjust the pattern to suit your jobId format
+        if self.known_streak >= self.stop_after:
+            logger.info(
+                f"{self.known_streak} consecutive pages of known postings. Caught up."
+            )
+            return True
+        return False
 
-        # Iterate over all buttons and check their 'id' attribute using regex
-        infoIds = []
-        for button in buttons:
-            button_id = button.get_attribute("id")
-            if button_id and pattern.match(button_id):
-                infoIds.append(button_id[5:])
+    def log_summary(self):
+        if self._duckdb_sink is not None:
+            self._duckdb_sink.flush()
+            logger.info(f"New rows: {self._duckdb_sink.inserted}")
+        logger.info(
+            f"Pages skipped (resumed past or only known postings): {self.pages_skipped}"
+        )
 
-        data["Details"] = infoIds
+    def extract_rows(self, page) -> pd.DataFrame:
+        """Read the listing table and its job IDs in one browser round trip.
 
-        # Convert all columns to string type
-        # This is to avoid issues with CSV writing
-        # due to the nature of dirty data
-        data = data.astype(str)
+        The rows' cell texts and the ID of each row's `info_<jobId>` button
+        are collected together inside the page, so the IDs can never get
+        out of step with the rows.
+        Args:
+            page (Page): Playwright page showing the job listing.
+        Returns:
+            pd.DataFrame: One row per job; the job ID is in `infoId`.
+        """
+        start = time.perf_counter()
+        table = page.evaluate(EXTRACT_ROWS_JS)
 
-        filecount = sum(1 for _ in self.DATA_DIR.iterdir())
-        FILENAME = self.DATA_DIR / f"{self.NAME}.csv"
+        data = pd.DataFrame(
+            [row["cells"] for row in table["rows"]],
+            columns=table["headers"],
+        )
+        data["infoId"] = [row["infoId"] for row in table["rows"]]
 
-        if filecount == 0:
-            data.to_csv(FILENAME, index=False)
-        else:
-            csv = pd.read_csv(FILENAME)
-            csv = pd.concat([csv, data], ignore_index=True)
-            csv.to_csv(FILENAME, index=False)
+        logger.info(
+            f"Retrieved data's shape {data.shape} in {(time.perf_counter() - start) * 1000:.0f} ms"
+        )
+        return data
+
+    def save_to_csv(self, page):
+        """Save the page's job listing to the CSV file.
+        Args:
+            page (Page): Playwright page showing the job listing.
+        """
+        self.write_csv(self.extract_rows(page))
 
     def save_to_duckdb(self, page):
-        """Save the DataFrame to a DuckDB file.
+        """Save the page's job listing to the DuckDB file.
         Args:
-            df (pd.DataFrame): DataFrame to save.
-            filename (str): Filename for the DuckDB file.
+            page (Page): Playwright page showing the job listing.
         """
-        data = pd.read_html(StringIO(page.content()))[0]
-        logger.info(f"Retrieved data's shape {data.shape}")
+        self.write_duckdb(self.extract_rows(page))
 
-        buttons = page.locator("button").all()
+    def write_csv(self, data: pd.DataFrame, offset: int | None = None):
+        """Append job listing rows to the CSV file.
+        Args:
+            data (pd.DataFrame): Rows with the job ID in `infoId`.
+            offset (int): Unused, CSV output is not checkpointed.
+        """
+        data = data.rename(columns={"infoId": "Details"})
 
-        # Regex to match buttons with 'id_' followed by dynamic jobId
-        pattern = re.compile(
-            r"^info_\d+$"
-        )  # You can adjust the pattern to suit your jobId format
+        # Convert all columns to string type
+        # This is to avoid issues with CSV writing
+        # due to the nature of dirty data
+        data = data.astype(str)
 
-        # Iterate over all buttons and check their 'id' attribute using regex
-        infoIds = []
-        for button in buttons:
-            button_id = button.get_attribute("id")
-            if button_id and pattern.match(button_id):
-                infoIds.append(button_id[5:])
+        if self.csv_sink is None:
+            self.csv_sink = CSVSink(
+                self.DATA_DIR / f"{self.NAME}.csv",
+                max_rows=self.csv_max_rows,
+            )
+        self.csv_sink.write(data)
 
-        data["Action"] = infoIds
+    def write_duckdb(self, data: pd.DataFrame, offset: int | None = None):
+        """Append job listing rows to the DuckDB file.
+        Args:
+            data (pd.DataFrame): Rows with the job ID in `infoId`.
+            offset (int): Listing rows covered once these are stored, kept
+                as the resume checkpoint.
+        """
+        data = data.copy()
+        data["Action"] = data.pop("infoId")
 
         # Convert all columns to string type
         # This is to avoid issues with CSV writing
         # due to the nature of dirty data
         data = data.astype(str)
 
-        filecount = sum(1 for _ in self.DATA_DIR.iterdir())
-        FILENAME = self.DATA_DIR / f"{self.NAME}.duckdb"
-
-        duckdb_conn = duckdb.connect(FILENAME)
-        if filecount == 0:
-            duckdb_conn.execute(
-                f"CREATE TABLE {self.NAME} AS SELECT * FROM data"
-            )
-        else:
-            duckdb_conn.execute(f"INSERT INTO {self.NAME} SELECT * FROM data")
-
-        duckdb_conn.close()
+        self.duckdb_sink.write(data, offset=offset)
@@ -1,12 +1,17 @@
-import time
 from itertools import count
+import time
 
-import numpy as np
 from loguru import logger
 from playwright.sync_api import Playwright, sync_playwright
 from tqdm import tqdm
 
+from ml_final_project import metrics
 from ml_final_project.scrapers import BaseScraper
+from ml_final_project.scrapers.RateController import (
+    RateController,
+    table_signature,
+    wait_for_redraw,
+)
 
 
 class CSC(BaseScraper):
@@ -15,82 +20,229 @@ class CSC(BaseScraper):
     This website uses Load-More pagination, which means that the page loads more job listings as you click "next"
     """
 
-    def __init__(self):
+    PAGE_LENGTH = 100
+
+    def __init__(
+        self,
+        min_delay: float = 1.0,
+        max_delay: float = 60.0,
+        redraw_timeout: float = 30.0,
+        **kwargs,
+    ):
+        """
+        Args:
+            min_delay (float): Shortest pause between pages, in seconds.
+            max_delay (float): Longest pause between pages, in seconds.
+            redraw_timeout (float): Seconds to wait for the table to redraw
+                before counting the page as failed.
+        """
         super().__init__(
-            name="CivilServiceCommission", url="https://csc.gov.ph/career/"
+            name="CivilServiceCommission",
+            url="https://csc.gov.ph/career/",
+            **kwargs,
         )
 
         self.COUNTER = count(1)
+        self.redraw_timeout = redraw_timeout
+        self.rate = RateController(min_delay=min_delay, max_delay=max_delay)
 
     def _scrape(
-        self, pw: Playwright, num_pages, headless: bool, use_duckdb: bool
+        self,
+        pw: Playwright,
+        num_pages,
+        headless: bool,
+        use_duckdb: bool,
+        incremental: bool = False,
+        stop_after: int = 3,
+        resume: bool = False,
     ):
         """Scrape the job listings from the CSC Careers website.
         Args:
             pw (Playwright): Playwright instance.
             num_pages (int): Number of pages to scrape. -1 for all pages.
-        Returns:
-            pd.DataFrame: DataFrame containing the job listings.
+            incremental (bool): Stop once `stop_after` consecutive pages
+                hold only postings that are already stored.
+            stop_after (int): Known pages in a row before stopping.
+            resume (bool): Continue an interrupted crawl from its
+                checkpoint. DuckDB output only.
         """
         browser = pw.chromium.launch(headless=headless)
-        context = browser.new_context()
-        page = context.new_page()
-
-        save = self.save_to_duckdb if use_duckdb else self.save_to_csv
-
-        page.goto(self.URL)
-        page.wait_for_load_state("domcontentloaded")
-
-        # Select 100 number of jobs to display per page
-        page.select_option("select[name='jobs_length']", "100")
-        time.sleep(10)
-
-        random_numbers = np.random.standard_gamma(10, 15000) / 2
-
-        def scrape_page():
-            page.wait_for_load_state("domcontentloaded")
-
-            save(page)
-
-            next_button = page.locator("a.paginate_button.next")
-
-            # Get class attribute
-            class_attr = next_button.get_attribute("class")
-
-            if class_attr and "disabled" in class_attr:
-                logger.info("No more pages to scrape.")
-                exit(0)
-
-            next_button.click()
-            logger.info(f"Scraped page {next(self.COUNTER)}")
-            time.sleep(np.random.choice(random_numbers))
-
-        if num_pages == -1:
-            while True:
+        context = None
+        # However the crawl ends, e.g. a redraw timing out, the sinks keep
+        # their last batch and checkpoint and the browser is shut down
+        try:
+            context = browser.new_context()
+            page = context.new_page()
+
+            write = self.write_duckdb if use_duckdb else self.write_csv
+
+            with metrics.timer("scrape.load"):
+                page.goto(self.URL)
+                page.wait_for_load_state("domcontentloaded")
+
+                # Select 100 number of jobs to display per page
+                page.wait_for_selector("table tbody button[id^='info_']")
+                previous = table_signature(page)
+                page.select_option(
+                    "select[name='jobs_length']", str(self.PAGE_LENGTH)
+                )
+                wait_for_redraw(page, previous, self.redraw_timeout)
+
+            if incremental:
+                self.start_incremental(stop_after)
+
+            page_index = 0
+            if resume and use_duckdb:
+                offset = self.duckdb_sink.load_checkpoint()
+                if offset:
+                    page_index = offset // self.PAGE_LENGTH
+                    logger.info(f"Resuming from page {page_index + 1}.")
+                    previous = table_signature(page)
+                    self._goto_page(page, page_index)
+                    wait_for_redraw(page, previous, self.redraw_timeout)
+                    self.pages_skipped += page_index
+
+            def scrape_page() -> bool:
+                """Scrape the current page and move to the next one.
+                Returns:
+                    bool: False once there is nothing left to scrape.
+                """
+                nonlocal page_index
+                page.wait_for_load_state("domcontentloaded")
+
+                with metrics.timer("scrape.extract_rows"):
+                    data = self.extract_rows(page)
+                page_index += 1
+                # Incremental runs leave a full crawl's checkpoint alone
+                offset = None if incremental else page_index * self.PAGE_LENGTH
+                with metrics.timer("scrape.write"):
+                    write(data, offset=offset)
+                metrics.count("scrape.pages")
+                metrics.count("scrape.rows", len(data))
+
+                if self.is_caught_up(data):
+                    return False
+
+                next_button = page.locator("a.paginate_button.next")
+
+                # Get class attribute
+                class_attr = next_button.get_attribute("class")
+
+                if class_attr and "disabled" in class_attr:
+                    logger.info("No more pages to scrape.")
+                    return False
+
+                with metrics.timer("scrape.rate_wait"):
+                    self.rate.wait()
+                with metrics.timer("scrape.next_page"):
+                    self._next_page(page, next_button)
+                logger.info(f"Scraped page {next(self.COUNTER)}")
+                return True
+
+            finished = False
+            if num_pages == -1:
+                while True:
+                    try:
+                        if not scrape_page():
+                            finished = True
+                            break
+                    except Exception as e:
+                        metrics.count("scrape.errors")
+                        logger.error("Error scraping page.")
+                        logger.error(e)
+                        break
+            else:
                 try:
-                    scrape_page()
+                    for i in tqdm(range(0, num_pages)):
+                        if not scrape_page():
+                            finished = True
+                            break
                 except Exception as e:
+                    metrics.count("scrape.errors")
                     logger.error("Error scraping page.")
                     logger.error(e)
-                    break
-        else:
-            try:
-                for i in tqdm(range(0, num_pages)):
-                    scrape_page()
-            except Exception as e:
-                logger.error("Error scraping page.")
-                logger.error(e)
 
-        context.close()
-        browser.close()
+            if finished and use_duckdb and not incremental:
+                self.duckdb_sink.clear_checkpoint()
 
-    def start_scrape(self, num_pages, headless: bool, use_duckdb: bool):
+            self.rate.log_stats()
+            self.log_summary()
+        finally:
+            self.close()
+            if context is not None:
+                context.close()
+            browser.close()
+
+    def _next_page(self, page, next_button):
+        """Click "next" and wait until the table shows the new rows.
+
+        The time from the click to the redraw is the page latency fed to
+        the rate controller. A redraw that times out is retried once after
+        the controller has backed off.
+        """
+        previous = table_signature(page)
+        for attempt in range(2):
+            start = time.perf_counter()
+            if attempt == 0:
+                next_button.click()
+            try:
+                wait_for_redraw(page, previous, self.redraw_timeout)
+            except Exception:
+                self.rate.record(None, ok=False)
+                if attempt == 1:
+                    raise
+                logger.warning(
+                    f"Table did not redraw within {self.redraw_timeout}s. "
+                    f"Waiting {self.rate.delay:.1f}s."
+                )
+                self.rate.wait()
+                continue
+            self.rate.record(time.perf_counter() - start)
+            return
+
+    def _goto_page(self, page, page_index: int):
+        """Jump to a page of the listing, e.g. to resume a crawl."""
+        try:
+            page.evaluate(
+                """
+                (index) => window.jQuery("table").DataTable()
+                    .page(index).draw("page")
+                """,
+                page_index,
+            )
+        except Exception as e:
+            logger.warning(
+                f"DataTables API unavailable ({e}). Clicking through pages."
+            )
+            for _ in tqdm(range(page_index), desc="Skipping pages"):
+                previous = table_signature(page)
+                page.locator("a.paginate_button.next").click()
+                wait_for_redraw(page, previous, self.redraw_timeout)
+
+    def start_scrape(
+        self,
+        num_pages,
+        headless: bool,
+        use_duckdb: bool,
+        incremental: bool = False,
+        stop_after: int = 3,
+        resume: bool = False,
+    ):
         """Start the scraping process.
         Args:
             num_pages (int): Number of pages to scrape. -1 for all pages.
-        Returns:
-            pd.DataFrame: DataFrame containing the job listings.
+            incremental (bool): Stop once the crawl reaches known postings.
+            stop_after (int): Known pages in a row before stopping.
+            resume (bool): Continue an interrupted crawl.
         """
-
+        self.log_public_ip()
         with sync_playwright() as pw:
-            self._scrape(pw, num_pages, headless, use_duckdb)
+            self._scrape(
+                pw,
+                num_pages,
+                headless,
+                use_duckdb,
+                incremental,
+                stop_after,
+                resume,
+            )
@@ -0,0 +1,271 @@
+import asyncio
+import re
+from urllib.parse import urljoin
+
+import httpx
+from loguru import logger
+from lxml import html as lxml_html
+import pandas as pd
+from tqdm import tqdm
+
+from ml_final_project.scrapers import BaseScraper
+
+INFO_ID = re.compile(r"\binfo_(\d+)\b")
+TAG = re.compile(r"<[^>]+>")
+# The `ajax` source of a DataTables config, as a string or `{url: ...}`
+AJAX_URL = re.compile(
+    r"""["']?ajax["']?\s*:\s*"""
+    r"""(?:\{[^}]*?["']?url["']?\s*:\s*)?["']([^"']+)["']"""
+)
+
+
+def parse_listing_html(text: str) -> tuple:
+    """Parse the first table of a listing page without a browser.
+
+    Mirrors `EXTRACT_ROWS_JS`: header texts, and for every row its cell
+    texts and the ID of its `info_<jobId>` button.
+    Args:
+        text (str): HTML of the listing page.
+    Returns:
+        tuple: (headers, [(cells, infoId), ...]).
+    """
+    tables = lxml_html.fromstring(text).xpath("//table")
+    if not tables:
+        return [], []
+
+    table = tables[0]
+    headers = [th.text_content().strip() for th in table.xpath(".//thead//th")]
+    rows = []
+    for tr in table.xpath(".//tbody/tr"):
+        infoIds = [
+            button.get("id")[5:]
+            for button in tr.xpath(".//button[@id]")
+            if re.fullmatch(r"info_\d+", button.get("id"))
+        ]
+        if not infoIds:
+            continue
+        cells = [td.text_content().strip() for td in tr.xpath("./td")]
+        rows.append((cells, infoIds[0]))
+    return headers, rows
+
+
+def find_endpoint(text: str, base_url: str) -> str | None:
+    """DataTables data URL configured in a listing page's scripts.
+    Args:
+        text (str): HTML of the listing page.
+        base_url (str): URL of the page, relative URLs are resolved to it.
+    Returns:
+        str: Absolute data URL, None when the page configures none.
+    """
+    for script in lxml_html.fromstring(text).xpath("//script/text()"):
+        match = AJAX_URL.search(script)
+        if match:
+            return urljoin(base_url, match.group(1))
+    return None
+
+
+def _column_key(name: str) -> str:
+    # "Position Title", "position_title" and "positionTitle" all match
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+def parse_datatables_row(row, headers: list) -> tuple:
+    """Cell texts and job ID of one row of a DataTables JSON response.
+
+    Rows given as objects are matched to the headers by name, so extra
+    keys such as `DT_RowId` never shift the columns.
+    Args:
+        row (list | dict): Row as returned in the response's `data`.
+        headers (list): Header texts of the listing table.
+    Returns:
+        tuple: (cells, infoId), infoId is None when the row has no button.
+    """
+    if isinstance(row, dict):
+        values = {_column_key(key): value for key, value in row.items()}
+        if not any(_column_key(header) in values for header in headers):
+            raise ValueError(
+                f"Row keys {list(row)} match none of the headers {headers}."
+            )
+        raw = [values.get(_column_key(header)) for header in headers]
+        searched = row.values()
+    else:
+        raw = searched = list(row)
+    raw = ["" if cell is None else str(cell) for cell in raw]
+    match = INFO_ID.search(" ".join(str(cell) for cell in searched))
+    cells = [
+        (
+            lxml_html.fromstring(cell).text_content().strip()
+            if TAG.search(cell)
+            else cell.strip()
+        )
+        for cell in raw
+    ]
+    return cells, match.group(1) if match else None
+
+
+class CSCHttp(BaseScraper):
+    """Browserless scraper for the CSC Careers job board.
+
+    Reads the listing page once for the table headers and the DataTables
+    data endpoint configured in its scripts, unless one is given. The
+    endpoint is then paged with large page sizes over a pooled `httpx`
+    client, a bounded number of requests at a time. The output schema is
+    the same as `CSC`, including `Action`.
+    """
+
+    def __init__(
+        self,
+        url: str = "https://csc.gov.ph/career/",
+        endpoint: str | None = None,
+        page_size: int = 1000,
+        concurrency: int = 4,
+        **kwargs,
+    ):
+        """
+        Args:
+            url (str): Listing page, e.g. a local fixture server in tests.
+            endpoint (str): DataTables server-side data URL. None finds
+                it in the listing page, and fails if the page has none.
+            page_size (int): Rows requested per call to the endpoint.
+            concurrency (int): Requests in flight at once.
+        """
+        super().__init__(name="CivilServiceCommission", url=url, **kwargs)
+        self.endpoint = endpoint
+        self.page_size = page_size
+        self.concurrency = concurrency
+
+    def start_scrape(
+        self,
+        num_pages,
+        use_duckdb: bool,
+        incremental: bool = False,
+        stop_after: int = 3,
+        resume: bool = False,
+    ):
+        """Start the scraping process.
+        Args:
+            num_pages (int): Number of endpoint pages to scrape. -1 for all.
+            use_duckdb (bool): Save to DuckDB instead of CSV.
+            incremental (bool): Stop once the crawl reaches known postings.
+            stop_after (int): Known pages in a row before stopping.
+            resume (bool): Continue an interrupted crawl.
+        """
+        self.log_public_ip()
+        try:
+            asyncio.run(
+                self._scrape(
+                    num_pages, use_duckdb, incremental, stop_after, resume
+                )
+            )
+            self.log_summary()
+        finally:
+            self.close()
+
+    async def _scrape(
+        self,
+        num_pages,
+        use_duckdb: bool,
+        incremental: bool,
+        stop_after: int,
+        resume: bool,
+    ):
+        write = self.write_duckdb if use_duckdb else self.write_csv
+        limits = httpx.Limits(
+            max_connections=self.concurrency,
+            max_keepalive_connections=self.concurrency,
+        )
+
+        if incremental:
+            self.start_incremental(stop_after)
+
+        async with httpx.AsyncClient(
+            limits=limits, timeout=60, follow_redirects=True
+        ) as client:
+            response = await client.get(self.URL)
+            response.raise_for_status()
+            headers, _ = parse_listing_html(response.text)
+
+            if self.endpoint is None:
+                self.endpoint = find_endpoint(response.text, str(response.url))
+                if self.endpoint is None:
+                    # Its rendered rows are only the first page
+                    raise ValueError(
+                        f"{self.URL} configures no DataTables data URL, "
+                        "pass it as `endpoint`."
+                    )
+                logger.info(f"Found the data endpoint {self.endpoint}.")
+
+            start = 0
+            if resume and use_duckdb:
+                start = self.duckdb_sink.load_checkpoint() or 0
+                if start:
+                    logger.info(f"Resuming from row {start}.")
+                    self.pages_skipped += start // self.page_size
+
+            first = await self._fetch_page(client, start)
+            total = first.get("recordsFiltered", first.get("recordsTotal", 0))
+            starts = list(range(start, total, self.page_size))
+            if num_pages != -1:
+                starts = starts[:num_pages]
+            logger.info(
+                f"{total} rows available, fetching {len(starts)} pages of {self.page_size}."
+            )
+
+            def handle(page_start: int, payload: dict) -> bool:
+                data = self._rows_frame(headers, payload)
+                # Incremental runs leave a full crawl's checkpoint alone
+                offset = (
+                    None
+                    if incremental
+                    else page_start + len(payload.get("data", []))
+                )
+                write(data, offset=offset)
+                pbar.update(1)
+                return self.is_caught_up(data)
+
+            # Pages are fetched `concurrency` at a time but handled in
+            # listing order, so checkpoints and the known-page streak
+            # always refer to a contiguous prefix of the listing.
+            pbar = tqdm(total=len(starts))
+            if handle(start, first):
+                return
+            rest = starts[1:]
+            for i in range(0, len(rest), self.concurrency):
+                window = rest[i : i + self.concurrency]
+                payloads = await asyncio.gather(
+                    *(self._fetch_page(client, s) for s in window)
+                )
+                for page_start, payload in zip(window, payloads):
+                    if handle(page_start, payload):
+                        return
+
+            if use_duckdb and not incremental and num_pages == -1:
+                self.duckdb_sink.clear_checkpoint()
+
+    async def _fetch_page(
+        self, client: httpx.AsyncClient, start: int, retries: int = 3
+    ) -> dict:
+        params = {"draw": 1, "start": start, "length": self.page_size}
+        for attempt in range(retries + 1):
+            try:
+                response = await client.get(self.endpoint, params=params)
+                response.raise_for_status()
+                return response.json()
+            except (httpx.HTTPError, ValueError) as e:
+                if attempt == retries:
+                    raise
+                logger.warning(f"Page at {start} failed ({e}). Retrying.")
+                await asyncio.sleep(2**attempt)
+
+    def _rows_frame(self, headers: list, payload: dict) -> pd.DataFrame:
+        rows = [
+            parse_datatables_row(row, headers)
+            for row in payload.get("data", [])
+        ]
+        return self._to_frame(headers, [row for row in rows if row[1]])
+
+    @staticmethod
+    def _to_frame(headers: list, rows: list) -> pd.DataFrame:
+        data = pd.DataFrame([cells for cells, _ in rows], columns=headers)
+        data["infoId"] = [infoId for _, infoId in rows]
+        return data
@@ -0,0 +1,129 @@
+import csv
+from pathlib import Path
+import re
+
+from loguru import logger
+import pandas as pd
+
+
+class CSVSink:
+    """Append-only CSV writer for scraped pages.
+
+    The header is written once, when a file is created, and every page is
+    appended to the open file, so saving a page costs the same however
+    large the dataset already is. With `max_rows` the output rolls over
+    into numbered partitions `<stem>-0000.csv`, `<stem>-0001.csv`, ...
+    """
+
+    def __init__(
+        self, path: Path, flush_every: int = 10, max_rows: int | None = None
+    ):
+        """
+        Args:
+            path (Path): CSV file to append to.
+            flush_every (int): Flush the file every this many pages.
+            max_rows (int): Rows per partition. None writes a single file.
+        """
+        self.path = path
+        self.flush_every = flush_every
+        self.max_rows = max_rows
+        self.columns = None
+        self.file = None
+        self.part = 0
+        self.part_rows = 0
+        self.pages = 0
+
+        if max_rows is not None:
+            # Resume in the last partition of a previous run, ignoring
+            # stray files such as `<stem>-old.csv`
+            pattern = re.compile(rf"{re.escape(path.stem)}-(\d+)\.csv")
+            parts = {
+                int(match[1]): part
+                for part in path.parent.glob(f"{path.stem}-*.csv")
+                if (match := pattern.fullmatch(part.name))
+            }
+            if parts:
+                self.part = max(parts)
+                self.part_rows = self._count_rows(parts[self.part])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def current_path(self) -> Path:
+        if self.max_rows is None:
+            return self.path
+        return self.path.with_name(f"{self.path.stem}-{self.part:04d}.csv")
+
+    def write(self, data: pd.DataFrame):
+        """Append a page of rows.
+        Args:
+            data (pd.DataFrame): Rows to append.
+        """
+        if self.columns is None:
+            self.columns = self._read_header() or list(data.columns)
+        elif set(data.columns) != set(self.columns):
+            logger.warning(
+                f"Page columns {list(data.columns)} differ from {self.columns}. Aligning."
+            )
+        data = data.reindex(columns=self.columns)
+
+        start = 0
+        while start < len(data):
+            if self.max_rows is not None and self.part_rows >= self.max_rows:
+                self._rollover()
+
+            stop = len(data)
+            if self.max_rows is not None:
+                stop = min(stop, start + self.max_rows - self.part_rows)
+
+            self._open().write(
+                data.iloc[start:stop].to_csv(header=False, index=False)
+            )
+            self.part_rows += stop - start
+            start = stop
+
+        self.pages += 1
+        if self.pages % self.flush_every == 0:
+            self.flush()
+
+    def flush(self):
+        if self.file is not None:
+            self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def _open(self):
+        if self.file is None:
+            path = self.current_path
+            new = not path.exists() or path.stat().st_size == 0
+            self.file = open(path, "a", newline="", encoding="utf-8")
+            if new:
+                self.file.write(
+                    pd.DataFrame(columns=self.columns).to_csv(index=False)
+                )
+        return self.file
+
+    def _rollover(self):
+        self.close()
+        self.part += 1
+        self.part_rows = 0
+        logger.info(f"Rolling over to {self.current_path.name}")
+
+    def _read_header(self) -> list | None:
+        path = self.current_path
+        if not path.exists() or path.stat().st_size == 0:
+            return None
+        with open(path, newline="", encoding="utf-8") as f:
+            return next(csv.reader(f), None)
+
+    @staticmethod
+    def _count_rows(path: Path) -> int:
+        with open(path, newline="", encoding="utf-8") as f:
+            return max(sum(1 for _ in csv.reader(f)) - 1, 0)
@@ -0,0 +1,169 @@
+from pathlib import Path
+
+import duckdb
+from loguru import logger
+import pandas as pd
+
+
+class DuckDBSink:
+    """Long-lived DuckDB writer for scraped pages.
+
+    One connection is kept open for the whole run. Pages are buffered and
+    appended `batch_pages` at a time inside a transaction. The table is
+    created with `CREATE TABLE IF NOT EXISTS` from the first page's
+    columns, all VARCHAR like the scraped data. With `dedupe`, rows whose
+    `Action` is already stored are dropped at insert time.
+
+    The scrape position is checkpointed in `scrape_checkpoint` in the same
+    transaction as the rows, so a resumed crawl never skips rows that
+    were still buffered when it was interrupted.
+    """
+
+    CHECKPOINT_TABLE = "scrape_checkpoint"
+
+    def __init__(
+        self,
+        path: Path,
+        table: str,
+        batch_pages: int = 5,
+        dedupe: bool = True,
+    ):
+        """
+        Args:
+            path (Path): DuckDB database file.
+            table (str): Table to append to.
+            batch_pages (int): Pages buffered per insert transaction.
+            dedupe (bool): Skip rows whose `Action` is already stored.
+        """
+        self.path = path
+        self.table = table
+        self.batch_pages = batch_pages
+        self.dedupe = dedupe
+        self.buffer = []
+        self.inserted = 0
+        self.skipped = 0
+        # Row offset reached by the last buffered page
+        self.offset = None
+        self.db = duckdb.connect(path)
+        create_query = f"""
+        CREATE TABLE IF NOT EXISTS {self.CHECKPOINT_TABLE} (
+            "table" VARCHAR PRIMARY KEY,
+            "offset" BIGINT,
+            updatedAt TIMESTAMP
+        )
+        """
+        self.db.execute(create_query)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, data: pd.DataFrame, offset: int | None = None):
+        """Buffer a page of rows, inserting once the batch is full.
+        Args:
+            data (pd.DataFrame): Rows to append.
+            offset (int): Rows of the listing covered once this page is
+                stored, checkpointed with the batch.
+        """
+        self.buffer.append(data)
+        if offset is not None:
+            self.offset = offset
+        if len(self.buffer) >= self.batch_pages:
+            self.flush()
+
+    def flush(self) -> int:
+        """Insert the buffered pages in one transaction.
+        Returns:
+            int: Number of rows inserted.
+        """
+        if not self.buffer:
+            return 0
+
+        batch = pd.concat(self.buffer, ignore_index=True)
+        self.buffer = []
+
+        self.db.register("page_batch", batch)
+        try:
+            self.db.begin()
+            self._create_table(batch)
+            if self.dedupe:
+                query = f"""
+                INSERT INTO "{self.table}" BY NAME
+                SELECT DISTINCT ON (b."Action") b.* FROM page_batch b
+                ANTI JOIN "{self.table}" t ON t."Action" = b."Action"
+                """
+            else:
+                query = f"""
+                INSERT INTO "{self.table}" BY NAME SELECT * FROM page_batch
+                """
+            inserted = self.db.execute(query).fetchone()[0]
+            if self.offset is not None:
+                self.db.execute(
+                    f"""
+                    INSERT OR REPLACE INTO {self.CHECKPOINT_TABLE}
+                    VALUES (?, ?, current_timestamp)
+                    """,
+                    [self.table, self.offset],
+                )
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        finally:
+            self.db.unregister("page_batch")
+
+        self.inserted += inserted
+        self.skipped += len(batch) - inserted
+        logger.info(
+            f"Inserted {inserted} of {len(batch)} rows into {self.table}."
+        )
+        return inserted
+
+    def known_ids(self) -> set:
+        """`Action` IDs already stored in the table."""
+        exists = self.db.execute(
+            """
+            SELECT count(*) FROM information_schema.tables
+            WHERE lower(table_name) = lower(?)
+            """,
+            [self.table],
+        ).fetchone()[0]
+        if not exists:
+            return set()
+        return {
+            action
+            for (action,) in self.db.execute(
+                f'SELECT DISTINCT "Action" FROM "{self.table}"'
+            ).fetchall()
+        }
+
+    def load_checkpoint(self) -> int | None:
+        """Row offset reached by an interrupted crawl, if any."""
+        row = self.db.execute(
+            f'SELECT "offset" FROM {self.CHECKPOINT_TABLE} WHERE "table" = ?',
+            [self.table],
+        ).fetchone()
+        return row[0] if row else None
+
+    def clear_checkpoint(self):
+        """Forget the checkpoint once a crawl has finished."""
+        self.flush()
+        self.offset = None
+        self.db.execute(
+            f'DELETE FROM {self.CHECKPOINT_TABLE} WHERE "table" = ?',
+            [self.table],
+        )
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.db.close()
+
+    def _create_table(self, batch: pd.DataFrame):
+        columns = ", ".join(f'"{column}" VARCHAR' for column in batch.columns)
+        self.db.execute(
+            f'CREATE TABLE IF NOT EXISTS "{self.table}" ({columns})'
+        )
@@ -0,0 +1,124 @@
+import statistics
+import time
+
+from loguru import logger
+
+# Job IDs of the first and last rows and the row count of the listing
+# table; it changes whenever DataTables redraws the table
+TABLE_SIGNATURE_JS = """
+() => {
+    const buttons = document.querySelectorAll(
+        "table tbody button[id^='info_']"
+    );
+    if (buttons.length === 0) {
+        return "";
+    }
+    return [
+        buttons[0].id, buttons[buttons.length - 1].id, buttons.length
+    ].join("|");
+}
+"""
+
+
+def table_signature(page) -> str:
+    """Signature of the listing table currently shown on the page."""
+    return page.evaluate(TABLE_SIGNATURE_JS)
+
+
+def wait_for_redraw(page, previous: str, timeout: float = 30.0):
+    """Block until the listing table differs from `previous`.
+    Args:
+        page (Page): Playwright page showing the job listing.
+        previous (str): `table_signature` taken before the action.
+        timeout (float): Seconds to wait before raising a TimeoutError.
+    """
+    page.wait_for_function(
+        f"(previous) => ({TABLE_SIGNATURE_JS})() !== previous",
+        arg=previous,
+        timeout=timeout * 1000,
+    )
+
+
+class RateController:
+    """AIMD pacing of page requests with latency statistics.
+
+    The delay between pages shrinks by `step` seconds after every fast,
+    successful page and is multiplied by `backoff` after an error or a
+    page slower than `slow_after` seconds. This speeds up while the server
+    copes and backs off quickly when it does not.
+    """
+
+    def __init__(
+        self,
+        delay: float = 5.0,
+        min_delay: float = 1.0,
+        max_delay: float = 60.0,
+        step: float = 0.5,
+        backoff: float = 2.0,
+        slow_after: float = 10.0,
+    ):
+        """
+        Args:
+            delay (float): Initial delay between pages, in seconds.
+            min_delay (float): Lower bound of the delay.
+            max_delay (float): Upper bound of the delay.
+            step (float): Additive decrease after a fast page.
+            backoff (float): Multiplicative increase after a slow or
+                failed page.
+            slow_after (float): Latency in seconds that counts as slow.
+        """
+        self.delay = delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.step = step
+        self.backoff = backoff
+        self.slow_after = slow_after
+        self.latencies = []
+        self.errors = 0
+
+    def record(self, latency: float | None, ok: bool = True):
+        """Adjust the delay after a page.
+        Args:
+            latency (float): Seconds the page took, None if it failed
+                before a latency could be measured.
+            ok (bool): Whether the page loaded without an error.
+        """
+        if latency is not None:
+            self.latencies.append(latency)
+
+        if ok and latency is not None and latency <= self.slow_after:
+            self.delay = max(self.min_delay, self.delay - self.step)
+        else:
+            self.errors += not ok
+            self.delay = min(self.max_delay, self.delay * self.backoff)
+
+    def wait(self):
+        time.sleep(self.delay)
+
+    def stats(self) -> dict:
+        """Page latency statistics in seconds."""
+        if not self.latencies:
+            return {"pages": 0, "errors": self.errors}
+
+        ordered = sorted(self.latencies)
+        return {
+            "pages": len(ordered),
+            "errors": self.errors,
+            "mean": statistics.fmean(ordered),
+            "p50": ordered[len(ordered) // 2],
+            "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+            "max": ordered[-1],
+            "delay": self.delay,
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        if not stats["pages"]:
+            logger.info(f"No page latencies recorded, {self.errors} errors.")
+            return
+        logger.info(
+            f"Page latency over {stats['pages']} pages: "
+            f"mean {stats['mean']:.2f}s, p50 {stats['p50']:.2f}s, "
+            f"p95 {stats['p95']:.2f}s, max {stats['max']:.2f}s; "
+            f"{stats['errors']} errors, final delay {stats['delay']:.2f}s."
+        )
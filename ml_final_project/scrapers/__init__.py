@@ -1,8 +1,13 @@
-from .BaseScraper import BaseScraper
-from .CSC import CSC
-
+from ml_final_project.lazy import lazy_package
 
 __all__ = [
     "BaseScraper",
     "CSC",
+    "CSCHttp",
+    "CSVSink",
+    "DuckDBSink",
+    "RateController",
 ]
+
+# Importing the package does not pull in pandas, duckdb or playwright
+__getattr__ = lazy_package(__name__, __all__)
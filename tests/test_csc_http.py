@@ -0,0 +1,131 @@
+from pathlib import Path
+import tempfile
+import unittest
+
+import duckdb
+import pandas as pd
+
+from ml_final_project.benchmarks.fixtures import (
+    FIRST_JOB_ID,
+    LISTING_HEADERS,
+    postings,
+    serve,
+)
+from ml_final_project.scrapers import CSCHttp
+from ml_final_project.scrapers.CSCHttp import (
+    find_endpoint,
+    parse_datatables_row,
+)
+
+# `CSCHttp` against the local job board of `fixtures.serve`
+
+POSTINGS = 250
+RENDERED = 100
+JOB_IDS = [str(FIRST_JOB_ID + i) for i in range(POSTINGS)]
+
+
+class CSCHttpTest(unittest.TestCase):
+    def setUp(self):
+        self.dataDir = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.data = postings(POSTINGS)
+
+    def serve(self, **kwargs) -> str:
+        baseUrl = self.enterContext(
+            serve(self.data, rendered=RENDERED, **kwargs)
+        )
+        return f"{baseUrl}/career/"
+
+    def scraper(self, url: str, **kwargs) -> CSCHttp:
+        return CSCHttp(url=url, data_dir=self.dataDir, **kwargs)
+
+    def stored(self) -> pd.DataFrame:
+        with duckdb.connect(
+            self.dataDir / "CivilServiceCommission.duckdb"
+        ) as db:
+            return db.sql(
+                'SELECT * FROM CivilServiceCommission ORDER BY "Action"'
+            ).df()
+
+    def test_finds_endpoint(self):
+        url = self.serve()
+        self.scraper(url, page_size=40).start_scrape(-1, use_duckdb=True)
+
+        data = self.stored()
+        self.assertEqual(list(data.columns), LISTING_HEADERS)
+        self.assertEqual(data["Action"].tolist(), JOB_IDS)
+
+    def test_no_endpoint_fails(self):
+        url = self.serve(configured=False)
+        with self.assertRaises(ValueError):
+            self.scraper(url).start_scrape(-1, use_duckdb=True)
+
+    def test_endpoint_pages(self):
+        url = self.serve(configured=False)
+        scraper = self.scraper(
+            url, endpoint=f"{url}data", page_size=40, concurrency=2
+        )
+        scraper.start_scrape(-1, use_duckdb=True)
+
+        data = self.stored()
+        self.assertEqual(list(data.columns), LISTING_HEADERS)
+        self.assertEqual(data["Action"].tolist(), JOB_IDS)
+
+    def test_row_objects(self):
+        url = self.serve(objects=True)
+        self.scraper(url, page_size=40).start_scrape(-1, use_duckdb=True)
+
+        data = self.stored()
+        self.assertEqual(data["Action"].tolist(), JOB_IDS)
+        self.assertEqual(
+            data["Agency"].tolist(), self.data["Agency"].to_list()
+        )
+
+    def test_endpoint_page_limit(self):
+        url = self.serve()
+        self.scraper(url, page_size=40).start_scrape(2, use_duckdb=True)
+
+        self.assertEqual(len(self.stored()), 80)
+
+    def test_resume(self):
+        url = self.serve()
+        self.scraper(url, page_size=40).start_scrape(3, use_duckdb=True)
+        self.scraper(url, page_size=40).start_scrape(
+            -1, use_duckdb=True, resume=True
+        )
+
+        data = self.stored()
+        self.assertEqual(data["Action"].tolist(), JOB_IDS)
+
+
+class ParseTest(unittest.TestCase):
+    def test_row_object_by_name(self):
+        row = {
+            "DT_RowId": "row_7",
+            "title": "Nurse I",
+            "agency": "<b>DOH</b>",
+            "action": '<button id="info_7">Details</button>',
+        }
+        cells, infoId = parse_datatables_row(
+            row, ["Agency", "Title", "Action"]
+        )
+        self.assertEqual(cells, ["DOH", "Nurse I", "Details"])
+        self.assertEqual(infoId, "7")
+
+    def test_row_object_without_headers_fails(self):
+        with self.assertRaises(ValueError):
+            parse_datatables_row({"a": 1}, ["Agency"])
+
+    def test_find_endpoint(self):
+        page = (
+            "<html><script>$('#t').DataTable({'ajax': {'url': "
+            "'/career/rows', 'type': 'POST'}})</script></html>"
+        )
+        self.assertEqual(
+            find_endpoint(page, "https://csc.gov.ph/career/"),
+            "https://csc.gov.ph/career/rows",
+        )
+        self.assertIsNone(find_endpoint("<html></html>", "http://x/"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import json
+from pathlib import Path
+import tempfile
+import unittest
+
+import numpy as np
+
+from ml_final_project.embedding_store import EmbeddingStore, model_key
+
+# `EmbeddingStore` written, closed and opened again from a temporary directory
+
+DIM = 8
+
+
+def vectors(n: int, start: int = 0) -> np.ndarray:
+    values = np.arange(start * DIM, (start + n) * DIM, dtype=np.float32)
+    return values.reshape(n, DIM)
+
+
+class EmbeddingStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.storePath = Path(self.enterContext(tempfile.TemporaryDirectory()))
+
+    def test_round_trip(self):
+        texts = ["Clerk I", "Nurse II", "Teacher I"]
+        with EmbeddingStore(self.storePath, DIM) as store:
+            store.add(texts, vectors(3))
+
+        store = EmbeddingStore(self.storePath, DIM)
+        self.assertEqual(len(store), 3)
+        rows = store.rows(["Teacher I", "Engineer", "Clerk  I"])
+        self.assertEqual(rows.tolist(), [2, -1, 0])
+
+        found = store.get(rows)
+        np.testing.assert_array_equal(found[0], vectors(1, start=2)[0])
+        self.assertTrue(np.isnan(found[1]).all())
+        np.testing.assert_array_equal(found[2], vectors(1)[0])
+        self.assertEqual(store.to_arrow(rows).type.list_size, DIM)
+
+    def test_missing_once_per_text(self):
+        store = EmbeddingStore(self.storePath, DIM)
+        store.add(["Clerk I"], vectors(1))
+
+        missing = store.missing(["Clerk I", "Nurse II", " Nurse\nII ", "Z"])
+        self.assertEqual(missing, ["Nurse II", "Z"])
+
+    def test_grows(self):
+        n = 1500
+        texts = [f"Posting {i}" for i in range(n)]
+        with EmbeddingStore(self.storePath, DIM) as store:
+            store.add(texts[:1000], vectors(1000))
+            store.add(texts[1000:], vectors(n - 1000, start=1000))
+
+        store = EmbeddingStore(self.storePath, DIM)
+        np.testing.assert_array_equal(store.matrix, vectors(n))
+
+    def test_unflushed_rows_ignored(self):
+        with EmbeddingStore(self.storePath, DIM) as store:
+            store.add(["Clerk I"], vectors(1))
+        # A run that dies before `flush` leaves rows past the count
+        EmbeddingStore(self.storePath, DIM).add(["Nurse II"], vectors(1, 1))
+
+        store = EmbeddingStore(self.storePath, DIM)
+        self.assertEqual(len(store), 1)
+        self.assertEqual(store.missing(["Nurse II"]), ["Nurse II"])
+
+    def test_float16(self):
+        with EmbeddingStore(self.storePath, DIM, "float16") as store:
+            store.add(["Clerk I"], vectors(1))
+
+        found = EmbeddingStore(self.storePath, DIM, "float16").get(
+            np.array([0])
+        )
+        self.assertEqual(found.dtype, np.float32)
+        np.testing.assert_array_equal(found, vectors(1))
+
+    def test_mismatched_store(self):
+        with EmbeddingStore(self.storePath, DIM) as store:
+            store.add(["Clerk I"], vectors(1))
+
+        with self.assertRaises(ValueError):
+            EmbeddingStore(self.storePath, DIM * 2)
+
+    def test_model_key(self):
+        modelPath = self.storePath / "bert"
+        modelPath.mkdir()
+        (modelPath / "config.json").write_text(json.dumps({"hidden_size": 8}))
+        key = model_key(modelPath)
+
+        self.assertTrue(key.startswith("bert-"))
+        (modelPath / "vocab.txt").write_text("[PAD]\n")
+        self.assertNotEqual(model_key(modelPath), key)
+
+        store = EmbeddingStore.for_model(modelPath, root=self.storePath)
+        self.assertEqual(store.path.parent.name, model_key(modelPath))
+        self.assertEqual(store.dim, 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+
+import polars as pl
+
+from ml_final_project.benchmarks.features import map_experience
+from ml_final_project.features import add_experience_years
+
+# `add_experience_years` against the row by row UDFs of notebook 3.1
+
+TEXTS = [
+    "None Required",
+    "",
+    "1 Year Of Relevant",
+    "HT for 3 years; or MT for 2 years",
+    "6 months of relevant or 6 months",
+    "18 Months of relevant experience",
+    "One (1) year relevant experience",
+    "Two one year of relevant experience",
+    "Three years and 4 years",
+    "2 years relevant\n3",
+    "2  years of relevant experience",
+    "8 hours of relevant training",
+    "Experience in records management",
+    None,
+    "1 Year Of Relevant",
+    None,
+]
+
+
+def notebook_years(texts: list) -> list:
+    # `map_elements` skips nulls, so the UDF never sees them
+    return [None if text is None else map_experience(text) for text in texts]
+
+
+class ExperienceYearsTest(unittest.TestCase):
+    def setUp(self):
+        self.data = pl.DataFrame(
+            {"jobId": range(len(TEXTS)), "Experience": TEXTS},
+            schema={"jobId": pl.Int32, "Experience": pl.Utf8},
+        )
+        self.expected = pl.Series(
+            "Experience_years", notebook_years(TEXTS), dtype=pl.Float32
+        )
+
+    def test_matches_notebook(self):
+        for dedupe in (False, True):
+            with self.subTest(dedupe=dedupe):
+                result = add_experience_years(self.data, dedupe=dedupe)
+
+                # Same row order as the input
+                self.assertEqual(
+                    result["jobId"].to_list(), list(range(len(TEXTS)))
+                )
+                self.assertTrue(
+                    result["Experience_years"].equals(self.expected)
+                )
+
+    def test_lazy(self):
+        result = add_experience_years(self.data.lazy()).collect()
+
+        self.assertTrue(result["Experience_years"].equals(self.expected))
+
+    def test_custom_column(self):
+        data = self.data.rename({"Experience": "Requirement"})
+        result = add_experience_years(data, column="Requirement")
+
+        self.assertTrue(result["Experience_years"].equals(self.expected))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+
+from ml_final_project.preprocessing import FieldExtractor
+
+# `FieldExtractor` against the line-by-line `line.split(label)[1]` it replaced
+
+LABELS = ["Position Title", "Education", "Experience", "Competency"]
+POSTING = [
+    "CIVIL SERVICE COMMISSION",
+    "Position Title : Clerk I",
+    "Education : Bachelor's degree",
+    "Experience : None required",
+    "Competency : Written communication",
+    "Attention to detail",
+    "Records management",
+    "Instructions/Remarks : Submit the documents below",
+    "Position Title : Clerk II",
+]
+
+
+class FieldExtractorTest(unittest.TestCase):
+    def test_first_match_wins(self):
+        values = FieldExtractor(LABELS).extract(POSTING)
+
+        self.assertEqual(values["Position Title"], "Clerk I")
+        self.assertEqual(values["Education"], "Bachelor's degree")
+
+    def test_same_label_on_line(self):
+        lines = ["Experience : 1 year Experience in records"]
+        values = FieldExtractor(LABELS).extract(lines)
+
+        # Cut at the repeated label, as `line.split(label)[1]` is
+        self.assertEqual(values["Experience"], "1 year")
+
+    def test_missing_label(self):
+        values = FieldExtractor(LABELS + ["Training"]).extract(POSTING)
+
+        self.assertIsNone(values["Training"])
+
+    def test_longest_label_first(self):
+        lines = ["Salary/Job/Pay Grade : 11", "Salary : 30,000"]
+        extractor = FieldExtractor(["Salary", "Salary/Job/Pay Grade"])
+        values = extractor.extract(lines)
+
+        self.assertEqual(values["Salary/Job/Pay Grade"], "11")
+        self.assertEqual(values["Salary"], "30,000")
+
+    def test_single_line_competency(self):
+        values = FieldExtractor(LABELS).extract(POSTING)
+
+        self.assertEqual(values["Competency"], "Written communication")
+
+    def test_multiline_competency(self):
+        blocks = {"Competency": "Instructions/Remarks"}
+        values = FieldExtractor(LABELS, blocks=blocks).extract(POSTING)
+
+        self.assertEqual(
+            values["Competency"],
+            "Written communication Attention to detail Records management",
+        )
+
+    def test_block_without_end_marker(self):
+        blocks = {"Competency": "Instructions/Remarks"}
+        values = FieldExtractor(LABELS, blocks=blocks).extract(POSTING[:6])
+
+        self.assertEqual(values["Competency"], "Written communication")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import os
+from pathlib import Path
+import tempfile
+import unittest
+
+import duckdb
+
+from ml_final_project.preprocessing import PDFManifest, PDFTableWriter
+from ml_final_project.preprocessing.PDFManifest import fingerprint
+from tests.test_pdf_table_writer import parsed_pdf
+
+# `PDFManifest.backlog` over a directory of placeholder `<jobId>.pdf` files
+
+
+class PDFManifestTest(unittest.TestCase):
+    def setUp(self):
+        self.pdfsPath = Path(
+            self.enterContext(tempfile.TemporaryDirectory())
+        )
+        self.db = duckdb.connect()
+        self.addCleanup(self.db.close)
+        self.manifest = PDFManifest(self.db)
+        self.writer = PDFTableWriter(self.db, manifest=self.manifest)
+
+    def pdf(self, jobId: int, content: bytes = b"%PDF-1.4") -> Path:
+        pdf_file = self.pdfsPath / f"{jobId}.pdf"
+        pdf_file.write_bytes(content)
+        return pdf_file
+
+    def store(self, jobId: int, **fields):
+        """Store a row for the file as `pdfs.store` does after parsing."""
+        pdf_file = self.pdfsPath / f"{jobId}.pdf"
+        self.writer.add(parsed_pdf(jobId, **fields), fingerprint(pdf_file))
+        self.writer.flush()
+
+    def backlog(self, **kwargs) -> list:
+        pdf_files = self.manifest.backlog(self.pdfsPath, **kwargs)
+        return sorted(int(pdf_file.stem) for pdf_file in pdf_files)
+
+    def test_new_files(self):
+        for jobId in (1, 2, 3):
+            self.pdf(jobId)
+        self.store(1)
+        # A row stored before the manifest existed has no entry
+        self.db.execute(
+            "INSERT INTO civilservicecommission_pdfs (jobId) VALUES (2)"
+        )
+        (self.pdfsPath / "notes.txt").write_text("not a PDF")
+
+        self.assertEqual(self.backlog(), [3])
+
+    def test_failed_retried_by_default(self):
+        self.manifest.add(1, fingerprint(self.pdf(1)), "failed")
+        self.manifest.flush()
+
+        self.assertEqual(self.backlog(), [1])
+        self.assertEqual(self.backlog(skip_failed=True), [])
+
+    def test_verify_requeues_changed(self):
+        self.pdf(1)
+        self.pdf(2)
+        self.store(1)
+        self.store(2)
+        self.pdf(1, b"%PDF-1.4 revised")
+
+        self.assertEqual(self.backlog(), [])
+        self.assertEqual(self.backlog(verify=True), [1])
+        self.assertEqual(self.manifest.replacing, {1})
+
+    def test_verify_skips_touched(self):
+        pdf_file = self.pdf(1)
+        self.store(1)
+        mtime = pdf_file.stat().st_mtime + 60
+        os.utime(pdf_file, (mtime, mtime))
+
+        self.assertEqual(self.backlog(verify=True), [])
+        # The stat fields are refreshed, so the file is not hashed again
+        stored = self.db.execute(
+            f"SELECT mtime FROM {PDFManifest.TABLE} WHERE jobId = 1"
+        ).fetchone()
+        self.assertEqual(stored, (mtime,))
+
+    def test_verify_replaces_row(self):
+        self.pdf(1)
+        self.store(1, PositionTitle="Clerk")
+        pdf_file = self.pdf(1, b"%PDF-1.4 revised")
+        self.backlog(verify=True)
+
+        self.store(1, PositionTitle="Clerk II")
+
+        rows = self.db.execute(
+            "SELECT jobId, PositionTitle FROM civilservicecommission_pdfs"
+        ).fetchall()
+        self.assertEqual(rows, [(1, "Clerk II")])
+        entry = self.db.execute(
+            f"SELECT sha256, status FROM {PDFManifest.TABLE}"
+        ).fetchall()
+        self.assertEqual(entry, [(fingerprint(pdf_file)[2], "parsed")])
+        self.assertEqual(self.manifest.replacing, set())
+        self.assertEqual(self.backlog(verify=True), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+
+import duckdb
+
+from ml_final_project.preprocessing import PDFTableWriter
+
+# `PDFTableWriter` against an in-memory DuckDB
+
+
+def parsed_pdf(jobId: int, **fields) -> tuple:
+    """A `PDFParser.parse` row with placeholder text in every field."""
+    values = {column: column for column in PDFTableWriter.COLUMNS}
+    values.update(jobId=str(jobId), MonthlySalary="30000")
+    values.update(fields)
+    return tuple(values[column] for column in PDFTableWriter.COLUMNS)
+
+
+class PDFTableWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.db = duckdb.connect()
+        self.addCleanup(self.db.close)
+
+    def stored(self) -> list:
+        return self.db.execute(
+            "SELECT jobId, MonthlySalary FROM civilservicecommission_pdfs "
+            "ORDER BY jobId"
+        ).fetchall()
+
+    def test_batches(self):
+        writer = PDFTableWriter(self.db, batch_size=3)
+        for jobId in range(1, 8):
+            writer.add(parsed_pdf(jobId))
+
+        # Two full batches are committed, the seventh row waits
+        self.assertEqual(len(self.stored()), 6)
+        self.assertEqual(len(writer.buffer), 1)
+
+        writer.flush()
+        self.assertEqual(self.stored(), [(i, 30000) for i in range(1, 8)])
+        self.assertEqual(writer.inserted, 7)
+        self.assertEqual(writer.duplicates, 0)
+
+    def test_dedupe(self):
+        with PDFTableWriter(self.db) as writer:
+            writer.add(parsed_pdf(1))
+
+        with PDFTableWriter(self.db) as writer:
+            # One row already stored, one repeated within the batch
+            writer.add(parsed_pdf(1, MonthlySalary="1"))
+            writer.add(parsed_pdf(2))
+            writer.add(parsed_pdf(2, MonthlySalary="2"))
+
+        self.assertEqual(self.stored(), [(1, 30000), (2, 30000)])
+        self.assertEqual(writer.inserted, 1)
+        self.assertEqual(writer.duplicates, 2)
+
+    def test_falls_back_row_by_row(self):
+        with PDFTableWriter(self.db) as writer:
+            writer.add(parsed_pdf(1))
+            writer.add(parsed_pdf(2, MonthlySalary="n/a"))
+            writer.add(parsed_pdf(3))
+
+        # The bad row fails on its own instead of taking the batch with it
+        self.assertEqual(self.stored(), [(1, 30000), (3, 30000)])
+        self.assertEqual(writer.inserted, 2)
+        self.assertEqual(writer.failed, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
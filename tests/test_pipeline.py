@@ -0,0 +1,101 @@
+import asyncio
+from pathlib import Path
+import queue
+import tempfile
+import unittest
+from unittest import mock
+
+import duckdb
+
+from ml_final_project.benchmarks.fixtures import postings, write_pdfs
+from ml_final_project.pipeline import _DONE, _write_results, run_pipeline
+from ml_final_project.preprocessing import PDFManifest, PDFTableWriter
+from tests.test_pdf_table_writer import parsed_pdf
+
+# `run_pipeline` on a backlog of fixture PDFs, without downloads
+
+POSTINGS = 12
+
+
+class FailingWriter:
+    """Writer whose disk is full."""
+
+    def __init__(self):
+        self.added = 0
+        self.flushes = 0
+
+    def add(self, parsed_pdf: tuple, fingerprint: tuple | None = None):
+        self.added += 1
+        raise duckdb.IOException("No space left on device")
+
+    def flush(self):
+        self.flushes += 1
+
+
+class WriteResultsTest(unittest.TestCase):
+    def test_stops_storing_after_error(self):
+        results = queue.Queue()
+        for jobId in (1, 2, 3):
+            parsed = [(Path(f"{jobId}.pdf"), parsed_pdf(jobId), None)]
+            results.put((0, parsed, 0.0, {"pypdf": 1}, None))
+        results.put(_DONE)
+        writer = FailingWriter()
+        on_error = mock.Mock()
+        stats = {"parsed": 0, "failed": 0, "backends": {}}
+
+        manifest = PDFManifest(duckdb.connect())
+        _write_results(results, manifest, writer, 60, stats, 3, on_error)
+
+        # The later chunks are drained, not stored, and nothing is flushed
+        self.assertEqual(writer.added, 1)
+        self.assertEqual(writer.flushes, 0)
+        on_error.assert_called_once_with()
+        self.assertIsInstance(stats["error"], duckdb.IOException)
+        self.assertEqual(stats["parsed"], 0)
+
+
+class RunPipelineTest(unittest.TestCase):
+    def setUp(self):
+        self.dataDir = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.pdfsPath = self.dataDir / "pdfs"
+        self.pdfDbPath = self.dataDir / "pdfs.duckdb"
+        write_pdfs(postings(POSTINGS), self.pdfsPath)
+
+    def run_pipeline(self, **kwargs) -> dict:
+        return asyncio.run(
+            run_pipeline(
+                self.dataDir / "listing.duckdb",
+                self.pdfsPath,
+                self.pdfDbPath,
+                download=False,
+                workers=1,
+                **kwargs,
+            )
+        )
+
+    def backlog(self) -> list:
+        with duckdb.connect(self.pdfDbPath) as db:
+            return PDFManifest(db).backlog(self.pdfsPath)
+
+    def test_parses_backlog(self):
+        summary = self.run_pipeline()
+
+        self.assertEqual(summary["parsed"], POSTINGS)
+        self.assertEqual(summary["inserted"], POSTINGS)
+        self.assertEqual(summary["failed"], 0)
+        self.assertEqual(self.backlog(), [])
+
+    def test_write_failure(self):
+        error = duckdb.IOException("No space left on device")
+        with mock.patch.object(
+            PDFTableWriter, "_insert_batch", side_effect=error
+        ):
+            with self.assertRaises(duckdb.IOException):
+                self.run_pipeline(batch_size=1)
+
+        # Nothing was stored, so every PDF is parsed again next time
+        self.assertEqual(len(self.backlog()), POSTINGS)
+
+
+if __name__ == "__main__":
+    unittest.main()